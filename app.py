@@ -1,223 +1,179 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for, session, flash
-from models import db, User, save_result, get_filtered_results, export_results_to_csv
-from ld_logic import evaluate_dyslexia, evaluate_dyscalculia, evaluate_memory
+from flask import Flask
+from flask_mail import Mail
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import text
+from config import config
+from models.enhanced_models import (
+    db, Result, OutboundEmail, NormSketch, MigrationCheckpoint, on_results_flushed, norm_samples,
+    rebuild_email_index, rebuild_daily_rollups, compact_pending_progress, PROGRESS_COMPACT_EVERY
+)
+from models.legacy_migration import migrate_legacy, MIGRATION_CHUNK_SIZE, RESULTS_CHECKPOINT
+from models.schema import upgrade_schema
+from models.rescoring import rescore_results, RESCORE_CHUNK_SIZE
+from assessment.ml_engine import assessment_engine
+from assessment.item_bank import item_bank
+from assessment.norms import population_norms
+from services.db_engine import DatabaseEngine
+from services.password_hasher import password_hasher
+from services.mail_queue import MailQueue
+from services.progress_compactor import ProgressCompactor
+from services.result_writer import ResultWriteBuffer
+from services.fragment_cache import fragment_cache
+from services.rate_limiter import RateLimiter
+from services.login_attempts import LoginAttemptTracker
+from services.metrics import Metrics
+from routes.main import main_bp
+from routes.auth import auth_bp
+from routes.assessments import assessments_bp
 import os
-from io import BytesIO
-from itsdangerous import URLSafeTimedSerializer
-from flask_mail import Mail, Message
-
-app = Flask(__name__)
-
-app.secret_key = os.environ.get('SECRET_KEY', 'devkey')  # Needed for session
-
-# Use DATABASE_URL env var if set (for Render). Fallback to sqlite for local testing.
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///users.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Mail configuration (example using Gmail SMTP, adjust as needed)
-app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', app.config['MAIL_USERNAME'])
-
-mail = Mail(app)
-db.init_app(app)
-
-serializer = URLSafeTimedSerializer(app.secret_key)
-
-def initialize_database():
-    """Initialize database with error handling for corruption."""
-    try:
-        with app.app_context():
-            db.create_all()
-            print("Database initialized successfully!")
-    except Exception as e:
-        print(f"Database error: {e}")
-        # If using SQLite and database is corrupted, remove it and recreate
-        if 'sqlite' in app.config['SQLALCHEMY_DATABASE_URI'] and 'malformed' in str(e):
-            db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-            if os.path.exists(db_path):
-                print(f"Removing corrupted database file: {db_path}")
-                os.remove(db_path)
-                print("Creating fresh database...")
-                with app.app_context():
-                    db.create_all()
-                    print("Fresh database created successfully!")
-            else:
-                raise e
-        else:
-            raise e
-
-# Initialize database with error handling
-initialize_database()
-
-@app.route('/signup', methods=['GET', 'POST'])
-def signup():
-    if request.method == 'POST':
-        name = request.form.get('name')
-        email = request.form.get('email')
-        password = request.form.get('password')
-        if User.query.filter_by(email=email).first():
-            flash('Email already registered.')
-            return redirect(url_for('signup'))
-        user = User(name=name, email=email, role='student')
-        user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
-        flash('Account created! Please log in.')
-        return redirect(url_for('login'))
-    return render_template('signup.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        email = request.form.get('email')
-        password = request.form.get('password')
-        user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
-            session['user_id'] = user.id
-            session['user_name'] = user.name
-            flash('Logged in successfully!')
-            return redirect(url_for('landing'))
-        flash('Invalid email or password.')
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.clear()
-    flash('Logged out.')
-    return redirect(url_for('landing'))
-
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/landing')
-def landing():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
-    if not user.completed_get_to_know_you:
-        return render_template('get_to_know_you.html', user=user)
-    return render_template('tests_landing.html', user=user)
-
-@app.route('/get-to-know-you', methods=['GET', 'POST'])
-def get_to_know_you():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
-    if request.method == 'POST':
-        # Process answers here (for now just mark as completed)
-        user.completed_get_to_know_you = True
-        db.session.commit()
-        return redirect(url_for('landing'))
-    return render_template('get_to_know_you.html', user=user)
-
-@app.route('/test/dyslexia', methods=['GET', 'POST'])
-def test_dyslexia():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
-    if not user.completed_get_to_know_you:
-        return redirect(url_for('landing'))
-    if request.method == 'POST':
-        name = request.form.get('name')
-        email = request.form.get('email')
-        answers = [request.form.get(f'q{i}') for i in range(1,6)]
-        result = evaluate_dyslexia(answers)
-        save_result(name, email, result['type'], result['score'], result['flag'], result['message'])
-        return render_template('results.html', result=result)
-    return render_template('test_dyslexia.html')
-
-@app.route('/test/dyscalculia', methods=['GET', 'POST'])
-def test_dyscalculia():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
-    if not user.completed_get_to_know_you:
-        return redirect(url_for('landing'))
-    if request.method == 'POST':
-        name = request.form.get('name')
-        email = request.form.get('email')
-        answers = [request.form.get(f'q{i}') for i in range(1,6)]
-        result = evaluate_dyscalculia(answers)
-        save_result(name, email, result['type'], result['score'], result['flag'], result['message'])
-        return render_template('results.html', result=result)
-    return render_template('test_dyscalculia.html')
-
-@app.route('/test/memory', methods=['GET', 'POST'])
-def test_memory():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
-    if not user.completed_get_to_know_you:
-        return redirect(url_for('landing'))
-    if request.method == 'POST':
-        name = request.form.get('name')
-        email = request.form.get('email')
-        answers = request.form.getlist('recall')
-        result = evaluate_memory(answers)
-        save_result(name, email, result['type'], result['score'], result['flag'], result['message'])
-        return render_template('results.html', result=result)
-    return render_template('test_memory.html')
-
-@app.route('/forgot-password', methods=['GET', 'POST'])
-def forgot_password():
-    if request.method == 'POST':
-        email = request.form.get('email')
-        user = User.query.filter_by(email=email).first()
-        if user:
-            token = serializer.dumps(email, salt='password-reset-salt')
-            reset_url = url_for('reset_password', token=token, _external=True)
-            msg = Message('Password Reset Request', recipients=[email])
-            msg.body = f'Please click the link to reset your password: {reset_url}'
-            mail.send(msg)
-            flash('Password reset email sent. Please check your inbox.')
-        else:
-            flash('Email not found.')
-        return redirect(url_for('forgot_password'))
-    return render_template('forgot_password.html')
-
-@app.route('/reset-password/<token>', methods=['GET', 'POST'])
-def reset_password(token):
-    try:
-        email = serializer.loads(token, salt='password-reset-salt', max_age=3600)
-    except Exception:
-        flash('The password reset link is invalid or has expired.')
-        return redirect(url_for('forgot_password'))
-    user = User.query.filter_by(email=email).first()
-    if not user:
-        flash('Invalid user.')
-        return redirect(url_for('forgot_password'))
-    if request.method == 'POST':
-        password = request.form.get('password')
-        user.set_password(password)
-        db.session.commit()
-        flash('Your password has been updated. Please log in.')
-        return redirect(url_for('login'))
-    return render_template('reset_password.html')
-
-@app.route('/admin')
-def admin_dashboard():
-    if not session.get('user_id'):
-        return redirect(url_for('login'))
-    user = db.session.get(User, session['user_id'])
-    if user.role not in ['admin', 'superuser']:
-        return redirect(url_for('landing'))
-    # Filters: email, test_type
-    email = request.args.get('email', '').strip()
-    test_type = request.args.get('test_type', '').strip()
-    results = get_filtered_results(email=email or None, test_type=test_type or None)
-    return render_template('admin_dashboard.html', results=results, email=email, test_type=test_type)
-
-@app.route('/admin/export')
-def admin_export():
-    email = request.args.get('email', '').strip()
-    test_type = request.args.get('test_type', '').strip()
-    filename = export_results_to_csv(email=email or None, test_type=test_type or None)
-    return send_file(filename, as_attachment=True)
+import click
+
+mail = Mail()
+
+def create_app(config_name=None):
+    """Build the application for ``config_name`` (default: $FLASK_CONFIG, then 'default').
+
+    Nothing here connects to the database or starts threads or processes:
+    the schema is created by ``flask init-db``, and the mail sender, progress
+    compactor, result writer and hashing pool start lazily in each worker. A
+    pre-fork server can therefore build the app once and share it
+    copy-on-write.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config[config_name or os.environ.get('FLASK_CONFIG', 'default')])
+
+    if app.config.get('PROXY_FIX_X_FOR'):
+        # Behind a load balancer: take the client address from X-Forwarded-For
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'], x_proto=1)
+
+    DatabaseEngine(app, db)
+    mail.init_app(app)
+    password_hasher.init_app(app)
+    # Outgoing mail is queued in the database and sent by a background thread
+    MailQueue(app, db, OutboundEmail, mail)
+    # Autosave events are folded into session snapshots by a background thread
+    ProgressCompactor(app, compact_pending_progress)
+    # Optional group commit of results (off unless RESULT_WRITE_BEHIND=true)
+    ResultWriteBuffer(app, db, Result, on_flush=on_results_flushed)
+    population_norms.init_app(app, db, NormSketch)
+    # Questions come from a memory-mapped file that is reloaded when replaced
+    item_bank.init_app(app)
+    # Rendered results pages are cached per outcome; Jinja bytecode is cached on disk
+    fragment_cache.init_app(app)
+    # Cheap 429s for bots hammering the login, signup and reset forms
+    RateLimiter(app)
+    # Failed logins are counted per account and IP outside the users table
+    LoginAttemptTracker(app)
+    # Prometheus metrics on /metrics, and a log line for slow requests
+    Metrics(app, engine=assessment_engine, hasher=password_hasher)
+
+    app.register_blueprint(main_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(assessments_bp)
+    register_commands(app)
+    return app
+
+def warm_up(app):
+    """Do the work first requests would otherwise pay for: compile every
+    template, load the item bank, run each scoring path once and open a
+    database connection.
+
+    Called by the gunicorn master after preloading, so workers inherit the
+    result. The connection is only a reachability check; it is disposed of
+    again so no socket is shared across the fork.
+    """
+    with app.app_context():
+        for name in app.jinja_env.list_templates(filter_func=lambda n: n.endswith('.html')):
+            app.jinja_env.get_template(name)
+        for test_type in assessment_engine.assessment_configs:
+            assessment_engine.evaluate_batch(test_type, [[]], [{}])
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+        db.engine.dispose()
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create any missing tables, and columns and indexes missing from existing ones."""
+        db.create_all()
+        changes = upgrade_schema()
+        for change in changes:
+            print(f"Added {change}")
+        if 'column users.email_normalized' in changes:
+            rebuild_email_index()
+            print("Email search index rebuilt.")
+        print("Database initialized successfully!")
+
+    @app.cli.command('rebuild-email-index')
+    def rebuild_email_index_command():
+        """Rebuild the email search index from the users table."""
+        rebuild_email_index()
+        print("Email search index rebuilt.")
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only recompute days from this date (YYYY-MM-DD).')
+    def rebuild_rollups_command(since):
+        """Recompute the daily analytics totals from the results table."""
+        rebuild_daily_rollups(since.date() if since else None)
+        print("Daily rollups rebuilt.")
+
+    @app.cli.command('compact-progress')
+    @click.option('--min-events', type=int, default=PROGRESS_COMPACT_EVERY, show_default=True,
+                  help='Compact in-progress sessions with at least this many autosave events.')
+    def compact_progress_command(min_events):
+        """Fold autosave events into their sessions' snapshots now (web workers also do it periodically)."""
+        print(f"Compacted {compact_pending_progress(min_events)} sessions.")
+
+    @app.cli.command('migrate-legacy')
+    @click.option('--source-url', help='Database holding the legacy tables (default: the app database).')
+    @click.option('--chunk-size', type=int, default=MIGRATION_CHUNK_SIZE, show_default=True, help='Rows per transaction.')
+    @click.option('--limit', type=int, help='Stop after about this many legacy results.')
+    def migrate_legacy_command(source_url, chunk_size, limit):
+        """Copy legacy accounts and results into the current schema (resumable; runs on each release)."""
+        def progress(checkpoint):
+            print(f"{checkpoint.name}: up to id {checkpoint.last_id}, {checkpoint.copied} copied, "
+                  f"{checkpoint.skipped} skipped, {checkpoint.users_created} accounts created")
+
+        before = db.session.get(MigrationCheckpoint, RESULTS_CHECKPOINT)
+        copied_before = before.copied if before is not None else 0
+        users, results = migrate_legacy(source_url, chunk_size, progress, limit)
+        if users is None:
+            print("No legacy tables; nothing to migrate.")
+            return
+        print(f"Migrated {users.copied} accounts and {results.copied} results.")
+        if results.copied > copied_before:
+            # Copied rows bypass the norms, which only see results as they are submitted
+            population_norms.rebuild(norm_samples())
+            print("Population norms rebuilt.")
+
+    @app.cli.command('rescore-results')
+    @click.option('--workers', type=int, help='Scoring processes (default: one per CPU).')
+    @click.option('--chunk-size', type=int, default=RESCORE_CHUNK_SIZE, show_default=True, help='Result ids per task.')
+    @click.option('--dry-run', is_flag=True, help='Only count (and report) what would change.')
+    @click.option('--report', type=click.Path(dir_okay=False, writable=True), help='Write the changed results to this CSV file.')
+    @click.option('--restart', is_flag=True, help='Ignore the checkpoint of an earlier run with the same configuration.')
+    def rescore_results_command(workers, chunk_size, dry_run, report, restart):
+        """Re-score stored results with the current engine and configuration (resumable)."""
+        def progress(totals, watermark):
+            print(f"{totals['scanned']} scanned, {totals['changed']} changed, {totals['skipped']} skipped"
+                  + (f", done up to id {watermark}" if not dry_run else ''))
+
+        totals = rescore_results(app, workers, chunk_size, dry_run, report, restart, progress)
+        for (test_type, change), n in sorted(totals['transitions'].items()):
+            print(f"{test_type}: {n} {change}")
+        verb = 'would change' if dry_run else 'changed'
+        print(f"Configuration {totals['fingerprint']}: {totals['changed']} of {totals['scanned']} results {verb}.")
+
+    @app.cli.command('rebuild-norms')
+    def rebuild_norms_command():
+        """Rebuild the percentile norms from all stored results."""
+        population_norms.rebuild(norm_samples())
+        print("Population norms rebuilt.")
 
 if __name__ == '__main__':
+    app = create_app()
+    # The development server creates the schema itself; deployments run `flask init-db`
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
     app.run(debug=True)
@@ -0,0 +1,116 @@
+"""Item response theory tables for adaptive testing.
+
+Each question is modelled with the two-parameter logistic (2PL) model:
+P(correct | theta) = 1 / (1 + exp(-a * (theta - b))), with discrimination
+``a`` and location ``b``. What selection and scoring need for the whole
+pool is computed once, over a fixed grid of abilities, when scoring plans
+are compiled: the information of every item at every grid point (float16,
+322 bytes per item) and the pool's expected score there. Choosing the next
+item is then one row lookup and an argmax. Only the answered items are
+evaluated per request, to estimate ability and correct the expected score.
+
+Abilities are taken at the nearest grid point. The posterior lives on the
+grid, so abilities beyond its ends (say theta - z * se for a weak student)
+are evaluated at the ends rather than extrapolated.
+"""
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Abilities the posterior is evaluated on (standard-normal scale)
+THETA_MIN, THETA_MAX, THETA_STEP = -4.0, 4.0, 0.05
+THETA_GRID = np.linspace(THETA_MIN, THETA_MAX, int(round((THETA_MAX - THETA_MIN) / THETA_STEP)) + 1)
+THETA_GRID.setflags(write=False)
+# Log of a standard normal prior, up to a constant
+_LOG_PRIOR = -0.5 * THETA_GRID ** 2
+
+# Item locations used when a question gives only a difficulty label
+DIFFICULTY_LOCATIONS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+
+class ItemTables(NamedTuple):
+    """Read-only 2PL tables for one item pool"""
+    discrimination: np.ndarray  # a, per item
+    location: np.ndarray  # b, per item
+    weight_share: np.ndarray  # per item, its share of the pool's total scoring weight
+    information: np.ndarray  # grid x items, float16 Fisher information; one row per ability
+    expected_total: np.ndarray  # per grid point, the pool's expected weighted fraction correct
+
+def _frozen(array, dtype=float):
+    array = np.ascontiguousarray(array, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+def _p_correct(a, b, theta):
+    p = 1.0 / (1.0 + np.exp(-a * (theta - b)))
+    return np.clip(p, 1e-9, 1 - 1e-9)
+
+def item_tables(discrimination, location, weights, block=4096) -> ItemTables:
+    """Precompute the tables for a pool given its per-item a, b and scoring weights"""
+    a = np.asarray(discrimination, dtype=float)
+    b = np.asarray(location, dtype=float)
+    share = np.asarray(weights, dtype=float)
+    share = share / share.sum()
+    information = np.empty((len(THETA_GRID), len(a)), dtype=np.float16)
+    expected_total = np.zeros(len(THETA_GRID))
+    # In blocks of items, so building a large pool does not need a float64 grid x pool temporary
+    for start in range(0, len(a), block):
+        items = slice(start, start + block)
+        p = _p_correct(a[items], b[items], THETA_GRID[:, None])
+        information[:, items] = a[items] ** 2 * p * (1 - p)
+        expected_total += p @ share[items]
+    return ItemTables(
+        discrimination=_frozen(a),
+        location=_frozen(b),
+        weight_share=_frozen(share),
+        information=_frozen(information, np.float16),
+        expected_total=_frozen(expected_total)
+    )
+
+def grid_index(theta: float) -> int:
+    """Index of the grid point nearest to ``theta``"""
+    i = int(round((theta - THETA_MIN) / THETA_STEP))
+    return min(max(i, 0), len(THETA_GRID) - 1)
+
+def estimate_ability(tables: ItemTables, answered: Iterable[Tuple[int, bool]]) -> Tuple[float, float]:
+    """Expected a posteriori ability and its standard error.
+
+    ``answered`` holds (item index, correct) pairs. The standard-normal
+    prior keeps the estimate finite after all-correct or all-wrong runs.
+    """
+    log_posterior = _LOG_PRIOR.copy()
+    answered = list(answered)
+    if answered:
+        items = np.array([item for item, _ in answered])
+        correct = np.array([correct for _, correct in answered], dtype=bool)
+        p = _p_correct(tables.discrimination[items, None], tables.location[items, None], THETA_GRID[None, :])
+        log_posterior += np.where(correct[:, None], np.log(p), np.log1p(-p)).sum(axis=0)
+    weights = np.exp(log_posterior - log_posterior.max())
+    weights /= weights.sum()
+    theta = float(weights @ THETA_GRID)
+    se = float(np.sqrt(weights @ (THETA_GRID - theta) ** 2))
+    return theta, se
+
+def select_item(tables: ItemTables, theta: float, administered: Iterable[int]) -> Optional[int]:
+    """Most informative item at ``theta`` not given yet, or None when the pool is used up"""
+    information = tables.information[grid_index(theta)]
+    administered = list(administered)
+    if administered:
+        information = information.copy()
+        information[administered] = -1.0
+    item = int(np.argmax(information))
+    return None if information[item] < 0 else item
+
+def expected_score(tables: ItemTables, theta: float, answered: Iterable[Tuple[int, bool]] = ()) -> float:
+    """Weighted fraction of the whole pool a student at ``theta`` is expected to get right.
+
+    Items in ``answered`` count as actually answered, the rest at their
+    expected value, so once every item is given this is the pool's
+    weighted score.
+    """
+    g = grid_index(theta)
+    score = float(tables.expected_total[g])
+    for item, correct in answered:
+        share = tables.weight_share[item]
+        p = _p_correct(tables.discrimination[item], tables.location[item], THETA_GRID[g])
+        score += (share if correct else 0.0) - share * p
+    return float(score)
@@ -0,0 +1,284 @@
+"""Question bank kept on disk as JSON lines.
+
+Each line of the bank file is one item, for example::
+
+    {"test_type": "dyslexia", "id": "spelling_1", "type": "multiple_choice",
+     "question": "Choose the correct spelling:", "options": ["...", "...", "..."],
+     "correct": 1, "weight": 1.0, "difficulty": "medium", "form": 1}
+
+``form`` is the item's position on the fixed paper-style form (omit it for
+items only the adaptive tests draw on). ``discrimination`` and
+``location`` may override the 2PL parameters derived from the weight and
+difficulty (see assessment.adaptive).
+
+The file is memory-mapped and scanned once into a few numpy columns (byte
+offsets, test type, difficulty, form position, answer and scoring
+parameters) plus a sorted hash index of item ids. Question text stays in
+the mapping and is parsed only when an item is shown, so the page cache
+holds it once for every worker and the per-item cost in each process is
+a few dozen bytes of arrays. A preloading server loads the bank in the
+master (warm_up), and forked workers share the mapping and the columns.
+
+Replace the file atomically (write_item_bank, or write a temporary file
+and rename it over the bank). Workers notice the new file within
+ITEM_BANK_RELOAD_INTERVAL seconds and switch to it in one step; requests
+already holding the old snapshot (see ItemBankSnapshot.acquire) finish
+with it, and the last one to release it closes its mapping. A new file
+that is still being written (no newline after its last item) or invalid
+is not loaded; the current bank stays in use and the file is checked
+again later. A file edited in place can change under a mapping and must
+not be used.
+"""
+import hashlib
+import json
+from array import array
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from assessment.adaptive import DIFFICULTY_LOCATIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ITEM_BANK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'items.jsonl')
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+def _item_hash(test_type: str, item_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f'{test_type}\0{item_id}'.encode(), digest_size=8).digest(), 'little')
+
+def _frozen(values, dtype) -> np.ndarray:
+    array = np.array(values, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+class ItemBankSnapshot:
+    """One immutable, indexed view of a bank file.
+
+    Reading items needs the mapping: hold acquire() ... release() around
+    reads of a snapshot that may be replaced meanwhile. Once retired, the
+    mapping is closed as soon as no reader holds it.
+    """
+
+    def __init__(self, path: str, generation: int = 0):
+        self.path = path
+        self.generation = generation
+        self.closed = False
+        self._readers = 0
+        self._retired = False
+        self._readers_lock = threading.Lock()
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+        try:
+            if self._map and self._map[-1:] != b'\n':
+                raise ValueError(f"{path}: last line is incomplete (file still being written?)")
+            self._build_index()
+        except BaseException:
+            self._close()
+            raise
+
+    def acquire(self) -> bool:
+        """Keep the mapping open until release(); False if it is closed already (use a current snapshot)"""
+        with self._readers_lock:
+            if self.closed:
+                return False
+            self._readers += 1
+            return True
+
+    def release(self):
+        with self._readers_lock:
+            self._readers -= 1
+            if not (self._retired and self._readers == 0):
+                return
+        self._close()
+
+    def retire(self):
+        """Close the mapping once no reader holds it; for a snapshot that has been replaced"""
+        with self._readers_lock:
+            self._retired = True
+            if self._readers:
+                return
+        self._close()
+
+    def _close(self):
+        with self._readers_lock:
+            if self.closed:
+                return
+            self.closed = True
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    def _build_index(self):
+        # Typed buffers, so the scan leaves no per-item Python objects behind
+        test_types: Dict[str, int] = {}
+        offsets, lengths, types, difficulties, forms = array('q'), array('i'), array('B'), array('B'), array('h')
+        correct, hashes = array('b'), array('Q')
+        weights, discrimination, location = array('f'), array('f'), array('f')
+        data, size, pos, line_no = self._map, len(self._map), 0, 0
+        while pos < size:
+            end = data.find(b'\n', pos)
+            end = size if end < 0 else end
+            line_no += 1
+            if data[pos:end].strip():
+                try:
+                    item = json.loads(data[pos:end])
+                    test_type, difficulty = item['test_type'], item['difficulty']
+                    if difficulty not in DIFFICULTIES:
+                        raise ValueError(f"unknown difficulty {difficulty!r}")
+                    if not 0 <= item['correct'] < len(item['options']):
+                        raise ValueError("'correct' is not an option index")
+                    if item['weight'] <= 0:
+                        raise ValueError("'weight' must be positive")
+                except (KeyError, TypeError, ValueError) as e:
+                    raise ValueError(f"{self.path}:{line_no}: invalid item ({e})") from None
+                offsets.append(pos)
+                lengths.append(end - pos)
+                types.append(test_types.setdefault(test_type, len(test_types)))
+                difficulties.append(DIFFICULTIES.index(difficulty))
+                forms.append(item.get('form') or 0)
+                correct.append(item['correct'])
+                weights.append(item['weight'])
+                discrimination.append(item.get('discrimination', item['weight']))
+                location.append(item.get('location', DIFFICULTY_LOCATIONS[difficulty]))
+                hashes.append(_item_hash(test_type, item['id']))
+            pos = end + 1
+
+        self.test_types = tuple(test_types)
+        self.offsets = _frozen(offsets, np.int64)
+        self.lengths = _frozen(lengths, np.int32)
+        self.type_codes = _frozen(types, np.uint8)
+        self.difficulty_codes = _frozen(difficulties, np.uint8)
+        self.forms = _frozen(forms, np.int16)
+        self.correct = _frozen(correct, np.int8)
+        self.weights = _frozen(weights, np.float32)
+        self.discrimination = _frozen(discrimination, np.float32)
+        self.location = _frozen(location, np.float32)
+        hashes = np.frombuffer(hashes, dtype=np.uint64)
+        self._hash_order = _frozen(np.argsort(hashes, kind='stable'), np.int32)
+        self._sorted_hashes = _frozen(hashes[self._hash_order], np.uint64)
+        if len(hashes) and np.any(self._sorted_hashes[1:] == self._sorted_hashes[:-1]):
+            raise ValueError(f"{self.path}: duplicate item id")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def rows(self, test_type: str, difficulty: Optional[str] = None) -> np.ndarray:
+        """Row numbers of ``test_type``'s items (of one difficulty if given), in file order"""
+        if test_type not in self.test_types:
+            return np.empty(0, dtype=np.int64)
+        mask = self.type_codes == self.test_types.index(test_type)
+        if difficulty is not None:
+            mask &= self.difficulty_codes == DIFFICULTIES.index(difficulty)
+        return np.flatnonzero(mask)
+
+    def find(self, test_type: str, item_id: str) -> Optional[int]:
+        """Row number of an item, or None"""
+        h = np.uint64(_item_hash(test_type, item_id))
+        i = int(np.searchsorted(self._sorted_hashes, h))
+        if i == len(self._sorted_hashes) or self._sorted_hashes[i] != h:
+            return None
+        row = int(self._hash_order[i])
+        item = self.item(row)
+        return row if item['test_type'] == test_type and item['id'] == item_id else None
+
+    def item(self, row: int) -> Dict:
+        """The full item on ``row``, parsed from the mapped file"""
+        offset = int(self.offsets[row])
+        return json.loads(self._map[offset:offset + int(self.lengths[row])])
+
+    def form(self, test_type: str) -> List[Dict]:
+        """Items on the fixed form of ``test_type``, in form order"""
+        rows = self.rows(test_type)
+        rows = rows[self.forms[rows] > 0]
+        return [self.item(int(row)) for row in rows[np.argsort(self.forms[rows], kind='stable')]]
+
+class ItemBank:
+    """The current ItemBankSnapshot of a bank file, reloaded when the file is replaced"""
+
+    def __init__(self, path: Optional[str] = None, reload_interval: float = 2.0):
+        self.path = path or DEFAULT_ITEM_BANK_PATH
+        self.reload_interval = reload_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._reloads = 0
+        self._reload_errors = 0
+
+    def init_app(self, app):
+        path = app.config.get('ITEM_BANK_PATH') or DEFAULT_ITEM_BANK_PATH
+        if path != self.path:
+            self.path = path
+            with self._lock:
+                if self._snapshot is not None:
+                    self._snapshot.retire()
+                self._snapshot = None
+        self.reload_interval = app.config.get('ITEM_BANK_RELOAD_INTERVAL', 2.0)
+        app.extensions['item_bank'] = self
+
+    def current(self) -> ItemBankSnapshot:
+        """The bank as of the last check; checks the file at most every reload_interval seconds"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load()
+                return self._snapshot
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval or not self._lock.acquire(blocking=False):
+            return snapshot  # someone else is checking; keep serving the current bank
+        try:
+            self._checked_at = now
+            try:
+                st = os.stat(self.path)
+                changed = (st.st_ino, st.st_size, st.st_mtime_ns) != snapshot.signature
+                if changed:
+                    self._snapshot = self._load()
+                    snapshot.retire()
+                    self._reloads += 1
+                    logger.info("Reloaded item bank %s (%d items)", self.path, len(self._snapshot))
+            except (OSError, ValueError) as e:
+                self._reload_errors += 1
+                logger.error("Keeping the current item bank; cannot load %s: %s", self.path, e)
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'items': len(snapshot) if snapshot is not None else 0,
+            'generation': self._generation,
+            'reloads': self._reloads,
+            'reload_errors': self._reload_errors
+        }
+
+    def _load(self):
+        snapshot = ItemBankSnapshot(self.path, self._generation + 1)
+        self._generation = snapshot.generation
+        return snapshot
+
+def write_item_bank(path: str, items: Iterable[Dict]):
+    """Write ``items`` as a bank file that replaces ``path`` atomically"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.items-', suffix='.jsonl')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False))
+                f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+item_bank = ItemBank()
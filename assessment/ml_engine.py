@@ -1,35 +1,140 @@
 import numpy as np
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Mapping, Tuple, Any, NamedTuple, Optional
 import json
+import threading
+import time
 from datetime import datetime
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from types import MappingProxyType
+
+from assessment.adaptive import ItemTables, item_tables, estimate_ability, select_item, expected_score
+from assessment.item_bank import ItemBank, ItemBankSnapshot, item_bank as default_item_bank
+
+# Expected response time in seconds per question difficulty
+EXPECTED_TIMES = {'easy': 10, 'medium': 20, 'hard': 30}
+
+MESSAGE_TEMPLATES = {
+    'dyslexia': {
+        'low_risk': "Reading and language processing skills appear to be within typical range (score: {score:.1%}). Continue regular reading practice.",
+        'medium_risk': "Some indicators suggest potential reading challenges (score: {score:.1%}). Consider additional assessment or support.",
+        'high_risk': "Multiple indicators suggest possible dyslexia-related challenges (score: {score:.1%}). Professional evaluation recommended."
+    },
+    'dyscalculia': {
+        'low_risk': "Mathematical reasoning skills appear to be developing appropriately (score: {score:.1%}).",
+        'medium_risk': "Some areas of mathematical processing may need attention (score: {score:.1%}). Consider targeted practice.",
+        'high_risk': "Significant challenges with number processing detected (score: {score:.1%}). Professional assessment recommended."
+    },
+    'memory': {
+        'low_risk': "Working memory performance is within expected range (score: {score:.1%}).",
+        'medium_risk': "Working memory may benefit from targeted exercises (score: {score:.1%}).",
+        'high_risk': "Working memory challenges detected (score: {score:.1%}). Consider memory training strategies."
+    }
+}
+
+RECOMMENDATIONS = {
+    'dyslexia': {
+        'low_risk': "Continue regular reading. Try varied genres and difficulty levels.",
+        'medium_risk': "Practice phonics exercises. Use text-to-speech tools. Break reading into smaller chunks.",
+        'high_risk': "Seek professional evaluation. Use assistive technology. Consider specialized tutoring."
+    },
+    'dyscalculia': {
+        'low_risk': "Practice mental math daily. Explore mathematical concepts through games.",
+        'medium_risk': "Use visual aids for math concepts. Practice number sense exercises. Break problems into steps.",
+        'high_risk': "Professional assessment recommended. Use manipulatives and visual tools. Consider specialized math support."
+    },
+    'memory': {
+        'low_risk': "Continue challenging memory with puzzles and games.",
+        'medium_risk': "Practice memory strategies like chunking and visualization. Use organizational tools.",
+        'high_risk': "Implement memory aids and strategies. Consider working memory training programs."
+    }
+}
+
+# Distinct (test_type, age_group, learning_style) combinations kept resolved
+PROFILE_CACHE_SIZE = 256
+
+class NoAdaptiveItems(ValueError):
+    """The item bank has no pool items for an adaptive test"""
+
+def _frozen_array(values, dtype) -> np.ndarray:
+    array = np.array(values, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+class ScoringPlan(NamedTuple):
+    """Precomputed, read-only form of one assessment_configs entry and its items"""
+    test_type: str
+    questions: Tuple[Dict, ...]  # the fixed form, in order
+    question_ids: Tuple[str, ...]
+    answer_key: Tuple[str, ...]
+    weights: Tuple[float, ...]
+    total_weight: float
+    difficulties: Tuple[str, ...]
+    expected_times: Tuple[float, ...]
+    easy_index: Tuple[int, ...]
+    hard_index: Tuple[int, ...]
+    items: frozenset
+    thresholds: MappingProxyType
+    messages: MappingProxyType
+    recommendations: MappingProxyType
+    # Array views of the same tables for evaluate_batch
+    answer_key_array: np.ndarray
+    weights_array: np.ndarray
+    expected_times_array: np.ndarray
+    easy_mask: np.ndarray
+    hard_mask: np.ndarray
+    # Adaptive testing draws on every bank item of the test type (the pool)
+    bank: ItemBankSnapshot
+    pool_rows: np.ndarray  # bank rows, ascending
+    pool_answer_key: np.ndarray  # index of the correct option, per pool item
+    irt: Optional[ItemTables]  # None when the pool is empty
+
+def compile_plan(test_type: str, config: Dict, bank: ItemBankSnapshot) -> ScoringPlan:
+    """Turn an assessment_configs entry and the test's bank items into a ScoringPlan"""
+    questions = bank.form(test_type)
+    pool_rows = bank.rows(test_type)
+    answer_key = tuple(chr(ord('a') + q['correct']) for q in questions)
+    weights = tuple(q['weight'] for q in questions)
+    difficulties = tuple(q['difficulty'] for q in questions)
+    expected_times = tuple(EXPECTED_TIMES.get(d, 20) for d in difficulties)
+    
+    return ScoringPlan(
+        test_type=test_type,
+        questions=tuple(questions),
+        question_ids=tuple(q['id'] for q in questions),
+        answer_key=answer_key,
+        weights=weights,
+        total_weight=sum(weights),
+        difficulties=difficulties,
+        expected_times=expected_times,
+        easy_index=tuple(i for i, d in enumerate(difficulties) if d == 'easy'),
+        hard_index=tuple(i for i, d in enumerate(difficulties) if d == 'hard'),
+        items=frozenset(config.get('items', ())),
+        thresholds=MappingProxyType(dict(config['thresholds'])),
+        messages=MappingProxyType(MESSAGE_TEMPLATES.get(test_type, {})),
+        recommendations=MappingProxyType(RECOMMENDATIONS.get(test_type, {})),
+        answer_key_array=_frozen_array(answer_key, object),
+        weights_array=_frozen_array(weights, float),
+        expected_times_array=_frozen_array(expected_times, float),
+        easy_mask=_frozen_array([d == 'easy' for d in difficulties], bool),
+        hard_mask=_frozen_array([d == 'hard' for d in difficulties], bool),
+        bank=bank,
+        pool_rows=_frozen_array(pool_rows, np.int64),
+        pool_answer_key=_frozen_array(bank.correct[pool_rows], np.int8),
+        irt=item_tables(bank.discrimination[pool_rows], bank.location[pool_rows],
+                        bank.weights[pool_rows]) if len(pool_rows) else None
+    )
 
 class AssessmentEngine:
     """Enhanced ML-based assessment engine"""
     
-    def __init__(self):
+    def __init__(self, item_bank: Optional[ItemBank] = None):
+        # Questions live in the item bank (assessment/items.jsonl by default)
+        self.item_bank = item_bank or default_item_bank
+        self._compile_lock = threading.Lock()
         self.assessment_configs = {
             'dyslexia': {
-                'questions': [
-                    {
-                        'id': 'spelling_1',
-                        'type': 'multiple_choice',
-                        'question': 'Choose the correct spelling:',
-                        'options': ['Acomodate', 'Accommodate', 'Acomadate'],
-                        'correct': 1,
-                        'weight': 1.0,
-                        'difficulty': 'medium'
-                    },
-                    {
-                        'id': 'synonym_1',
-                        'type': 'multiple_choice',
-                        'question': 'Match the word: Confident',
-                        'options': ['Timid', 'Sure of oneself', 'Sad'],
-                        'correct': 1,
-                        'weight': 1.2,
-                        'difficulty': 'easy'
-                    },
-                    # Add more sophisticated questions
-                ],
                 'thresholds': {
                     'low_risk': 0.8,
                     'medium_risk': 0.6,
@@ -37,18 +142,6 @@ class AssessmentEngine:
                 }
             },
             'dyscalculia': {
-                'questions': [
-                    {
-                        'id': 'sequence_1',
-                        'type': 'multiple_choice',
-                        'question': 'What comes next in this sequence? 2, 4, 8, 16, __',
-                        'options': ['18', '24', '32'],
-                        'correct': 2,
-                        'weight': 1.5,
-                        'difficulty': 'hard'
-                    },
-                    # Add more questions
-                ],
                 'thresholds': {
                     'low_risk': 0.75,
                     'medium_risk': 0.5,
@@ -65,66 +158,244 @@ class AssessmentEngine:
                 }
             }
         }
+        self._resolve_profile = lru_cache(maxsize=PROFILE_CACHE_SIZE)(self._resolve_profile_uncached)
+        # Called as observer(test_type, seconds) after each evaluate_assessment
+        self.observer = None
+        # Plans are compiled on first use and again whenever the bank is reloaded
+        self._plans = {}
+        self._bank = None
+    
+    @property
+    def assessment_configs(self) -> Dict[str, Dict]:
+        """Thresholds and memory items per test type.
+
+        Scoring reads the compiled plans, not this dict: assigning a new one
+        recompiles them on next use, but after editing it in place call
+        compile_plans() or scores keep using the old values.
+        """
+        return self._assessment_configs
+    
+    @assessment_configs.setter
+    def assessment_configs(self, configs: Dict[str, Dict]):
+        with self._compile_lock:
+            self._assessment_configs = configs
+            self._bank = None  # _sync_item_bank recompiles
+    
+    def compile_plans(self):
+        """(Re)build scoring plans and drop resolved profiles; call after editing assessment_configs"""
+        with self._compile_lock:
+            while not self._compile(self.item_bank.current()):
+                pass
+    
+    def _compile(self, bank: ItemBankSnapshot) -> bool:
+        """Build the plans from ``bank``; False, changing nothing, if it was replaced and closed meanwhile"""
+        if not bank.acquire():
+            return False
+        try:
+            self._plans = {
+                test_type: compile_plan(test_type, config, bank)
+                for test_type, config in self.assessment_configs.items()
+            }
+        finally:
+            bank.release()
+        self._bank = bank
+        self._resolve_profile.cache_clear()
+        return True
+    
+    def _sync_item_bank(self):
+        """Recompile the plans if the item bank or assessment_configs was replaced since they were built"""
+        bank = self.item_bank.current()
+        if bank is not self._bank:
+            with self._compile_lock:
+                while bank is not self._bank and not self._compile(bank):
+                    bank = self.item_bank.current()
+    
+    def plans(self) -> Mapping[str, ScoringPlan]:
+        """The compiled scoring plans by test type (read-only), recompiled first if they are out of date"""
+        self._sync_item_bank()
+        return MappingProxyType(self._plans)
+    
+    @contextmanager
+    def _plan_in_use(self, test_type: str):
+        """The current plan of ``test_type``, with its bank snapshot kept open for reading items"""
+        while True:
+            self._sync_item_bank()
+            plan = self._plans[test_type]
+            if plan.bank.acquire():
+                break  # otherwise the bank was just replaced; the next sync picks up the new one
+        try:
+            yield plan
+        finally:
+            plan.bank.release()
     
     def evaluate_assessment(self, test_type: str, responses: List[str], 
                           user_profile: Dict, response_times: List[float] = None) -> Dict[str, Any]:
         """Enhanced evaluation with ML-like scoring"""
         
+        start = time.perf_counter()
+        self._sync_item_bank()
+        if test_type == 'memory':
+            result = self._evaluate_memory(responses, user_profile, response_times)
+        else:
+            result = self._evaluate_cognitive(test_type, responses, user_profile, response_times)
+        if self.observer is not None:
+            self.observer(test_type, time.perf_counter() - start)
+        return result
+    
+    def evaluate_batch(self, test_type: str, responses_matrix: List[List[str]],
+                       profiles: List[Dict], response_times_matrix: List[List[float]] = None) -> List[Dict[str, Any]]:
+        """Score many submissions of one test type at once.
+
+        Rows of ``responses_matrix``, ``profiles`` and ``response_times_matrix``
+        line up one submission each. Returns the same dicts, in the same order,
+        that ``evaluate_assessment`` would return for every row.
+        """
+        if len(profiles) != len(responses_matrix):
+            raise ValueError("responses_matrix and profiles must have the same length")
+        if response_times_matrix is not None and len(response_times_matrix) != len(responses_matrix):
+            raise ValueError("response_times_matrix and responses_matrix must have the same length")
+        if not responses_matrix:
+            return []
+        
+        self._sync_item_bank()
         if test_type == 'memory':
-            return self._evaluate_memory(responses, user_profile, response_times)
+            return self._evaluate_memory_batch(responses_matrix, profiles)
         else:
-            return self._evaluate_cognitive(test_type, responses, user_profile, response_times)
+            return self._evaluate_cognitive_batch(test_type, responses_matrix, profiles, response_times_matrix)
+    
+    def form_questions(self, test_type: str) -> List[Dict[str, Any]]:
+        """The fixed form of ``test_type``, in order, as bank items"""
+        self._sync_item_bank()
+        return list(self._plans[test_type].questions)
+    
+    def question(self, test_type: str, question_id: str) -> Dict[str, Any]:
+        """A question as shown to the student (without its answer)"""
+        with self._plan_in_use(test_type) as plan:
+            row = plan.bank.find(test_type, question_id)
+            if row is None:
+                raise KeyError(question_id)
+            return self._shown_question(plan.bank.item(row))
+    
+    @staticmethod
+    def _shown_question(item: Dict) -> Dict[str, Any]:
+        return {'id': item['id'], 'question': item['question'], 'options': item['options']}
+    
+    def adaptive_step(self, test_type: str, answers: List[Tuple[str, str]], user_profile: Dict,
+                      se_target: float = 0.45, min_items: int = 3, max_items: int = 20,
+                      z: float = 2.5) -> Dict[str, Any]:
+        """Score an adaptive test so far and pick its next question.
+
+        ``answers`` are (question id, answer letter) pairs in the order
+        given. The test stops once at least ``min_items`` are answered and
+        either the ability's standard error is at most ``se_target`` or the
+        risk level is the same at both ends of the ``z`` confidence
+        interval; at ``max_items``; or when the bank runs out. Returns
+        {'done': False, 'question': ...} or {'done': True, 'result': ...},
+        where the result has the same keys as evaluate_assessment's.
+        Raises NoAdaptiveItems if the bank has no pool for ``test_type``.
+        """
+        with self._plan_in_use(test_type) as plan:
+            if plan.irt is None:
+                raise NoAdaptiveItems(f"{test_type} has no questions to adapt")
+            answered, administered_ids = [], []
+            for question_id, answer in answers:
+                row = plan.bank.find(test_type, question_id)
+                if row is None:
+                    continue  # dropped from the bank since it was asked
+                i = int(np.searchsorted(plan.pool_rows, row))
+                answered.append((i, answer == chr(ord('a') + int(plan.pool_answer_key[i]))))
+                administered_ids.append(question_id)
+            theta, se = estimate_ability(plan.irt, answered)
+            profile_adjustment, thresholds = self._resolve_profile(
+                test_type, user_profile.get('age_group', 'adult'), user_profile.get('learning_style', '')
+            )
+            
+            def risk_at(ability):
+                score = min(1.0, expected_score(plan.irt, ability, answered) * profile_adjustment)
+                return self._calculate_risk_and_confidence(score, thresholds)[0]
+            
+            n_answered = len(answered)
+            settled = n_answered >= min_items and (
+                se <= se_target or risk_at(theta - z * se) == risk_at(theta + z * se)
+            )
+            if not settled and n_answered < max_items:
+                item = select_item(plan.irt, theta, (i for i, _ in answered))
+                if item is not None:
+                    return {
+                        'done': False,
+                        'question': self._shown_question(plan.bank.item(int(plan.pool_rows[item]))),
+                        'ability': round(theta, 3),
+                        'standard_error': round(se, 3),
+                        'items_answered': n_answered
+                    }
+            
+            adjusted_score = min(1.0, expected_score(plan.irt, theta, answered) * profile_adjustment)
+            risk_level, confidence = self._calculate_risk_and_confidence(adjusted_score, thresholds)
+            return {'done': True, 'result': {
+                'type': test_type.title(),
+                'score': sum(correct for _, correct in answered),
+                'max_score': n_answered,
+                'normalized_score': round(adjusted_score, 3),
+                'confidence_score': round(confidence, 3),
+                'flag': risk_level in ['medium_risk', 'high_risk'],
+                'risk_level': risk_level,
+                'message': self._generate_message(test_type, risk_level, adjusted_score),
+                'recommendations': self._generate_recommendations(test_type, risk_level, []),
+                'ability': round(theta, 3),
+                'standard_error': round(se, 3),
+                'items_administered': administered_ids
+            }}
     
     def _evaluate_cognitive(self, test_type: str, responses: List[str], 
                            user_profile: Dict, response_times: List[float] = None) -> Dict[str, Any]:
         """Evaluate cognitive assessments with weighted scoring"""
         
-        config = self.assessment_configs[test_type]
-        questions = config['questions']
+        plan = self._plans[test_type]
+        profile_adjustment, thresholds = self._resolve_profile(
+            test_type, user_profile.get('age_group', 'adult'), user_profile.get('learning_style', '')
+        )
+        n_times = len(response_times) if response_times else 0
         
-        total_weight = sum(q['weight'] for q in questions)
         weighted_score = 0
         correct_count = 0
-        
+        correct_flags = []
         response_analysis = []
         
-        for i, (response, question) in enumerate(zip(responses, questions)):
-            is_correct = response == chr(ord('a') + question['correct'])
+        for i, (response, answer) in enumerate(zip(responses, plan.answer_key)):
+            is_correct = response == answer
             if is_correct:
-                weighted_score += question['weight']
+                weighted_score += plan.weights[i]
                 correct_count += 1
+            correct_flags.append(is_correct)
             
             # Analyze response time if available
             time_factor = 1.0
-            if response_times and i < len(response_times):
-                expected_time = self._get_expected_time(question['difficulty'])
-                time_ratio = response_times[i] / expected_time
-                time_factor = self._calculate_time_factor(time_ratio)
+            response_time = None
+            if i < n_times:
+                response_time = response_times[i]
+                time_factor = self._calculate_time_factor(response_time / plan.expected_times[i])
             
             response_analysis.append({
-                'question_id': question['id'],
+                'question_id': plan.question_ids[i],
                 'correct': is_correct,
-                'response_time': response_times[i] if response_times and i < len(response_times) else None,
+                'response_time': response_time,
                 'time_factor': time_factor,
-                'difficulty': question['difficulty']
+                'difficulty': plan.difficulties[i]
             })
         
-        # Calculate normalized score
-        normalized_score = weighted_score / total_weight
-        
-        # Apply user profile adjustments
-        profile_adjustment = self._calculate_profile_adjustment(user_profile, test_type)
+        # Calculate normalized score and apply user profile adjustments
+        normalized_score = weighted_score / plan.total_weight
         adjusted_score = min(1.0, normalized_score * profile_adjustment)
         
         # Determine risk level and confidence
         risk_level, confidence = self._calculate_risk_and_confidence(
-            adjusted_score, config['thresholds'], response_analysis
+            adjusted_score, thresholds, self._calculate_consistency(plan, correct_flags)
         )
         
         return {
             'type': test_type.title(),
             'score': correct_count,
-            'max_score': len(questions),
+            'max_score': len(plan.answer_key),
             'normalized_score': round(adjusted_score, 3),
             'confidence_score': round(confidence, 3),
             'flag': risk_level in ['medium_risk', 'high_risk'],
@@ -138,26 +409,24 @@ class AssessmentEngine:
                         response_times: List[float] = None) -> Dict[str, Any]:
         """Enhanced memory evaluation"""
         
-        config = self.assessment_configs['memory']
-        correct_items = set(config['items'])
+        plan = self._plans['memory']
+        correct_items = plan.items
         selected_items = set(responses)
         
         # Calculate precision, recall, and F1 score
         true_positives = len(correct_items.intersection(selected_items))
-        false_positives = len(selected_items - correct_items)
-        false_negatives = len(correct_items - selected_items)
         
         precision = true_positives / len(selected_items) if selected_items else 0
         recall = true_positives / len(correct_items)
         f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
         
         # Apply profile adjustments
-        profile_adjustment = self._calculate_profile_adjustment(user_profile, 'memory')
+        profile_adjustment, thresholds = self._resolve_profile(
+            'memory', user_profile.get('age_group', 'adult'), user_profile.get('learning_style', '')
+        )
         adjusted_score = min(1.0, f1_score * profile_adjustment)
         
-        risk_level, confidence = self._calculate_risk_and_confidence(
-            adjusted_score, config['thresholds'], []
-        )
+        risk_level, confidence = self._calculate_risk_and_confidence(adjusted_score, thresholds)
         
         return {
             'type': 'Working Memory',
@@ -174,10 +443,169 @@ class AssessmentEngine:
             'recommendations': self._generate_recommendations('memory', risk_level, [])
         }
     
+    def _evaluate_cognitive_batch(self, test_type: str, responses_matrix: List[List[str]],
+                                  profiles: List[Dict], response_times_matrix: List[List[float]] = None) -> List[Dict[str, Any]]:
+        """Array version of _evaluate_cognitive"""
+        
+        plan = self._plans[test_type]
+        n_rows, n_questions = len(responses_matrix), len(plan.answer_key)
+        
+        # Ragged rows are scored like zip(): only the first len(row) questions count
+        given = np.full((n_rows, n_questions), None, dtype=object)
+        answered = np.zeros((n_rows, n_questions), dtype=bool)
+        for r, row in enumerate(responses_matrix):
+            k = min(len(row), n_questions)
+            given[r, :k] = list(row[:k])
+            answered[r, :k] = True
+        correct = (given == plan.answer_key_array) & answered
+        
+        # Column-wise accumulation keeps the float summation order of the scalar path
+        weighted_score = np.zeros(n_rows)
+        for j in range(n_questions):
+            weighted_score += np.where(correct[:, j], plan.weights_array[j], 0.0)
+        correct_count = correct.sum(axis=1)
+        
+        # Response times, padded with NaN where a row has no timing for a question
+        times = np.full((n_rows, n_questions), np.nan)
+        timed = np.zeros((n_rows, n_questions), dtype=bool)
+        if response_times_matrix is not None:
+            for r, row_times in enumerate(response_times_matrix):
+                if row_times:
+                    k = min(len(row_times), n_questions)
+                    times[r, :k] = row_times[:k]
+                    timed[r, :k] = True
+        timed &= answered
+        time_ratio = times / plan.expected_times_array
+        time_factor = np.where(timed, self._time_factor_array(time_ratio), 1.0)
+        
+        normalized_score = weighted_score / plan.total_weight
+        adjusted_score = np.minimum(1.0, normalized_score * self._profile_adjustment_array(profiles, test_type))
+        
+        risk_levels, confidence = self._risk_and_confidence_array(
+            adjusted_score, plan.thresholds, self._consistency_array(plan, correct, answered)
+        )
+        
+        correct_rows = correct.tolist()
+        time_factor_rows = time_factor.tolist()
+        results = []
+        for r in range(n_rows):
+            row_times = response_times_matrix[r] if response_times_matrix is not None else None
+            n_answered = min(len(responses_matrix[r]), n_questions)
+            response_analysis = [{
+                'question_id': plan.question_ids[i],
+                'correct': correct_rows[r][i],
+                'response_time': row_times[i] if row_times and i < len(row_times) else None,
+                'time_factor': time_factor_rows[r][i],
+                'difficulty': plan.difficulties[i]
+            } for i in range(n_answered)]
+            
+            score = float(adjusted_score[r])
+            risk_level = risk_levels[r]
+            results.append({
+                'type': test_type.title(),
+                'score': int(correct_count[r]),
+                'max_score': n_questions,
+                'normalized_score': round(score, 3),
+                'confidence_score': round(float(confidence[r]), 3),
+                'flag': risk_level in ['medium_risk', 'high_risk'],
+                'risk_level': risk_level,
+                'message': self._generate_message(test_type, risk_level, score),
+                'recommendations': self._generate_recommendations(test_type, risk_level, response_analysis),
+                'response_analysis': response_analysis
+            })
+        
+        return results
+    
+    def _evaluate_memory_batch(self, responses_matrix: List[List[str]], profiles: List[Dict]) -> List[Dict[str, Any]]:
+        """Array version of _evaluate_memory"""
+        
+        plan = self._plans['memory']
+        correct_items = plan.items
+        n_rows = len(responses_matrix)
+        
+        selected = [set(row) for row in responses_matrix]
+        n_selected = np.array([len(s) for s in selected], dtype=np.int64)
+        flat = np.array(list(chain.from_iterable(selected)), dtype=object)
+        owner = np.repeat(np.arange(n_rows), n_selected)
+        is_hit = np.frompyfunc(correct_items.__contains__, 1, 1)(flat).astype(bool)
+        true_positives = np.bincount(owner, weights=is_hit, minlength=n_rows).astype(np.int64)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(n_selected > 0, true_positives / n_selected, 0.0)
+            recall = true_positives / len(correct_items)
+            f1_score = np.where(precision + recall > 0, 2 * (precision * recall) / (precision + recall), 0.0)
+        
+        adjusted_score = np.minimum(1.0, f1_score * self._profile_adjustment_array(profiles, 'memory'))
+        risk_levels, confidence = self._risk_and_confidence_array(
+            adjusted_score, plan.thresholds, np.ones(n_rows)
+        )
+        
+        results = []
+        for r in range(n_rows):
+            score = float(adjusted_score[r])
+            risk_level = risk_levels[r]
+            results.append({
+                'type': 'Working Memory',
+                'score': int(true_positives[r]),
+                'max_score': len(correct_items),
+                'normalized_score': round(score, 3),
+                'confidence_score': round(float(confidence[r]), 3),
+                'flag': risk_level in ['medium_risk', 'high_risk'],
+                'risk_level': risk_level,
+                'precision': round(float(precision[r]), 3),
+                'recall': round(float(recall[r]), 3),
+                'f1_score': round(float(f1_score[r]), 3),
+                'message': self._generate_message('memory', risk_level, score),
+                'recommendations': self._generate_recommendations('memory', risk_level, [])
+            })
+        
+        return results
+    
+    def _time_factor_array(self, time_ratio: np.ndarray) -> np.ndarray:
+        """Array version of _calculate_time_factor"""
+        return np.where(time_ratio < 0.3, 0.8, np.where(time_ratio > 3.0, 0.9, 1.0))
+    
+    def _profile_adjustment_array(self, user_profiles: List[Dict], test_type: str) -> np.ndarray:
+        """Profile adjustment per row, resolved through the profile cache"""
+        values = np.empty(len(user_profiles))
+        for r, profile in enumerate(user_profiles):
+            values[r] = self._resolve_profile(
+                test_type, profile.get('age_group', 'adult'), profile.get('learning_style', '')
+            )[0]
+        return values
+    
+    def _consistency_array(self, plan: ScoringPlan, correct: np.ndarray, answered: np.ndarray) -> np.ndarray:
+        """Array version of _calculate_consistency over answered questions"""
+        easy_total = (answered & plan.easy_mask).sum(axis=1)
+        hard_total = (answered & plan.hard_mask).sum(axis=1)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            easy_score = (correct & plan.easy_mask).sum(axis=1) / easy_total
+            hard_score = (correct & plan.hard_mask).sum(axis=1) / hard_total
+        inconsistent = (easy_total > 0) & (hard_total > 0) & (hard_score > easy_score)
+        return np.where(inconsistent, 0.9, 1.0)
+    
+    def _risk_and_confidence_array(self, scores: np.ndarray, thresholds: Dict,
+                                   consistency: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """Array version of _calculate_risk_and_confidence"""
+        low, medium = thresholds['low_risk'], thresholds['medium_risk']
+        is_low = scores >= low
+        is_medium = ~is_low & (scores >= medium)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confidence = np.where(
+                is_low, 0.8 + (scores - low) * 0.2 / (1 - low),
+                np.where(is_medium, 0.6 + (scores - medium) * 0.2 / (low - medium),
+                         0.4 + scores * 0.2 / medium)
+            )
+        confidence = np.minimum(0.95, confidence * consistency)
+        
+        risk_levels = np.where(is_low, 'low_risk', np.where(is_medium, 'medium_risk', 'high_risk')).tolist()
+        return risk_levels, confidence
+    
     def _get_expected_time(self, difficulty: str) -> float:
         """Get expected response time based on difficulty"""
-        times = {'easy': 10, 'medium': 20, 'hard': 30}
-        return times.get(difficulty, 20)
+        return EXPECTED_TIMES.get(difficulty, 20)
     
     def _calculate_time_factor(self, time_ratio: float) -> float:
         """Calculate adjustment factor based on response time"""
@@ -188,6 +616,14 @@ class AssessmentEngine:
         else:
             return 1.0
     
+    def _resolve_profile_uncached(self, test_type: str, age_group: str,
+                                  learning_style: str) -> Tuple[float, MappingProxyType]:
+        """Profile adjustment and thresholds for one (test_type, age_group, learning_style)"""
+        adjustment = self._calculate_profile_adjustment(
+            {'age_group': age_group, 'learning_style': learning_style}, test_type
+        )
+        return adjustment, self._plans[test_type].thresholds
+    
     def _calculate_profile_adjustment(self, user_profile: Dict, test_type: str) -> float:
         """Adjust scoring based on user profile"""
         adjustment = 1.0
@@ -209,7 +645,7 @@ class AssessmentEngine:
         return adjustment
     
     def _calculate_risk_and_confidence(self, score: float, thresholds: Dict, 
-                                     analysis: List[Dict]) -> Tuple[str, float]:
+                                     consistency: float = 1.0) -> Tuple[str, float]:
         """Calculate risk level and confidence score"""
         
         if score >= thresholds['low_risk']:
@@ -223,82 +659,32 @@ class AssessmentEngine:
             confidence = 0.4 + score * 0.2 / thresholds['medium_risk']
         
         # Adjust confidence based on response consistency
-        if analysis:
-            consistency = self._calculate_consistency(analysis)
-            confidence *= consistency
+        confidence *= consistency
         
         return risk_level, min(0.95, confidence)
     
-    def _calculate_consistency(self, analysis: List[Dict]) -> float:
+    def _calculate_consistency(self, plan: ScoringPlan, correct_flags: List[bool]) -> float:
         """Calculate response consistency factor"""
-        if not analysis:
-            return 1.0
-        
-        # Check for patterns in incorrect responses
-        difficulty_performance = {}
-        for item in analysis:
-            diff = item['difficulty']
-            if diff not in difficulty_performance:
-                difficulty_performance[diff] = []
-            difficulty_performance[diff].append(item['correct'])
+        n_answered = len(correct_flags)
+        easy = [correct_flags[i] for i in plan.easy_index if i < n_answered]
+        hard = [correct_flags[i] for i in plan.hard_index if i < n_answered]
         
         # Expect better performance on easier questions
-        consistency = 1.0
-        if 'easy' in difficulty_performance and 'hard' in difficulty_performance:
-            easy_score = sum(difficulty_performance['easy']) / len(difficulty_performance['easy'])
-            hard_score = sum(difficulty_performance['hard']) / len(difficulty_performance['hard'])
-            
-            if hard_score > easy_score:  # Inconsistent pattern
-                consistency *= 0.9
-        
-        return consistency
+        if easy and hard and sum(hard) / len(hard) > sum(easy) / len(easy):
+            return 0.9
+        return 1.0
     
     def _generate_message(self, test_type: str, risk_level: str, score: float) -> str:
         """Generate detailed assessment message"""
-        
-        messages = {
-            'dyslexia': {
-                'low_risk': f"Reading and language processing skills appear to be within typical range (score: {score:.1%}). Continue regular reading practice.",
-                'medium_risk': f"Some indicators suggest potential reading challenges (score: {score:.1%}). Consider additional assessment or support.",
-                'high_risk': f"Multiple indicators suggest possible dyslexia-related challenges (score: {score:.1%}). Professional evaluation recommended."
-            },
-            'dyscalculia': {
-                'low_risk': f"Mathematical reasoning skills appear to be developing appropriately (score: {score:.1%}).",
-                'medium_risk': f"Some areas of mathematical processing may need attention (score: {score:.1%}). Consider targeted practice.",
-                'high_risk': f"Significant challenges with number processing detected (score: {score:.1%}). Professional assessment recommended."
-            },
-            'memory': {
-                'low_risk': f"Working memory performance is within expected range (score: {score:.1%}).",
-                'medium_risk': f"Working memory may benefit from targeted exercises (score: {score:.1%}).",
-                'high_risk': f"Working memory challenges detected (score: {score:.1%}). Consider memory training strategies."
-            }
-        }
-        
-        return messages.get(test_type, {}).get(risk_level, "Assessment completed.")
+        template = self._plans[test_type].messages.get(risk_level) if test_type in self._plans else None
+        return template.format(score=score) if template else "Assessment completed."
     
     def _generate_recommendations(self, test_type: str, risk_level: str, 
                                 analysis: List[Dict]) -> str:
         """Generate personalized recommendations"""
-        
-        base_recommendations = {
-            'dyslexia': {
-                'low_risk': "Continue regular reading. Try varied genres and difficulty levels.",
-                'medium_risk': "Practice phonics exercises. Use text-to-speech tools. Break reading into smaller chunks.",
-                'high_risk': "Seek professional evaluation. Use assistive technology. Consider specialized tutoring."
-            },
-            'dyscalculia': {
-                'low_risk': "Practice mental math daily. Explore mathematical concepts through games.",
-                'medium_risk': "Use visual aids for math concepts. Practice number sense exercises. Break problems into steps.",
-                'high_risk': "Professional assessment recommended. Use manipulatives and visual tools. Consider specialized math support."
-            },
-            'memory': {
-                'low_risk': "Continue challenging memory with puzzles and games.",
-                'medium_risk': "Practice memory strategies like chunking and visualization. Use organizational tools.",
-                'high_risk': "Implement memory aids and strategies. Consider working memory training programs."
-            }
-        }
-        
-        return base_recommendations.get(test_type, {}).get(risk_level, "Continue practicing and monitoring progress.")
+        plan = self._plans.get(test_type)
+        default = "Continue practicing and monitoring progress."
+        return plan.recommendations.get(risk_level, default) if plan else default
 
 # Global instance
-assessment_engine = AssessmentEngine()
\ No newline at end of file
+assessment_engine = AssessmentEngine()
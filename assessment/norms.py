@@ -0,0 +1,183 @@
+import atexit
+import logging
+import struct
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+# Fixed-width bins over the fraction-correct range [0, 1]
+NORM_BINS = 100
+DEFAULT_AGE_GROUP = 'adult'
+# Adaptive tests pick items near the student's ability, so their fraction
+# correct is not comparable with a fixed form's; they are normed apart
+ADAPTIVE_SEGMENT_SUFFIX = ' (adaptive)'
+
+logger = logging.getLogger(__name__)
+
+def norm_segment(test_type: str, adaptive: bool = False) -> str:
+    """Name under which a result's scores are normed"""
+    return test_type + ADAPTIVE_SEGMENT_SUFFIX if adaptive else test_type
+
+class NormHistogram:
+    """Fixed-bin histogram of fraction-correct scores for one population segment"""
+
+    __slots__ = ('counts', 'total')
+
+    def __init__(self, counts=None):
+        self.counts = list(counts) if counts is not None else [0] * NORM_BINS
+        self.total = sum(self.counts)
+
+    @staticmethod
+    def _bin(value: float) -> int:
+        return min(NORM_BINS - 1, max(0, int(value * NORM_BINS)))
+
+    def add(self, value: float, count: int = 1):
+        self.counts[self._bin(value)] += count
+        self.total += count
+
+    def merge(self, other: 'NormHistogram'):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    def percentile(self, value: float) -> Optional[float]:
+        """Share of recorded scores below ``value`` (ties count half), 0-100; None if empty"""
+        if not self.total:
+            return None
+        b = self._bin(value)
+        below = sum(self.counts[:b])
+        return 100.0 * (below + 0.5 * self.counts[b]) / self.total
+
+    def to_bytes(self) -> bytes:
+        return struct.pack(f'<{NORM_BINS}I', *self.counts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'NormHistogram':
+        return cls(struct.unpack(f'<{NORM_BINS}I', data))
+
+class PopulationNorms:
+    """Percentile ranks against all earlier results of the same test and age group.
+
+    Callers look a score up with percentile() and add it with record_many()
+    once its result has committed, so scores from failed saves never count.
+    Each (test_type, age_group) segment keeps a NormHistogram in memory, so
+    recording a score and looking up its percentile never touches the
+    results table. New scores are also collected as per-process deltas and
+    added to the persisted histograms every NORMS_FLUSH_EVERY scores and at
+    exit; each flush reloads the merged totals, so workers converge on the
+    same norms.
+    """
+
+    def __init__(self, app=None, db=None, model=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._sketches = {}
+        self._deltas = {}
+        self._pending = 0
+        if app is not None:
+            self.init_app(app, db, model)
+
+    def init_app(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.flush_every = app.config.get('NORMS_FLUSH_EVERY', 20)
+        # Histograms cached for another app's database do not apply
+        self._sketches, self._deltas, self._pending = {}, {}, 0
+        app.extensions['population_norms'] = self
+        atexit.register(self.flush)
+
+    def record_many(self, samples: Iterable[Tuple[str, Optional[str], float]]):
+        """Add many (test_type, age_group, value) scores at once, flushing at most once"""
+        keyed = [((test_type, age_group or DEFAULT_AGE_GROUP), value) for test_type, age_group, value in samples]
+        sketches = {key: self._sketch(key) for key in {key for key, _ in keyed}}
+        with self._lock:
+            for key, value in keyed:
+                sketches[key].add(value)
+                self._deltas.setdefault(key, NormHistogram()).add(value)
+            self._pending += len(keyed)
+            due = self._pending >= self.flush_every
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to persist population norms; will retry")
+
+    def percentile(self, test_type: str, age_group: Optional[str], value: float) -> Optional[float]:
+        sketch = self._sketch((test_type, age_group or DEFAULT_AGE_GROUP))
+        with self._lock:
+            return sketch.percentile(value)
+
+    def flush(self):
+        """Add this process's new scores to the stored histograms"""
+        if self.app is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas, self._pending = self._deltas, {}, 0
+            if not deltas:
+                return
+            with self.app.app_context():
+                session = self.db.session
+                try:
+                    merged = {key: self._merge_row(key, delta) for key, delta in deltas.items()}
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    # Keep the scores for the next attempt
+                    with self._lock:
+                        for key, delta in deltas.items():
+                            self._deltas.setdefault(key, NormHistogram()).merge(delta)
+                            self._pending += delta.total
+                    raise
+            with self._lock:
+                for key, sketch in merged.items():
+                    # Scores recorded while we were writing are not stored yet
+                    if key in self._deltas:
+                        sketch.merge(self._deltas[key])
+                    self._sketches[key] = sketch
+
+    def rebuild(self, samples: Iterable[Tuple[str, Optional[str], float]]):
+        """Replace all stored histograms with ones built from (test_type, age_group, value) samples"""
+        sketches: Dict[Tuple[str, str], NormHistogram] = {}
+        for test_type, age_group, value in samples:
+            sketches.setdefault((test_type, age_group or DEFAULT_AGE_GROUP), NormHistogram()).add(value)
+        session = self.db.session
+        self.model.query.delete()
+        session.add_all(
+            self.model(test_type=test_type, age_group=age_group, counts=sketch.to_bytes(),
+                       total=sketch.total, updated_at=datetime.utcnow())
+            for (test_type, age_group), sketch in sketches.items()
+        )
+        session.commit()
+        with self._lock:
+            self._sketches = sketches
+            self._deltas = {}
+            self._pending = 0
+
+    def _sketch(self, key) -> NormHistogram:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            row = self.db.session.get(self.model, key) if self.app is not None else None
+            loaded = NormHistogram.from_bytes(row.counts) if row is not None else NormHistogram()
+            with self._lock:
+                sketch = self._sketches.setdefault(key, loaded)
+        return sketch
+
+    def _merge_row(self, key, delta: NormHistogram) -> NormHistogram:
+        session = self.db.session
+        row = session.get(self.model, key, with_for_update=True)
+        if row is None:
+            row = self.model(test_type=key[0], age_group=key[1])
+            session.add(row)
+            merged = NormHistogram()
+        else:
+            merged = NormHistogram.from_bytes(row.counts)
+        merged.merge(delta)
+        row.counts = merged.to_bytes()
+        row.total = merged.total
+        row.updated_at = datetime.utcnow()
+        return merged
+
+# Global instance
+population_norms = PopulationNorms()
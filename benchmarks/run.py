@@ -0,0 +1,297 @@
+"""End-to-end and micro benchmarks for the LD Detector app.
+
+Runs offline against a throwaway SQLite database (or, with --database-url,
+a local scratch Postgres whose tables are dropped first) through Flask's
+test client, so no server or network is involved. HTTP scenarios are
+measured at each requested results-table size; results are written as
+JSON and can be compared against an earlier baseline:
+
+    python -m benchmarks.run --rows 10000,100000,1000000 --output benchmarks/baseline.json
+    python -m benchmarks.run --rows 10000 --compare benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_ROWS = '10000,100000,1000000'
+DEFAULT_REQUESTS = 200
+SEED_CHUNK = 10000
+SEED_EMAILS = 5000  # distinct students behind the seeded results
+TEST_TYPES = ('Dyslexia', 'Dyscalculia', 'Working Memory')
+
+def percentiles(samples):
+    """Summary statistics for a list of latencies in seconds"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        'n': len(ordered),
+        'throughput_per_s': len(ordered) / total if total else None,
+        'mean_ms': 1000 * total / len(ordered),
+        'p50_ms': 1000 * pick(0.50),
+        'p90_ms': 1000 * pick(0.90),
+        'p99_ms': 1000 * pick(0.99),
+        'max_ms': 1000 * ordered[-1],
+    }
+
+def timed_requests(n, send):
+    """Call ``send(i)`` n times; each must return a response with a 2xx/3xx status"""
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = send(i)
+        response.get_data()  # drains streamed bodies such as exports
+        samples.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code} from benchmark request")
+        response.close()
+    return percentiles(samples)
+
+def micro(fn, min_seconds=0.5):
+    """Calls per second and mean time per call of a zero-argument callable"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            fn()
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return {'calls': calls, 'calls_per_s': calls / elapsed, 'mean_us': 1e6 * elapsed / calls}
+
+def run_micro():
+    from assessment.ml_engine import assessment_engine
+    from ld_logic import evaluate_dyslexia, evaluate_dyscalculia, evaluate_memory
+
+    profile = {'age_group': 'child', 'learning_style': 'visual', 'diagnosed_difficulties': None}
+    rng = random.Random(1)
+
+    def answers(test_type):
+        """A random answer letter for each question of the fixed form"""
+        return [chr(ord('a') + rng.randrange(len(q['options']))) for q in assessment_engine.form_questions(test_type)]
+
+    dyslexia, dyscalculia = answers('dyslexia'), answers('dyscalculia')
+    dyslexia_times = [12.0 + i for i in range(len(dyslexia))]
+    dyscalculia_times = [25.0 + i for i in range(len(dyscalculia))]
+    batch = [answers('dyslexia') for _ in range(1000)]
+    return {
+        'engine.evaluate_assessment.dyslexia': micro(
+            lambda: assessment_engine.evaluate_assessment('dyslexia', dyslexia, profile, dyslexia_times)),
+        'engine.evaluate_assessment.dyscalculia': micro(
+            lambda: assessment_engine.evaluate_assessment('dyscalculia', dyscalculia, profile, dyscalculia_times)),
+        'engine.evaluate_assessment.memory': micro(
+            lambda: assessment_engine.evaluate_assessment('memory', ['Apple', 'Tiger', 'Car'], profile)),
+        'engine.evaluate_batch.dyslexia_x1000': micro(
+            lambda: assessment_engine.evaluate_batch('dyslexia', batch, [profile] * len(batch)), min_seconds=1.0),
+        'ld_logic.evaluate_dyslexia': micro(lambda: evaluate_dyslexia(['b', 'b', 'a', 'c', 'b'])),
+        'ld_logic.evaluate_dyscalculia': micro(lambda: evaluate_dyscalculia(['c', 'b', 'a', 'a', 'a'])),
+        'ld_logic.evaluate_memory': micro(lambda: evaluate_memory(['Apple', 'Book', 'Car'])),
+    }
+
+def seed_users(db, User):
+    """Bulk-insert the SEED_EMAILS students the seeded results belong to; returns their ids"""
+    from sqlalchemy import insert, select
+
+    rows = [dict(name=f"Student {i}", email=f"student{i}@school{i % 17}.example.org",
+                 password_hash='!seeded', role='student', completed_get_to_know_you=True)
+            for i in range(SEED_EMAILS)]
+    for row in rows:
+        row['email_normalized'] = row['email']  # bulk inserts skip the ORM listener that sets it
+    db.session.execute(insert(User), rows)
+    db.session.commit()
+    by_email = dict(db.session.execute(select(User.email, User.id)).all())
+    return [by_email[row['email']] for row in rows]
+
+def seed_results(db, Result, user_ids, start, stop):
+    """Bulk-insert results number ``start`` up to ``stop`` (deterministic content)"""
+    from sqlalchemy import insert
+
+    rng = random.Random(start)
+    base = datetime(2024, 1, 1)
+    for chunk_start in range(start, stop, SEED_CHUNK):
+        rows = []
+        for i in range(chunk_start, min(stop, chunk_start + SEED_CHUNK)):
+            score = rng.randint(0, 5)
+            rows.append(dict(
+                user_id=user_ids[i % SEED_EMAILS], test_type=TEST_TYPES[i % 3], score=score, max_score=5,
+                flag=score < 3, message='Seeded result', timestamp=base + timedelta(seconds=30 * i)
+            ))
+        db.session.execute(insert(Result), rows)
+        db.session.commit()
+
+def run_http(app, rows_list, n_requests):
+    from assessment.ml_engine import assessment_engine
+    from models.enhanced_models import db, User, Result, AssessmentSession, rebuild_email_index, rebuild_daily_rollups
+
+    app.config['RESULT_WRITE_BEHIND'] = False
+    app.extensions['mail_queue'].background = False
+    app.extensions['result_writer'].enabled = False
+    app.extensions['rate_limiter'].enabled = False
+
+    with app.app_context():
+        admin = User(name='Bench Admin', email='admin@bench.example.org', role='admin', completed_get_to_know_you=True)
+        admin.set_password('bench-password1')
+        student = User(name='Bench Student', email='student@bench.example.org', role='student',
+                       completed_get_to_know_you=True, age_group='child')
+        student.set_password('bench-password1')
+        db.session.add_all([admin, student])
+        db.session.commit()
+        admin_id, student_id = admin.id, student.id
+        user_ids = seed_users(db, User)
+        progress_session = AssessmentSession(user_id=student_id, test_type='dyslexia')
+        db.session.add(progress_session)
+        db.session.commit()
+        progress_id = progress_session.id
+
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        return client
+
+    def form_answers(test_type):
+        questions = assessment_engine.form_questions(test_type)
+        return {f'q{k}': chr(ord('a') + random.randrange(len(q['options']))) for k, q in enumerate(questions, 1)}
+
+    # Password hashing dominates these, so they run fewer times
+    slow = max(5, n_requests // 20)
+    results = {}
+    seeded = 0
+    for rows in rows_list:
+        with app.app_context():
+            print(f"Seeding results up to {rows} rows...", file=sys.stderr)
+            seed_results(db, Result, user_ids, seeded, rows)
+            seeded = rows
+            rebuild_email_index()
+            rebuild_daily_rollups()
+
+        anon = app.test_client()
+        student_client = client_for(student_id)
+        admin_client = client_for(admin_id)
+        run_id = f"{rows}-{int(time.time() * 1000)}"
+        scenarios = {
+            'signup': (slow, lambda i: anon.post('/signup', data={
+                'name': 'Bench User', 'email': f"signup-{run_id}-{i}@bench.example.org", 'password': 'bench-password1'})),
+            'login': (slow, lambda i: anon.post('/login', data={
+                'email': 'student@bench.example.org', 'password': 'bench-password1'})),
+            'test_dyslexia': (n_requests, lambda i: student_client.post('/test/dyslexia', data={
+                'name': 'Bench Student', 'email': 'student@bench.example.org', **form_answers('dyslexia')})),
+            'test_dyscalculia': (n_requests, lambda i: student_client.post('/test/dyscalculia', data={
+                'name': 'Bench Student', 'email': 'student@bench.example.org', **form_answers('dyscalculia')})),
+            'test_memory': (n_requests, lambda i: student_client.post('/test/memory', data={
+                'name': 'Bench Student', 'email': 'student@bench.example.org',
+                'recall': random.sample(['Apple', 'Book', 'Tiger', 'Spoon', 'Banana', 'Car'], 3)})),
+            'assessment_progress': (n_requests, lambda i: student_client.post(
+                '/api/assessment/progress', json={'session_id': progress_id, 'progress': {f'q{i % 5}': 'a'}})),
+            'admin_first_page': (n_requests, lambda i: admin_client.get('/admin')),
+            'admin_filter_email': (n_requests, lambda i: admin_client.get(
+                f"/admin?email=student{random.randrange(SEED_EMAILS)}@")),
+            'admin_filter_test_type': (n_requests, lambda i: admin_client.get('/admin?test_type=Dyscalculia')),
+            'admin_analytics': (n_requests, lambda i: admin_client.get('/admin/analytics?days=3660')),
+            'admin_export': (3, lambda i: admin_client.get('/admin/export')),
+            'admin_export_gzip': (3, lambda i: admin_client.get('/admin/export?gzip=1')),
+        }
+
+        results[str(rows)] = {}
+        for name, (n, send) in scenarios.items():
+            print(f"  {rows:>9} rows  {name}", file=sys.stderr)
+            results[str(rows)][name] = timed_requests(n, send)
+    return results
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline, tolerance):
+    """Names of measurements more than ``tolerance`` slower than the baseline"""
+    regressions = []
+    for rows, scenarios in current.get('http', {}).items():
+        for name, stats in scenarios.items():
+            before = baseline.get('http', {}).get(rows, {}).get(name, {})
+            if 'p50_ms' in stats and before.get('p50_ms') and stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append(f"http {rows} rows {name}: p50 {before['p50_ms']:.2f}ms -> {stats['p50_ms']:.2f}ms")
+    for name, stats in current.get('micro', {}).items():
+        before = baseline.get('micro', {}).get(name, {})
+        if before.get('mean_us') and stats['mean_us'] > before['mean_us'] * (1 + tolerance):
+            regressions.append(f"micro {name}: {before['mean_us']:.2f}us -> {stats['mean_us']:.2f}us")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', default=DEFAULT_ROWS, help='Comma-separated results-table sizes (default %(default)s)')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='Requests per fast scenario')
+    parser.add_argument('--database-url', help='Scratch database to use instead of a temporary SQLite file; its tables are dropped')
+    parser.add_argument('--skip-http', action='store_true', help='Only run the microbenchmarks')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON to compare against; exits 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before a regression is reported')
+    args = parser.parse_args(argv)
+
+    tmpdir = None
+    if args.database_url:
+        database = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='ld-bench-')
+        database = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+    # config.py reads the environment when it is imported
+    os.environ['DATABASE_URL'] = database
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('METRICS_TOKEN', 'benchmark')  # required by the production config
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database.split(':', 1)[0],
+            'requests': args.requests,
+        },
+        'micro': run_micro(),
+    }
+    try:
+        if not args.skip_http:
+            from app import create_app
+            from models.enhanced_models import db
+            app = create_app('production')
+            with app.app_context():
+                if args.database_url:
+                    db.drop_all()
+                db.create_all()
+            rows_list = sorted(int(r) for r in args.rows.split(',') if r.strip())
+            report['http'] = run_http(app, rows_list, args.requests)
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,27 +6,106 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///users.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Database engine (services/db_engine.py): pool for Postgres, pragmas for SQLite
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = True
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB = 64 * 1024
+    
     # Security settings
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
+    IDENTITY_CLAIMS_MAX_AGE = 300  # seconds before session claims are re-read from the DB
     
     # Mail configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
-    MAIL_USE_TLS = True
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME'))
+    
+    # Outbound mail queue (services/mail_queue.py)
+    MAIL_QUEUE_BATCH_SIZE = 50
+    MAIL_QUEUE_POLL_INTERVAL = 5.0  # seconds
+    MAIL_QUEUE_MAX_ATTEMPTS = 6
+    MAIL_QUEUE_BACKOFF = 30  # seconds, doubled per failed attempt
+    MAIL_QUEUE_MAX_CONNECTION_BACKOFF = 3600  # seconds, cap while the SMTP server is unreachable
+    
+    # Background compaction of autosave events (services/progress_compactor.py)
+    PROGRESS_COMPACT_INTERVAL = 300  # seconds, jittered per worker
+    PROGRESS_COMPACT_MIN_EVENTS = 50  # in-progress sessions with fewer events are left alone
+    
+    # Password hashing (werkzeug method string; runs on a process pool)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ['PASSWORD_HASH_WORKERS']) if 'PASSWORD_HASH_WORKERS' in os.environ else None  # None = CPU count
+    PASSWORD_HASH_MAX_QUEUE = 64
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+    
+    # Write-behind buffer for results (services/result_writer.py)
+    RESULT_WRITE_BEHIND = os.environ.get('RESULT_WRITE_BEHIND', 'false').lower() == 'true'
+    RESULT_FLUSH_ROWS = 100
+    RESULT_FLUSH_INTERVAL_MS = 50
+    RESULT_WRITE_ACK = os.environ.get('RESULT_WRITE_ACK', 'durable')  # 'durable' or 'none'
+    RESULT_BUFFER_MAX_ROWS = 10000
     
-    # Rate limiting
-    RATELIMIT_STORAGE_URL = "memory://"
+    # Percentile norms (assessment/norms.py): scores kept in memory before a flush
+    NORMS_FLUSH_EVERY = 20
+    
+    # Rendered-page cache (services/fragment_cache.py) and Jinja bytecode cache
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 128))
+    JINJA_BYTECODE_CACHE = True
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')  # None = system temp dir
+    
+    # Request metrics (services/metrics.py)
+    METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # if set, /metrics requires "Authorization: Bearer <token>"
+    METRICS_REQUIRE_TOKEN = False  # refuse to start without METRICS_TOKEN rather than serve /metrics publicly
+    
+    # Rate limiting (services/rate_limiter.py). memory:// is shared by all workers forked from
+    # one preloading master; sqlite:///path by every process on the host
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_SLOTS = 65536  # buckets in the memory:// table
+    # POST budgets per client IP, by endpoint
+    RATELIMITS = {
+        'auth.login': '10 per minute',
+        'auth.signup': '5 per 10 minutes',
+        'auth.forgot_password': '3 per 10 minutes',
+        'auth.reset_password': '5 per 10 minutes',
+        'assessments.batch_submit': '60 per hour',
+    }
+    # Proxies in front of the app whose X-Forwarded-For is trusted for client IPs (1 on Render)
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
     
     # Assessment settings
     MIN_PASSWORD_LENGTH = 8
-    MAX_LOGIN_ATTEMPTS = 5
+    MAX_LOGIN_ATTEMPTS = 5  # failed logins per account per LOGIN_ATTEMPT_WINDOW before it is locked
+    MAX_LOGIN_ATTEMPTS_PER_IP = 100  # generous: a school can share one address
+    LOGIN_ATTEMPT_WINDOW = 900  # seconds
+    LOGIN_LOCKOUT_MINUTES = 30
+    LOGIN_ATTEMPTS_STORAGE_URL = os.environ.get('LOGIN_ATTEMPTS_STORAGE_URL')  # None = RATELIMIT_STORAGE_URL
+    LOGIN_ATTEMPT_SLOTS = 65536  # counters in a memory:// table
     ASSESSMENT_TIME_LIMIT = 1800  # 30 minutes
+    ITEM_BANK_PATH = os.environ.get('ITEM_BANK_PATH')  # None = assessment/items.jsonl
+    ITEM_BANK_RELOAD_INTERVAL = 2  # seconds between checks for a replaced bank file
+    # POST /api/assessment/batch (offline devices syncing results)
+    BATCH_MAX_BYTES = 16 * 1024 * 1024  # request body as sent (compressed)
+    BATCH_MAX_DECODED_BYTES = 64 * 1024 * 1024
+    BATCH_MAX_SUBMISSIONS = 50000
+    BATCH_CHUNK_SIZE = 500  # submissions scored and committed together
+    ADAPTIVE_SE_TARGET = 0.45  # stop an adaptive test once the ability is known this precisely
+    ADAPTIVE_MIN_ITEMS = 3
+    ADAPTIVE_MAX_ITEMS = 20
+    ADAPTIVE_CONFIDENCE_Z = 2.5  # ...or once the risk level is the same across ability +/- z standard errors
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -34,9 +113,26 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    METRICS_REQUIRE_TOKEN = True
+
+class TestingConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'test-secret-key'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SESSION_COOKIE_SECURE = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # fast; tests do not need a real cost
+    PASSWORD_HASH_WORKERS = 0  # hash inline
+    RATELIMIT_ENABLED = False
+    JINJA_BYTECODE_CACHE = False
+    MAIL_SERVER = 'localhost'
+    MAIL_USE_TLS = False
+    MAIL_DEFAULT_SENDER = 'noreply@example.org'
+    MAIL_QUEUE_BACKGROUND = False  # tests call send_pending() themselves
+    PROGRESS_COMPACT_BACKGROUND = False
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
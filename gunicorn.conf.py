@@ -0,0 +1,68 @@
+"""Gunicorn settings for production (``gunicorn -c gunicorn.conf.py wsgi:app``).
+
+The app is imported once in the master (preload_app), warmed up and frozen
+out of the garbage collector's view before workers are forked, so workers
+share its memory copy-on-write and start serving immediately. Every value
+can be overridden from the environment.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# One process per core; threads cover requests that wait on the database or SMTP
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+# Each worker hashes on its own process pool; one process per worker keeps the total at the core count
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '1')
+
+# Recycle workers after a jittered number of requests so restarts do not line up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# Time a worker gets to finish in-flight requests and flush its queues on shutdown or recycle
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before any worker is forked"""
+    from app import warm_up
+    from wsgi import app
+    warm_up(app)
+    # Keep the preloaded objects out of GC passes, which would otherwise touch
+    # (and so copy) their pages in every worker
+    gc.freeze()
+    server.log.info("App warmed up; forking %d workers with %d threads", workers, threads)
+
+def post_fork(server, worker):
+    from models.enhanced_models import db
+    from wsgi import app
+    # Drop any pooled connections inherited from the master without closing them under it
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+def post_worker_init(worker):
+    """Open this worker's first database connection before it accepts requests"""
+    from sqlalchemy import text
+    from models.enhanced_models import db
+    from wsgi import app
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+
+def worker_exit(server, worker):
+    """Write buffered results and norms and stop background work before the worker goes away"""
+    from wsgi import app
+    app.extensions['result_writer'].close()
+    app.extensions['population_norms'].flush()
+    app.extensions['mail_queue'].stop()
+    app.extensions['progress_compactor'].stop()
+    app.extensions['password_hasher'].shutdown()
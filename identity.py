@@ -0,0 +1,127 @@
+"""Request-scoped user identity.
+
+Stable claims (role, profile completion) are cached in the signed session,
+so most requests are authorized without touching the database. The claims
+are trusted until IDENTITY_CLAIMS_MAX_AGE, unless the user's role or lock
+has changed since they were written: commits that change either bump the
+user's stamp in ``claims_stamps``, a table in shared memory that workers
+forked from one master all see, and claims carrying an older stamp are
+reloaded. A change made by another host or a process outside the web
+server (a shell, a script) reaches sessions when their claims expire. The
+User row itself is loaded lazily, at most once per request.
+"""
+import mmap
+import multiprocessing
+import struct
+import time
+
+from flask import current_app, g, session
+
+# Bump when the cached claims change shape or meaning; older sessions reload from the DB
+CLAIMS_FORMAT = 3
+DEFAULT_CLAIMS_MAX_AGE = 300  # seconds
+CLAIMS_STAMP_SLOTS = 65536
+
+
+class ClaimsStamps:
+    """A counter per user id (modulo the slot count) in anonymous shared memory.
+
+    Created at import, so workers forked from a preloading master share it,
+    like the memory:// rate limit table. Users sharing a slot only cost
+    each other an extra reload.
+    """
+
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, slots=CLAIMS_STAMP_SLOTS):
+        self.slots = slots
+        self._map = mmap.mmap(-1, slots * self.SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    def get(self, user_id):
+        return self.SLOT.unpack_from(self._map, self._offset(user_id))[0]
+
+    def bump(self, user_id):
+        offset = self._offset(user_id)
+        with self._lock:
+            self.SLOT.pack_into(self._map, offset, self.SLOT.unpack_from(self._map, offset)[0] + 1)
+
+    def _offset(self, user_id):
+        return (user_id % self.slots) * self.SLOT.size
+
+
+claims_stamps = ClaimsStamps()
+
+
+class Identity:
+    """The logged-in user for the current request"""
+
+    __slots__ = ('user_id', 'name', 'role', 'profile_completed', '_loader', '_user')
+
+    def __init__(self, user_id, name, role, profile_completed, loader, user=None):
+        self.user_id = user_id
+        self.name = name
+        self.role = role
+        self.profile_completed = profile_completed
+        self._loader = loader
+        self._user = user
+
+    @property
+    def user(self):
+        """The User row, loaded on first access"""
+        if self._user is None:
+            self._user = self._loader(self.user_id)
+        return self._user
+
+    @property
+    def is_admin(self):
+        return self.role in ('admin', 'superuser')
+
+
+def store_claims(user, stamp=None):
+    """Write the user's stable claims into the session.
+
+    ``stamp`` is the user's claims stamp read before ``user`` was loaded;
+    by default it is read now.
+    """
+    session['claims'] = {
+        'f': CLAIMS_FORMAT,
+        'v': claims_stamps.get(user.id) if stamp is None else stamp,
+        'role': user.role,
+        'profile_completed': bool(user.completed_get_to_know_you),
+        'at': int(time.time()),
+    }
+
+
+def current_identity(loader):
+    """Identity for this request, or None when nobody is logged in.
+
+    ``loader`` maps a user id to a User (or None). It is only called when the
+    session claims are missing, expired, of an older CLAIMS_FORMAT or behind
+    the user's claims stamp. A locked account is logged out.
+    """
+    if '_identity' in g:
+        return g._identity
+
+    identity = None
+    user_id = session.get('user_id')
+    if user_id is not None:
+        claims = session.get('claims')
+        max_age = current_app.config.get('IDENTITY_CLAIMS_MAX_AGE', DEFAULT_CLAIMS_MAX_AGE)
+        stamp = claims_stamps.get(user_id)
+        if (claims and claims.get('f') == CLAIMS_FORMAT and time.time() - claims['at'] < max_age
+                and claims['v'] == stamp):
+            identity = Identity(user_id, session.get('user_name'), claims['role'],
+                                claims['profile_completed'], loader)
+        else:
+            # The stamp was read first: a change committed after it forces another reload
+            user = loader(user_id)
+            if user is not None and not user.is_account_locked():
+                store_claims(user, stamp)
+                identity = Identity(user_id, user.name, user.role,
+                                    bool(user.completed_get_to_know_you), loader, user=user)
+            else:
+                session.clear()
+
+    g._identity = identity
+    return identity
@@ -0,0 +1,251 @@
+"""Bulk ingestion of results synced from offline devices (POST /api/assessment/batch).
+
+The request body is newline-delimited JSON, optionally gzip- or
+deflate-compressed, with one finished test per line::
+
+    {"key": "tablet-7/0042", "test_type": "dyslexia", "responses": ["b", "b", "a", "a", "b"],
+     "response_times": [12.5, 9.0, 14.2, 7.8, 20.1], "completed_at": "2026-03-02T10:15:00Z",
+     "email": "student@example.org"}
+
+``key`` is chosen by the device and makes re-sending safe: a key the same
+account has already submitted is reported as a duplicate of the stored
+result instead of being saved twice. ``email`` names the student and may
+only differ from the caller's own for admins (a classroom tablet signed in
+as the teacher). ``response_times`` and ``completed_at`` are optional.
+
+The body is decompressed incrementally and handled BATCH_CHUNK_SIZE lines
+at a time. For each chunk:
+- the students' profiles and the already-used keys are read in two queries;
+- all submissions are scored per test type with evaluate_batch;
+- the results, their keys and the rollup totals are bulk-inserted in one
+  transaction.
+One status per line is yielded as each chunk commits.
+"""
+import json
+import math
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from assessment.ml_engine import assessment_engine
+from models.enhanced_models import db, User, Result, ResultSubmission, add_to_rollups, normalize_email
+
+BATCH_CHUNK_SIZE = 500
+MAX_LINE_BYTES = 64 * 1024
+MAX_RESPONSES = 200
+_key_max = ResultSubmission.__table__.c.idempotency_key.type.length
+
+class BatchError(ValueError):
+    """The body as a whole cannot be read (bad compression, too large)"""
+
+def decoder_for(content_encoding):
+    """zlib decompressor for a Content-Encoding, None for identity; raises BatchError if unsupported"""
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(zlib.MAX_WBITS | 16)
+    if encoding == 'deflate':
+        return zlib.decompressobj(zlib.MAX_WBITS | 32)  # zlib or gzip header
+    if encoding == 'identity':
+        return None
+    raise BatchError(f"Unsupported Content-Encoding {content_encoding!r}; use gzip, deflate or none")
+
+def _decoded_pieces(body, decoder, piece_size=256 * 1024):
+    if decoder is None:
+        for i in range(0, len(body), piece_size):
+            yield body[i:i + piece_size]
+        return
+    try:
+        for i in range(0, len(body), piece_size):
+            data = body[i:i + piece_size]
+            while data:
+                # Bounded output per call, so a small bomb cannot inflate all at once
+                yield decoder.decompress(data, piece_size)
+                data = decoder.unconsumed_tail
+        yield decoder.flush()
+    except zlib.error as e:
+        raise BatchError(f"Body is not valid compressed data ({e})") from None
+    if not decoder.eof:
+        raise BatchError("Compressed body is truncated")
+
+def iter_ndjson_lines(body, content_encoding=None, max_bytes=64 * 1024 * 1024, max_lines=50000):
+    """Yield (line number, raw line) for the non-blank lines of an NDJSON body"""
+    decoder = decoder_for(content_encoding)
+    pending, total, line_no = b'', 0, 0
+    for piece in _decoded_pieces(body, decoder):
+        total += len(piece)
+        if total > max_bytes:
+            raise BatchError(f"Decompressed body is larger than {max_bytes} bytes")
+        lines = (pending + piece).split(b'\n')
+        pending = lines.pop()
+        if len(pending) > MAX_LINE_BYTES:
+            raise BatchError(f"Line {line_no + len(lines) + 1} is longer than {MAX_LINE_BYTES} bytes")
+        if line_no + len(lines) > max_lines:
+            raise BatchError(f"More than {max_lines} lines in one batch")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if pending.strip():
+        line_no += 1
+        if line_no > max_lines:
+            raise BatchError(f"More than {max_lines} lines in one batch")
+        yield line_no, pending
+
+def _parse_time(value, now):
+    if value is None:
+        return now
+    if not isinstance(value, str):
+        raise ValueError("'completed_at' must be an ISO 8601 string")
+    completed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if completed.tzinfo is not None:
+        completed = completed.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(completed, now)  # device clocks run fast; never store a future time
+
+def _parse(raw, submitter_email, may_submit_for_others, form_lengths, now):
+    """Validated submission dict for one line; raises ValueError with the reason"""
+    try:
+        item = json.loads(raw)
+    except ValueError as e:  # JSONDecodeError and UnicodeDecodeError
+        raise ValueError(f"not valid JSON ({e})") from None
+    except RecursionError:
+        raise ValueError("not valid JSON (nested too deeply)") from None
+    if not isinstance(item, dict):
+        raise ValueError("each line must be a JSON object")
+    key = item.get('key')
+    if not isinstance(key, str) or not 0 < len(key) <= _key_max:
+        raise ValueError(f"'key' must be a string of 1 to {_key_max} characters")
+    test_type = item.get('test_type')
+    if not isinstance(test_type, str) or test_type not in form_lengths:
+        raise ValueError("'test_type' must be one of " + ', '.join(sorted(form_lengths)))
+    responses = item.get('responses')
+    if (not isinstance(responses, list) or len(responses) > MAX_RESPONSES
+            or not all(isinstance(r, str) for r in responses)):
+        raise ValueError("'responses' must be a list of strings")
+    if form_lengths[test_type] and len(responses) != form_lengths[test_type]:
+        raise ValueError(f"{test_type} needs {form_lengths[test_type]} responses")
+    times = item.get('response_times') or []
+    if (not isinstance(times, list) or len(times) > MAX_RESPONSES
+            or not all(isinstance(t, (int, float)) and not isinstance(t, bool) and 0 <= t < math.inf
+                       for t in times)):
+        raise ValueError("'response_times' must be a list of non-negative numbers")
+    email = item.get('email') or submitter_email
+    if not isinstance(email, str):
+        raise ValueError("'email' must be a string")
+    email = normalize_email(email)
+    if email != submitter_email and not may_submit_for_others:
+        raise ValueError("only admins may submit results for other students")
+    return dict(key=key, test_type=test_type, responses=responses, times=[float(t) for t in times],
+                completed_at=_parse_time(item.get('completed_at'), now), email=email)
+
+def _load_students(emails):
+    rows = db.session.execute(
+        select(User.id, User.email, User.age_group, User.learning_style, User.diagnosed_difficulties)
+        .where(User.email.in_(emails))
+    ).all()
+    return {row.email: row for row in rows}
+
+def _used_keys(submitter_id, keys):
+    rows = db.session.execute(
+        select(ResultSubmission.idempotency_key, ResultSubmission.result_id)
+        .where(ResultSubmission.submitter_id == submitter_id, ResultSubmission.idempotency_key.in_(keys))
+    ).all()
+    return dict(rows)
+
+def _ingest_chunk(chunk, submitter, may_submit_for_others, engine, on_created):
+    now = datetime.utcnow()
+    form_lengths = {test_type: len(engine.form_questions(test_type))
+                    for test_type in engine.assessment_configs}
+    statuses, pending = {}, []
+    for line_no, raw in chunk:
+        try:
+            pending.append((line_no, _parse(raw, submitter.email, may_submit_for_others, form_lengths, now)))
+        except ValueError as e:
+            statuses[line_no] = {'status': 'rejected', 'error': str(e)}
+
+    students = _load_students({item['email'] for _, item in pending})
+    used = _used_keys(submitter.id, [item['key'] for _, item in pending])
+    first_line = {}
+    by_type = {}
+    for line_no, item in pending:
+        key = item['key']
+        if key in used:
+            statuses[line_no] = {'key': key, 'status': 'duplicate', 'result_id': used[key]}
+        elif key in first_line:
+            statuses[line_no] = {'key': key, 'status': 'duplicate', 'duplicate_of_line': first_line[key]}
+        elif item['email'] not in students:
+            statuses[line_no] = {'key': key, 'status': 'rejected', 'error': f"no account for {item['email']}"}
+        else:
+            first_line[item['key']] = line_no
+            by_type.setdefault(item['test_type'], []).append((line_no, item))
+
+    created = []  # (line_no, item, profile, scored result, results row)
+    for test_type, items in by_type.items():
+        profiles = []
+        for _, item in items:
+            student = students[item['email']]
+            profiles.append({'age_group': student.age_group, 'learning_style': student.learning_style,
+                             'diagnosed_difficulties': student.diagnosed_difficulties})
+        scored = engine.evaluate_batch(test_type, [item['responses'] for _, item in items], profiles,
+                                       [item['times'] for _, item in items])
+        for (line_no, item), profile, result in zip(items, profiles, scored):
+            row = dict(
+                user_id=students[item['email']].id,
+                test_type=result['type'],
+                score=result['score'],
+                max_score=result['max_score'],
+                flag=bool(result['flag']),
+                message=result['message'],
+                confidence_score=result.get('confidence_score'),
+                recommendations=result.get('recommendations'),
+                time_taken=int(sum(item['times'])) if item['times'] else None,
+                responses=item['responses'],
+                response_times=item['times'] or None,
+                timestamp=item['completed_at']
+            )
+            created.append((line_no, item, profile, result, row))
+
+    if created:
+        rows = [row for *_, row in created]
+        result_ids = db.session.execute(
+            insert(Result).returning(Result.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        db.session.execute(insert(ResultSubmission.__table__), [
+            dict(submitter_id=submitter.id, idempotency_key=item['key'], result_id=result_id, created_at=now)
+            for (_, item, *_), result_id in zip(created, result_ids)
+        ])
+        add_to_rollups(rows)
+    db.session.commit()
+
+    for (line_no, item, _, result, _), result_id in zip(created, result_ids if created else ()):
+        statuses[line_no] = {'key': item['key'], 'status': 'created', 'result_id': result_id,
+                             'risk_level': result['risk_level'], 'flag': bool(result['flag'])}
+    if created and on_created is not None:
+        on_created([(result, profile) for _, _, profile, result, _ in created])
+    return [dict(line=line_no, **statuses[line_no]) for line_no, _ in chunk]
+
+def ingest_batch(lines, submitter, may_submit_for_others=False, chunk_size=BATCH_CHUNK_SIZE,
+                 engine=assessment_engine, on_created=None):
+    """Score and store submissions; yields a list of per-line statuses after each chunk commits.
+
+    ``lines`` comes from iter_ndjson_lines and ``submitter`` is the calling
+    User. ``on_created`` is called with the (scored result, student profile)
+    pairs of each chunk's new results once the chunk has committed.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield _ingest_chunk_retrying(chunk, submitter, may_submit_for_others, engine, on_created)
+            chunk = []
+    if chunk:
+        yield _ingest_chunk_retrying(chunk, submitter, may_submit_for_others, engine, on_created)
+
+def _ingest_chunk_retrying(chunk, submitter, may_submit_for_others, engine, on_created):
+    try:
+        return _ingest_chunk(chunk, submitter, may_submit_for_others, engine, on_created)
+    except IntegrityError:
+        # A concurrent sync stored some of these keys first; they now read back as duplicates
+        db.session.rollback()
+        return _ingest_chunk(chunk, submitter, may_submit_for_others, engine, on_created)
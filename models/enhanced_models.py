@@ -1,9 +1,17 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from services.password_hasher import password_hasher
+from identity import claims_stamps
+from assessment.norms import norm_segment
+from datetime import datetime, timedelta
+import base64
 import csv
+import io
 import re
-from sqlalchemy import CheckConstraint
+import zlib
+from sqlalchemy import CheckConstraint, and_, or_, case, event, func, distinct, select, delete, insert, update, bindparam, literal, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, contains_eager
 
 db = SQLAlchemy()
 
@@ -13,6 +21,8 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    # normalize_email(email), kept in step on flush; serves prefix searches from its index
+    email_normalized = db.Column(db.String(120), index=True)
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.String(20), default='student')
     completed_get_to_know_you = db.Column(db.Boolean, default=False)
@@ -20,6 +30,8 @@ class User(db.Model):
     last_login = db.Column(db.DateTime)
     failed_login_attempts = db.Column(db.Integer, default=0)
     account_locked_until = db.Column(db.DateTime)
+    # Bumped whenever role or lock changes; the commit also bumps the user's claims stamp (identity.py)
+    claims_version = db.Column(db.Integer, default=0, nullable=False)
     
     # User profile data
     age_group = db.Column(db.String(20))
@@ -32,15 +44,22 @@ class User(db.Model):
     __table_args__ = (
         CheckConstraint('length(name) >= 2', name='name_min_length'),
         CheckConstraint("email LIKE '%@%'", name='email_format'),
+        # Lets Postgres serve LIKE 'prefix%' from an index whatever the database collation;
+        # SQLite uses a range over ix_users_email_normalized instead
+        db.Index('ix_users_email_normalized_pattern', 'email_normalized',
+                 postgresql_ops={'email_normalized': 'varchar_pattern_ops'}).ddl_if(dialect='postgresql'),
     )
 
     def set_password(self, password):
         if len(password) < 8:
             raise ValueError("Password must be at least 8 characters long")
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
     def is_account_locked(self):
         if self.account_locked_until:
@@ -56,6 +75,143 @@ class User(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Changes to these columns invalidate claims cached in existing sessions (identity.py)
+CLAIM_COLUMNS = ('role', 'account_locked_until')
+
+@event.listens_for(User, 'before_update')
+def _bump_claims_version(mapper, connection, user):
+    state = db.inspect(user)
+    for name in CLAIM_COLUMNS:
+        history = state.attrs[name].history
+        if history.added and list(history.added) != list(history.deleted):
+            user.claims_version = (user.claims_version or 0) + 1
+            # Sessions are told once the change is committed, so a reload cannot read the old row
+            state.session.info.setdefault('claims_changed', set()).add(user.id)
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _publish_claims_changes(session):
+    for user_id in session.info.pop('claims_changed', ()):
+        claims_stamps.bump(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_claims_changes(session):
+    session.info.pop('claims_changed', None)
+
+class UserEmailTrigram(db.Model):
+    """Trigram index over users.email for substring search"""
+    __tablename__ = 'user_email_trigrams'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    gram = db.Column(db.String(3), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_user_email_trigrams_gram_user', 'gram', 'user_id'),
+    )
+
+def normalize_email(email):
+    """The one form emails are stored, indexed and searched in"""
+    return (email or '').strip().lower()
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _trigram_rows(user_id, email):
+    return [{'gram': gram, 'user_id': user_id} for gram in _trigrams(normalize_email(email))]
+
+@event.listens_for(User, 'before_insert')
+@event.listens_for(User, 'before_update')
+def _normalize_user_email(mapper, connection, user):
+    if user.email_normalized is None or db.inspect(user).attrs.email.history.has_changes():
+        user.email_normalized = normalize_email(user.email)
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def _index_user_email(mapper, connection, user):
+    """Keep user_email_trigrams in step with users.email"""
+    if not db.inspect(user).attrs.email.history.has_changes():
+        return
+    table = UserEmailTrigram.__table__
+    connection.execute(delete(table).where(table.c.user_id == user.id))
+    rows = _trigram_rows(user.id, user.email)
+    if rows:
+        connection.execute(insert(table), rows)
+
+def rebuild_email_index():
+    """Rebuild user_email_trigrams and users.email_normalized, normalizing exactly as new accounts are"""
+    db.session.execute(delete(UserEmailTrigram))
+    users = User.__table__
+    set_normalized = update(users).where(users.c.id == bindparam('user_id')).values(email_normalized=bindparam('normalized'))
+    stale = []
+    for user_id, email, email_normalized in db.session.query(User.id, User.email, User.email_normalized).yield_per(1000):
+        rows = _trigram_rows(user_id, email)
+        if rows:
+            db.session.execute(insert(UserEmailTrigram), rows)
+        if email_normalized != normalize_email(email):
+            stale.append({'user_id': user_id, 'normalized': normalize_email(email)})
+    if stale:
+        db.session.execute(set_normalized, stale)
+    db.session.commit()
+
+# Trigrams shared by more accounts than this are too common to narrow a search
+EMAIL_GRAM_MAX_USERS = 1000
+
+# Values of the admin email filter's match mode
+EMAIL_MATCHES = ('contains', 'prefix')
+
+def _gram_frequencies(grams, cap):
+    """Accounts indexed under each gram, counting no further than ``cap + 1``"""
+    table = UserEmailTrigram.__table__
+    probes = [
+        select(literal(gram).label('gram'), func.count().label('n'))
+        .select_from(select(table.c.id).where(table.c.gram == gram).limit(cap + 1).subquery())
+        for gram in grams
+    ]
+    return dict(db.session.execute(union_all(*probes)).all())
+
+def _email_prefix_filter(head):
+    """Normalized emails starting with ``head`` (normalized, no wildcards), in a form an index can serve"""
+    column = User.email_normalized
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return column.like(f"{head}%")
+    # SQLite compares text bytewise by default, so the prefix is a range of the plain index
+    if ord(head[-1]) == 0x10FFFF:
+        return column >= head
+    return and_(column >= head, column < head[:-1] + chr(ord(head[-1]) + 1))
+
+def _email_filter(email, match='contains'):
+    """Same matches as ``User.email ILIKE %email%`` (``email%`` with ``match='prefix'``), narrowed by an index.
+
+    Wildcards keep their ILIKE meaning. Prefix matches narrow on the literal
+    text before the first wildcard through the index on email_normalized. Contains
+    matches look up the trigrams of the literal runs between wildcards,
+    leaving out any shared by more than EMAIL_GRAM_MAX_USERS accounts;
+    needles with no usable trigram fall back to the plain scan.
+    """
+    literals = re.split(r'[%_\\]', normalize_email(email))
+    if match == 'prefix':
+        condition = User.email.ilike(f"{email}%")
+        return and_(_email_prefix_filter(literals[0]), condition) if literals[0] else condition
+    
+    condition = User.email.ilike(f"%{email}%")
+    grams = set()
+    for literal_run in literals:
+        grams |= _trigrams(literal_run)
+    if not grams:
+        return condition
+    counts = _gram_frequencies(grams, EMAIL_GRAM_MAX_USERS)
+    grams = {gram for gram in grams if counts.get(gram, 0) <= EMAIL_GRAM_MAX_USERS}
+    if not grams:
+        return condition  # most accounts would be candidates; scanning is cheaper
+    candidates = (
+        select(UserEmailTrigram.user_id)
+        .where(UserEmailTrigram.gram.in_(grams))
+        .group_by(UserEmailTrigram.user_id)
+        .having(func.count(distinct(UserEmailTrigram.gram)) == len(grams))
+    )
+    return and_(Result.user_id.in_(candidates), condition)
+
 class Result(db.Model):
     __tablename__ = 'results'
     
@@ -68,7 +224,7 @@ class Result(db.Model):
     flag = db.Column(db.Boolean, nullable=False)
     message = db.Column(db.Text)
     recommendations = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     # Assessment metadata
     time_taken = db.Column(db.Integer)  # seconds
@@ -79,6 +235,9 @@ class Result(db.Model):
         CheckConstraint('score >= 0', name='score_non_negative'),
         CheckConstraint('score <= max_score', name='score_within_range'),
         CheckConstraint('confidence_score >= 0 AND confidence_score <= 1', name='confidence_range'),
+        # Keyset pagination walks (timestamp, id) newest first
+        db.Index('ix_results_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_results_test_type_timestamp_id', 'test_type', 'timestamp', 'id'),
     )
     
     def to_dict(self):
@@ -103,57 +262,438 @@ class AssessmentSession(db.Model):
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     is_completed = db.Column(db.Boolean, default=False)
-    session_data = db.Column(db.JSON)  # Store progress
+    session_data = db.Column(db.JSON)  # Store progress (compacted)
+    progress_seq = db.Column(db.Integer, default=0, nullable=False)  # last event folded into session_data
+    
+    __table_args__ = (
+        db.Index('ix_assessment_sessions_id_user', 'id', 'user_id'),
+    )
+
+class AssessmentProgressEvent(db.Model):
+    """Append-only autosave deltas, folded into session_data by compact_progress"""
+    __tablename__ = 'assessment_progress_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('assessment_sessions.id', ondelete='CASCADE'), nullable=False)
+    delta = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_assessment_progress_events_session_id', 'session_id', 'id'),
+        # Event ids order deltas and must never be reused after compaction deletes rows
+        {'sqlite_autoincrement': True},
+    )
+
+# Autosave events a session collects before compact_pending_progress folds them in
+PROGRESS_COMPACT_EVERY = 50
+
+def lock_session(session_id, user_id=None):
+    """Lock the session row until commit and return it fresh (None if not found, or not ``user_id``'s).
+
+    Appends, compaction and answer checks of one session take turns this
+    way. SQLite ignores FOR UPDATE, so there a no-op UPDATE takes the
+    database write lock first, and what is read next stays current until
+    the commit.
+    """
+    conditions = [AssessmentSession.id == session_id]
+    if user_id is not None:
+        conditions.append(AssessmentSession.user_id == user_id)
+    if db.session.get_bind().dialect.name == 'sqlite':
+        db.session.execute(
+            update(AssessmentSession).where(*conditions).values(id=AssessmentSession.id)
+            .execution_options(synchronize_session=False)
+        )
+    return db.session.execute(
+        select(AssessmentSession).where(*conditions)
+        .with_for_update().execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+
+def append_progress(session_id, delta):
+    """Record one autosave delta; cost does not depend on how much progress exists.
+
+    The event id is allocated under the session row lock, so it commits
+    before any compaction that could otherwise move progress_seq past it.
+    """
+    lock_session(session_id)
+    db.session.add(AssessmentProgressEvent(session_id=session_id, delta=delta))
+    db.session.commit()
+
+def _progress_events(session_id, after_seq):
+    return db.session.query(AssessmentProgressEvent.id, AssessmentProgressEvent.delta).filter(
+        AssessmentProgressEvent.session_id == session_id,
+        AssessmentProgressEvent.id > after_seq
+    ).order_by(AssessmentProgressEvent.id)
+
+def get_progress_state(session_record):
+    """Current progress: the compacted snapshot with newer deltas applied in order"""
+    state = dict(session_record.session_data or {})
+    for _, delta in _progress_events(session_record.id, session_record.progress_seq or 0):
+        state.update(delta)
+    return state
+
+def compact_progress(session_id):
+    """Fold pending deltas into session_data and drop them.
+
+    Holds the session row lock (see append_progress). Where FOR UPDATE is
+    not supported (SQLite serializes writers anyway), progress_seq also acts
+    as an optimistic lock: a concurrent compaction simply loses (returns
+    False) instead of dropping events.
+    """
+    session_record = lock_session(session_id)
+    if session_record is None:
+        db.session.rollback()
+        return False
+    old_seq = session_record.progress_seq or 0
+    state = dict(session_record.session_data or {})
+    last_seq = old_seq
+    for event_id, delta in _progress_events(session_id, old_seq):
+        state.update(delta)
+        last_seq = event_id
+    if last_seq == old_seq:
+        db.session.rollback()
+        return True
+    
+    updated = db.session.execute(
+        db.update(AssessmentSession)
+        .where(AssessmentSession.id == session_id, AssessmentSession.progress_seq == old_seq)
+        .values(session_data=state, progress_seq=last_seq)
+    ).rowcount
+    if not updated:
+        db.session.rollback()
+        return False
+    db.session.execute(delete(AssessmentProgressEvent).where(
+        AssessmentProgressEvent.session_id == session_id,
+        AssessmentProgressEvent.id <= last_seq
+    ))
+    db.session.commit()
+    return True
+
+def compact_pending_progress(min_events=PROGRESS_COMPACT_EVERY):
+    """Compact every session with at least ``min_events`` deltas, or any if it is completed.
 
-def save_result(user_id, test_type, score, flag, message, **kwargs):
-    """Enhanced result saving with additional metadata"""
-    result = Result(
+    Run periodically (``flask compact-progress``) rather than from autosave
+    requests. Returns the number of sessions compacted.
+    """
+    pending = func.count(AssessmentProgressEvent.id)
+    session_ids = db.session.scalars(
+        select(AssessmentProgressEvent.session_id)
+        .join(AssessmentSession, AssessmentSession.id == AssessmentProgressEvent.session_id)
+        .group_by(AssessmentProgressEvent.session_id, AssessmentSession.is_completed)
+        .having(or_(pending >= min_events, AssessmentSession.is_completed.is_(True)))
+    ).all()
+    return sum(1 for session_id in session_ids if compact_progress(session_id))
+
+class OutboundEmail(db.Model):
+    """Queued mail, delivered by services.mail_queue.MailQueue"""
+    __tablename__ = 'outbound_emails'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # comma-separated
+    sender = db.Column(db.String(255))
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_by = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+class NormSketch(db.Model):
+    """Persisted score histogram for one test type and age group (assessment.norms)"""
+    __tablename__ = 'norm_sketches'
+    
+    test_type = db.Column(db.String(50), primary_key=True)
+    age_group = db.Column(db.String(20), primary_key=True)
+    counts = db.Column(db.LargeBinary, nullable=False)  # NORM_BINS little-endian uint32
+    total = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def norm_samples(chunk_size=1000):
+    """Yield (norm segment, age_group, fraction correct) for every stored result"""
+    rows = db.session.query(Result.test_type, User.age_group, Result.score, Result.max_score, Result.responses).join(
+        User, Result.user_id == User.id
+    ).yield_per(chunk_size)
+    for test_type, age_group, score, max_score, responses in rows:
+        if max_score:
+            # Adaptive results store (question id, answer) pairs
+            adaptive = bool(responses) and isinstance(responses[0], list)
+            yield norm_segment(test_type, adaptive), age_group, score / max_score
+
+class MigrationCheckpoint(db.Model):
+    """How far a resumable data migration has got (models.legacy_migration)"""
+    __tablename__ = 'migration_checkpoints'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, default=0, nullable=False)  # source rows up to here are done
+    copied = db.Column(db.Integer, default=0, nullable=False)
+    skipped = db.Column(db.Integer, default=0, nullable=False)
+    users_created = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'last_id': self.last_id,
+            'copied': self.copied,
+            'skipped': self.skipped,
+            'users_created': self.users_created,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ResultSubmission(db.Model):
+    """Idempotency key of a result sent through /api/assessment/batch (models.batch_submissions)"""
+    __tablename__ = 'result_submissions'
+    
+    submitter_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    idempotency_key = db.Column(db.String(100), primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey('results.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyResultRollup(db.Model):
+    """Per-day, per-test totals kept up to date as results are saved"""
+    __tablename__ = 'daily_result_rollups'
+    
+    day = db.Column(db.Date, primary_key=True)
+    test_type = db.Column(db.String(50), primary_key=True)
+    submissions = db.Column(db.Integer, default=0, nullable=False)
+    flagged = db.Column(db.Integer, default=0, nullable=False)
+    score_sum = db.Column(db.Integer, default=0, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'test_type': self.test_type,
+            'submissions': self.submissions,
+            'flagged': self.flagged,
+            'flag_rate': self.flagged / self.submissions if self.submissions else 0.0,
+            'mean_score': self.score_sum / self.submissions if self.submissions else 0.0
+        }
+
+def save_result(user_id, test_type, score, flag, message, on_commit=None, **kwargs):
+    """Enhanced result saving with additional metadata.
+
+    Returns the new Result. With the write-behind buffer on it is not in the
+    session and has no id, since the row is inserted by the buffer; a durable
+    ack that times out raises services.result_writer.ResultAckTimeout.
+    ``on_commit()`` is called once the row is committed, and never if it is
+    not; with the buffer on it may run later, on the buffer's thread.
+    """
+    row = dict(
         user_id=user_id,
         test_type=test_type,
         score=score,
+        max_score=kwargs.get('max_score', 5),
         flag=bool(flag),
         message=message,
         confidence_score=kwargs.get('confidence_score'),
         recommendations=kwargs.get('recommendations'),
         time_taken=kwargs.get('time_taken'),
         responses=kwargs.get('responses'),
-        response_times=kwargs.get('response_times')
+        response_times=kwargs.get('response_times'),
+        timestamp=datetime.utcnow()
     )
+    writer = current_app.extensions.get('result_writer')
+    if writer is not None and writer.enabled:
+        writer.submit(row, on_commit)
+        return Result(**row)
+    result = Result(**row)
     db.session.add(result)
+    add_to_rollups([row])
     db.session.commit()
+    if on_commit is not None:
+        on_commit()
     return result
 
-def get_filtered_results(email=None, test_type=None, user_id=None):
-    """Enhanced filtering with user relationship"""
+def on_results_flushed(rows):
+    """Bookkeeping for rows bulk-inserted by the write-behind buffer"""
+    add_to_rollups(rows)
+
+# Default window for the analytics dashboard, and the most it will show
+ANALYTICS_DAYS = 30
+MAX_ANALYTICS_DAYS = 3660
+
+def add_to_rollups(rows):
+    """Add result rows (dicts) to the daily totals with one upsert (no commit)"""
+    totals = {}
+    for row in rows:
+        key = (row['timestamp'].date(), row['test_type'])
+        counts = totals.setdefault(key, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += 1 if row['flag'] else 0
+        counts[2] += row['score'] or 0
+    if not totals:
+        return
+    values = [
+        dict(day=day, test_type=test_type, submissions=n, flagged=flagged, score_sum=score_sum)
+        for (day, test_type), (n, flagged, score_sum) in totals.items()
+    ]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_stmt = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert_stmt(DailyResultRollup).values(values)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['day', 'test_type'],
+            set_={
+                'submissions': DailyResultRollup.submissions + stmt.excluded.submissions,
+                'flagged': DailyResultRollup.flagged + stmt.excluded.flagged,
+                'score_sum': DailyResultRollup.score_sum + stmt.excluded.score_sum,
+            }
+        ))
+        return
+    # Other backends: read-modify-write under the current transaction
+    for value in values:
+        rollup = db.session.get(DailyResultRollup, (value['day'], value['test_type']))
+        if rollup is None:
+            db.session.add(DailyResultRollup(**value))
+        else:
+            rollup.submissions += value['submissions']
+            rollup.flagged += value['flagged']
+            rollup.score_sum += value['score_sum']
+
+def rebuild_daily_rollups(since=None):
+    """Recompute the daily totals from ``results``, for days from ``since`` on (default all)"""
+    day = func.date(Result.timestamp, type_=db.Date)
+    stale = DailyResultRollup.query
+    query = db.session.query(
+        day, Result.test_type, func.count(Result.id),
+        func.sum(case((Result.flag, 1), else_=0)), func.coalesce(func.sum(Result.score), 0)
+    ).filter(Result.timestamp.isnot(None))
+    if since is not None:
+        stale = stale.filter(DailyResultRollup.day >= since)
+        query = query.filter(Result.timestamp >= datetime.combine(since, datetime.min.time()))
+    stale.delete()
+    db.session.add_all(
+        DailyResultRollup(day=d, test_type=test_type, submissions=n, flagged=flagged, score_sum=score_sum)
+        for d, test_type, n, flagged, score_sum in query.group_by(day, Result.test_type)
+    )
+    db.session.commit()
+
+def get_daily_rollups(days=ANALYTICS_DAYS, test_type=None):
+    """Daily totals for the last ``days`` days, newest first; never touches ``results``"""
+    days = max(1, min(days, MAX_ANALYTICS_DAYS))
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    query = DailyResultRollup.query.filter(DailyResultRollup.day >= since)
+    if test_type:
+        query = query.filter(DailyResultRollup.test_type == test_type)
+    return query.order_by(DailyResultRollup.day.desc(), DailyResultRollup.test_type).all()
+
+def summarize_rollups(rollups):
+    """Fold daily rows into per-test totals for the whole window"""
+    totals = {}
+    for r in rollups:
+        t = totals.setdefault(r.test_type, {'test_type': r.test_type, 'submissions': 0, 'flagged': 0, 'score_sum': 0})
+        t['submissions'] += r.submissions
+        t['flagged'] += r.flagged
+        t['score_sum'] += r.score_sum
+    for t in totals.values():
+        t['flag_rate'] = t['flagged'] / t['submissions'] if t['submissions'] else 0.0
+        t['mean_score'] = t.pop('score_sum') / t['submissions'] if t['submissions'] else 0.0
+    return sorted(totals.values(), key=lambda t: t['test_type'])
+
+# Rows fetched per round trip while streaming an export
+EXPORT_CHUNK_SIZE = 1000
+
+# Admin result pages
+RESULTS_PAGE_SIZE = 50
+MAX_RESULTS_PAGE_SIZE = 500
+
+def _filtered_query(email=None, test_type=None, user_id=None, email_match='contains'):
     query = db.session.query(Result).join(User)
     
     if email:
-        query = query.filter(User.email.ilike(f"%{email}%"))
+        query = query.filter(_email_filter(email, email_match))
     if test_type:
         query = query.filter(Result.test_type == test_type)
     if user_id:
         query = query.filter(Result.user_id == user_id)
     
-    return query.order_by(Result.timestamp.desc()).all()
+    return query.order_by(Result.timestamp.desc(), Result.id.desc())
+
+def get_filtered_results(email=None, test_type=None, user_id=None, email_match='contains'):
+    """Enhanced filtering with user relationship"""
+    return _filtered_query(email=email, test_type=test_type, user_id=user_id, email_match=email_match).all()
+
+def encode_cursor(result):
+    """Opaque cursor pointing just past ``result`` in newest-first order"""
+    raw = f"{result.timestamp.isoformat()}|{result.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) from encode_cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, result_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(result_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
 
-def export_results_to_csv(email=None, test_type=None):
-    """Enhanced CSV export with user data"""
-    results = get_filtered_results(email=email, test_type=test_type)
-    filename = f"exported_results_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+def get_results_page(email=None, test_type=None, user_id=None, cursor=None, page_size=RESULTS_PAGE_SIZE,
+                     email_match='contains'):
+    """Keyset-paginated filtering on (timestamp, id).
+
+    Returns ``(results, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    page_size = max(1, min(page_size, MAX_RESULTS_PAGE_SIZE))
+    query = _filtered_query(email=email, test_type=test_type, user_id=user_id, email_match=email_match)
+    if cursor:
+        timestamp, result_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Result.timestamp < timestamp,
+            and_(Result.timestamp == timestamp, Result.id < result_id)
+        ))
+    # The admin page shows each result's user; load them in the same query
+    results = query.options(contains_eager(Result.user)).limit(page_size + 1).all()
+    if len(results) > page_size:
+        return results[:page_size], encode_cursor(results[page_size - 1])
+    return results, None
+
+def export_results_to_csv(email=None, test_type=None, compress=False, chunk_size=EXPORT_CHUNK_SIZE,
+                          email_match='contains'):
+    """Stream the filtered results as CSV bytes, gzip-compressed if asked.
+
+    User columns are selected in the same query (no per-row lazy loads) and
+    rows arrive through a streaming cursor ``chunk_size`` at a time.
+    """
+    chunks = _iter_results_csv(email, test_type, chunk_size, email_match)
+    return _gzip_chunks(chunks) if compress else chunks
+
+def _iter_results_csv(email, test_type, chunk_size, email_match):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([
+        'User ID', 'Name', 'Email', 'Test Type', 'Score', 'Max Score',
+        'Confidence', 'Flag', 'Message', 'Time Taken', 'Timestamp'
+    ])
+    
+    rows = _filtered_query(email=email, test_type=test_type, email_match=email_match).with_entities(
+        Result.user_id, User.name, User.email, Result.test_type,
+        Result.score, Result.max_score, Result.confidence_score,
+        Result.flag, Result.message, Result.time_taken, Result.timestamp
+    ).yield_per(chunk_size)
     
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
+    for i, (user_id, name, email_, test_type_, score, max_score, confidence,
+            flag, message, time_taken, timestamp) in enumerate(rows, 1):
         writer.writerow([
-            'User ID', 'Name', 'Email', 'Test Type', 'Score', 'Max Score',
-            'Confidence', 'Flag', 'Message', 'Time Taken', 'Timestamp'
+            user_id, name, email_, test_type_, score, max_score, confidence or 'N/A',
+            'Yes' if flag else 'No', message, time_taken or 'N/A', timestamp
         ])
-        
-        for r in results:
-            writer.writerow([
-                r.user_id, r.user.name, r.user.email, r.test_type,
-                r.score, r.max_score, r.confidence_score or 'N/A',
-                'Yes' if r.flag else 'No', r.message,
-                r.time_taken or 'N/A', r.timestamp
-            ])
-    
-    return filename
\ No newline at end of file
+        if i % chunk_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,194 @@
+"""Backfill the enhanced schema from the legacy tables (models/legacy_models.py).
+
+Legacy ``result`` rows carry a free-text name and email instead of a user
+id. They are read in primary-key order, a chunk at a time. Each email is
+resolved to ``users.id`` through an in-memory index of normalized emails.
+Students who never had an account get one with an unusable password, which
+they can replace through "forgot password". Each chunk is bulk-inserted,
+together with its rollup totals and the checkpoint, in one short
+transaction. An interrupted run therefore resumes exactly where it
+stopped, and neither database holds a lock for longer than one chunk.
+A database without the legacy tables has nothing to migrate, so the
+migration can run on every deploy.
+"""
+from datetime import datetime
+
+from sqlalchemy import create_engine, insert, inspect, select
+
+from models import legacy_models as legacy
+from models.enhanced_models import (
+    db, User, Result, UserEmailTrigram, MigrationCheckpoint, _trigram_rows, add_to_rollups,
+    normalize_email as _normalize_email
+)
+from services.db_engine import normalize_database_url
+
+MIGRATION_CHUNK_SIZE = 5000
+USERS_CHECKPOINT = 'legacy-users'
+RESULTS_CHECKPOINT = 'legacy-results'
+
+# check_password_hash() rejects it, so migrated students must reset their password to log in
+UNUSABLE_PASSWORD = '!'
+
+# Legacy tests did not store their maximum; all had five questions except the four-item memory test
+LEGACY_MAX_SCORES = {'Working Memory': 4}
+DEFAULT_LEGACY_MAX_SCORE = 5
+
+_name_max = User.__table__.c.name.type.length
+_email_max = User.__table__.c.email.type.length
+
+def normalize_email(email):
+    """Key used to match legacy emails to accounts, or None if unusable"""
+    email = _normalize_email(email)
+    if '@' not in email or len(email) > _email_max:
+        return None
+    return email
+
+def _display_name(name, email):
+    name = (name or '').strip() or email.split('@', 1)[0]
+    return name.ljust(2, '_')[:_name_max]  # users.name must be 2+ characters
+
+def load_user_index():
+    """Normalized email -> users.id for every existing account"""
+    index = {}
+    rows = db.session.execute(select(User.id, User.email).execution_options(yield_per=10000))
+    for user_id, email in rows:
+        index.setdefault(_normalize_email(email), user_id)
+    return index
+
+def get_checkpoint(name):
+    checkpoint = db.session.get(MigrationCheckpoint, name)
+    if checkpoint is None:
+        checkpoint = MigrationCheckpoint(name=name, last_id=0, copied=0, skipped=0, users_created=0)
+        db.session.add(checkpoint)
+        db.session.commit()
+    return checkpoint
+
+def _create_users(users, index):
+    """Insert accounts for emails not in ``index`` yet and add them to it (no commit)"""
+    new = {}
+    for user in users:
+        if user['email'] not in index:
+            new.setdefault(user['email'], user)
+    if not new:
+        return 0
+    db.session.execute(insert(User.__table__), [dict(user, email_normalized=email) for email, user in new.items()])
+    created = db.session.execute(select(User.id, User.email).where(User.email.in_(list(new)))).all()
+    trigrams = []
+    for user_id, email in created:
+        index[email] = user_id
+        trigrams.extend(_trigram_rows(user_id, email))
+    if trigrams:
+        db.session.execute(insert(UserEmailTrigram.__table__), trigrams)
+    return len(new)
+
+def _has_rows_after(source, table, after_id):
+    with source.connect() as conn:
+        return conn.execute(select(table.c.id).where(table.c.id > after_id).limit(1)).first() is not None
+
+def _read_chunk(source, table, columns, after_id, chunk_size):
+    with source.connect() as conn:
+        return conn.execute(
+            select(*columns).where(table.c.id > after_id).order_by(table.c.id).limit(chunk_size)
+        ).all()
+
+def _commit_chunk(checkpoint, last_id, copied, skipped, users_created):
+    checkpoint.last_id = last_id
+    checkpoint.copied += copied
+    checkpoint.skipped += skipped
+    checkpoint.users_created += users_created
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+
+def migrate_legacy_users(source, index, chunk_size=MIGRATION_CHUNK_SIZE, progress=None):
+    """Copy legacy accounts (with their password hashes) that have no enhanced account yet"""
+    table = legacy.User.__table__
+    columns = (table.c.id, table.c.name, table.c.email, table.c.password_hash, table.c.role,
+               table.c.completed_get_to_know_you)
+    checkpoint = get_checkpoint(USERS_CHECKPOINT)
+    while True:
+        rows = _read_chunk(source, table, columns, checkpoint.last_id, chunk_size)
+        if not rows:
+            db.session.commit()
+            return checkpoint
+        users, skipped = [], 0
+        for row in rows:
+            email = normalize_email(row.email)
+            if email is None or not row.password_hash:
+                skipped += 1
+                continue
+            users.append(dict(name=_display_name(row.name, email), email=email, password_hash=row.password_hash,
+                              role=row.role or 'student',
+                              completed_get_to_know_you=bool(row.completed_get_to_know_you)))
+        created = _create_users(users, index)
+        _commit_chunk(checkpoint, rows[-1].id, created, skipped + len(users) - created, created)
+        if progress is not None:
+            progress(checkpoint)
+
+def migrate_legacy_results(source, index, chunk_size=MIGRATION_CHUNK_SIZE, progress=None, limit=None):
+    """Copy legacy results into ``results``, creating accounts for unknown emails.
+
+    Rows without a usable email, score, test type or timestamp are counted
+    as skipped. ``limit`` stops after roughly that many source rows.
+    """
+    table = legacy.Result.__table__
+    columns = (table.c.id, table.c.name, table.c.email, table.c.test_type, table.c.score, table.c.flag,
+               table.c.message, table.c.timestamp)
+    checkpoint = get_checkpoint(RESULTS_CHECKPOINT)
+    read = 0
+    while limit is None or read < limit:
+        rows = _read_chunk(source, table, columns, checkpoint.last_id, chunk_size)
+        if not rows:
+            break
+        read += len(rows)
+        usable, new_users = [], {}
+        for row in rows:
+            email = normalize_email(row.email)
+            if email is None or not row.test_type or row.score is None or row.score < 0 or row.timestamp is None:
+                continue
+            usable.append((row, email))
+            if email not in index and email not in new_users:
+                new_users[email] = dict(name=_display_name(row.name, email), email=email,
+                                        password_hash=UNUSABLE_PASSWORD, role='student',
+                                        completed_get_to_know_you=False, created_at=row.timestamp)
+        users_created = _create_users(list(new_users.values()), index)
+        results = []
+        for row, email in usable:
+            max_score = max(LEGACY_MAX_SCORES.get(row.test_type, DEFAULT_LEGACY_MAX_SCORE), row.score)
+            results.append(dict(user_id=index[email], test_type=row.test_type, score=row.score,
+                                max_score=max_score, flag=bool(row.flag), message=row.message,
+                                timestamp=row.timestamp))
+        if results:
+            db.session.execute(insert(Result.__table__), results)
+            add_to_rollups(results)
+        _commit_chunk(checkpoint, rows[-1].id, len(results), len(rows) - len(results), users_created)
+        if progress is not None:
+            progress(checkpoint)
+    db.session.commit()
+    return checkpoint
+
+def has_legacy_tables(source):
+    inspector = inspect(source)
+    return all(inspector.has_table(model.__table__.name) for model in (legacy.User, legacy.Result))
+
+def migrate_legacy(source_url=None, chunk_size=MIGRATION_CHUNK_SIZE, progress=None, limit=None):
+    """Migrate legacy accounts, then results; safe to re-run after an interruption.
+
+    ``source_url`` is the legacy database; by default the legacy tables are
+    read from the app's own database. Returns the two checkpoints, or
+    (None, None) if the source has no legacy tables.
+    """
+    source = create_engine(normalize_database_url(source_url)) if source_url else db.engine
+    try:
+        if not has_legacy_tables(source):
+            return None, None
+        if not (_has_rows_after(source, legacy.User.__table__, get_checkpoint(USERS_CHECKPOINT).last_id)
+                or _has_rows_after(source, legacy.Result.__table__, get_checkpoint(RESULTS_CHECKPOINT).last_id)):
+            # Already migrated: a release need not load every account's email
+            return get_checkpoint(USERS_CHECKPOINT), get_checkpoint(RESULTS_CHECKPOINT)
+        index = load_user_index()
+        users = migrate_legacy_users(source, index, chunk_size, progress)
+        results = migrate_legacy_results(source, index, chunk_size, progress, limit)
+    finally:
+        if source_url:
+            source.dispose()
+    return users, results
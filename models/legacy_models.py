@@ -0,0 +1,27 @@
+"""Tables of the original single-module app, kept only so models.legacy_migration can read them.
+
+Nothing writes to these tables any more; the app runs on models.enhanced_models.
+"""
+from flask_sqlalchemy import SQLAlchemy
+
+from datetime import datetime
+
+db = SQLAlchemy()
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128), nullable=False)
+    role = db.Column(db.String(20), default='student')
+    completed_get_to_know_you = db.Column(db.Boolean, default=False)
+
+class Result(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150))
+    email = db.Column(db.String(150))
+    test_type = db.Column(db.String(50))
+    score = db.Column(db.Integer)
+    flag = db.Column(db.Boolean)
+    message = db.Column(db.String(255))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
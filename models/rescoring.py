@@ -0,0 +1,234 @@
+"""Re-score stored results with the current assessment engine.
+
+After thresholds, weights or answer keys change, the stored ``score``,
+``max_score``, ``flag``, ``confidence_score``, ``message`` and
+``recommendations`` of older results are stale. This job reads
+``results`` together with each student's profile in id ranges of
+``chunk_size`` and hands the ranges to a process pool. Each worker reads
+its range in one query and scores it per test type with evaluate_batch.
+It then writes back only the rows whose outcome changed, in one bulk
+UPDATE, and corrects the flagged counts and score sums of the daily
+rollups in the same transaction. Workers share nothing but the database,
+so throughput grows with the number of workers until the database
+saturates.
+
+Progress is checkpointed in ``migration_checkpoints`` under a name derived
+from the scoring configuration: ``last_id`` is the end of the completed
+ranges, ``copied`` counts rewritten rows and ``skipped`` rows that cannot
+be re-scored. A rerun with the same configuration resumes, and a changed
+configuration starts over. Dry runs change nothing and only report.
+
+Submission counts do not change. Adaptive results, which store (question,
+answer) pairs, and legacy results without responses are skipped.
+"""
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, select, update
+
+from assessment.ml_engine import assessment_engine
+from models.enhanced_models import db, User, Result, DailyResultRollup, MigrationCheckpoint
+from models.legacy_migration import get_checkpoint
+
+RESCORE_CHUNK_SIZE = 5000
+# Result.test_type as saved -> engine test type
+RESULT_TEST_TYPES = {'Dyslexia': 'dyslexia', 'Dyscalculia': 'dyscalculia', 'Working Memory': 'memory'}
+REPORT_COLUMNS = ['id', 'user_id', 'test_type', 'timestamp', 'old_score', 'new_score', 'old_flag', 'new_flag',
+                  'old_confidence', 'new_confidence', 'old_message', 'new_message']
+
+def scoring_fingerprint(engine=assessment_engine):
+    """Short hash of the configuration and fixed forms scoring depends on; names the checkpoint.
+
+    Changes to the scoring code itself are not seen: rerun with restart
+    after deploying one.
+    """
+    engine.compile_plans()
+    state = {
+        test_type: [engine.assessment_configs[test_type], plan.answer_key, plan.weights, plan.difficulties,
+                    dict(plan.messages), dict(plan.recommendations)]
+        for test_type, plan in engine.plans().items()
+    }
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode()).hexdigest()[:12]
+
+def _scorable(responses, response_times):
+    return (isinstance(responses, list) and responses and all(isinstance(r, str) for r in responses)
+            and (response_times is None or isinstance(response_times, list)))
+
+def rescore_range(lo, hi, dry_run=False, with_changes=False, engine=assessment_engine):
+    """Re-score results with lo <= id < hi and write back the changed ones (unless ``dry_run``).
+
+    Returns the range's counters, plus the changed rows as REPORT_COLUMNS
+    lists when ``with_changes`` is set.
+    """
+    rows = db.session.execute(
+        select(Result.id, Result.user_id, Result.test_type, Result.timestamp, Result.responses,
+               Result.response_times, Result.score, Result.max_score, Result.flag, Result.confidence_score,
+               Result.message, Result.recommendations, User.age_group, User.learning_style, User.diagnosed_difficulties)
+        .join(User, Result.user_id == User.id)
+        .where(Result.id >= lo, Result.id < hi)
+        .order_by(Result.id)
+    ).all()
+    by_type, skipped = {}, 0
+    for row in rows:
+        test_type = RESULT_TEST_TYPES.get(row.test_type)
+        if test_type is None or not _scorable(row.responses, row.response_times):
+            skipped += 1
+            continue
+        by_type.setdefault(test_type, []).append(row)
+
+    updates, changes, rollup_deltas = [], [], {}
+    transitions = Counter()
+    for test_type, group in by_type.items():
+        profiles = [{'age_group': r.age_group, 'learning_style': r.learning_style,
+                     'diagnosed_difficulties': r.diagnosed_difficulties} for r in group]
+        times = [r.response_times or [] for r in group] if test_type != 'memory' else None
+        scored = engine.evaluate_batch(test_type, [r.responses for r in group], profiles, times)
+        for row, result in zip(group, scored):
+            flag = bool(result['flag'])
+            if (result['score'] == row.score and result['max_score'] == row.max_score and flag == row.flag
+                    and row.confidence_score is not None
+                    and abs(result['confidence_score'] - row.confidence_score) < 1e-9
+                    and result['message'] == row.message and result['recommendations'] == row.recommendations):
+                continue
+            updates.append({'id': row.id, 'score': result['score'], 'max_score': result['max_score'], 'flag': flag,
+                            'confidence_score': result['confidence_score'], 'message': result['message'],
+                            'recommendations': result['recommendations']})
+            if flag != row.flag:
+                transitions[(row.test_type, 'flagged' if flag else 'cleared')] += 1
+            if row.timestamp is not None:
+                # (flagged, score_sum), as add_to_rollups counted the row
+                delta = rollup_deltas.setdefault((row.timestamp.date(), row.test_type), [0, 0])
+                delta[0] += int(flag) - int(bool(row.flag))
+                delta[1] += result['score'] - (row.score or 0)
+            if with_changes:
+                changes.append([row.id, row.user_id, row.test_type, row.timestamp, row.score, result['score'],
+                                row.flag, flag, row.confidence_score, result['confidence_score'],
+                                row.message, result['message']])
+
+    if updates and not dry_run:
+        db.session.execute(update(Result), updates)
+        deltas = [{'flagged_delta': flagged, 'score_delta': score, 'rollup_day': day, 'rollup_type': test_type}
+                  for (day, test_type), (flagged, score) in rollup_deltas.items() if flagged or score]
+        if deltas:
+            rollups = DailyResultRollup.__table__
+            db.session.execute(
+                update(rollups)
+                .where(rollups.c.day == bindparam('rollup_day'), rollups.c.test_type == bindparam('rollup_type'))
+                .values(flagged=rollups.c.flagged + bindparam('flagged_delta'),
+                        score_sum=rollups.c.score_sum + bindparam('score_delta')),
+                deltas
+            )
+        db.session.commit()
+    else:
+        db.session.rollback()
+    return {'lo': lo, 'hi': hi, 'scanned': len(rows), 'changed': len(updates), 'skipped': skipped,
+            'transitions': transitions, 'changes': changes}
+
+_worker_app = None
+
+def _init_worker(app):
+    """Pool initializer: give the worker its own connections and an app context"""
+    global _worker_app
+    if app is None:  # spawned, not forked: build the app from the environment
+        from app import create_app
+        app = create_app()
+    _worker_app = app
+    with app.app_context():
+        # Forked from a parent that disposed of its pool; start clean without touching its sockets
+        db.engine.dispose(close=False)
+
+def _rescore_task(lo, hi, dry_run, with_changes):
+    with _worker_app.app_context():
+        try:
+            return rescore_range(lo, hi, dry_run, with_changes)
+        finally:
+            db.session.remove()
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+def rescore_results(app, workers=None, chunk_size=RESCORE_CHUNK_SIZE, dry_run=False, report=None,
+                    restart=False, progress=None):
+    """Re-score every result in parallel; returns the totals.
+
+    ``report`` is a path for a CSV of the changed rows. ``progress`` is
+    called with the running totals after each range.
+    """
+    workers = workers or os.cpu_count() or 1
+    fingerprint = scoring_fingerprint()
+    name = f'rescore-{fingerprint}'
+    checkpoint = None
+    start = 1
+    if not dry_run:
+        if restart:
+            db.session.query(MigrationCheckpoint).filter_by(name=name).delete()
+            db.session.commit()
+        checkpoint = get_checkpoint(name)
+        start = checkpoint.last_id + 1
+    max_id = db.session.query(func.max(Result.id)).scalar() or 0
+    ranges = [(lo, min(lo + chunk_size, max_id + 1)) for lo in range(start, max_id + 1, chunk_size)]
+    totals = {'scanned': 0, 'changed': 0, 'skipped': 0, 'transitions': Counter(), 'fingerprint': fingerprint,
+              'ranges': len(ranges)}
+    # Nothing pooled may be inherited by forked workers
+    db.session.remove()
+    db.engine.dispose()
+    if checkpoint is not None:
+        checkpoint = db.session.get(MigrationCheckpoint, name)
+
+    report_file = open(report, 'w', newline='', encoding='utf-8') if report else None
+    writer = csv.writer(report_file) if report_file else None
+    if writer:
+        writer.writerow(REPORT_COLUMNS)
+    context = _pool_context()
+    done, watermark = set(), start - 1
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(app if context.get_start_method() == 'fork' else None,)) as pool:
+            todo = iter(ranges)
+            running = set()
+            while True:
+                for lo, hi in todo:
+                    running.add(pool.submit(_rescore_task, lo, hi, dry_run, writer is not None))
+                    if len(running) >= 2 * workers:  # bounded, so results stream back as ranges finish
+                        break
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stats = future.result()
+                    for key in ('scanned', 'changed', 'skipped'):
+                        totals[key] += stats[key]
+                    totals['transitions'].update(stats['transitions'])
+                    if writer:
+                        writer.writerows(stats['changes'])
+                    done.add((stats['lo'], stats['hi']))
+                    if checkpoint is not None:
+                        watermark = _advance(checkpoint, done, watermark, stats)
+                    if progress is not None:
+                        progress(totals, watermark)
+    finally:
+        if report_file:
+            report_file.close()
+    return totals
+
+def _advance(checkpoint, done, watermark, stats):
+    """Move the checkpoint over the ranges finished without gaps; returns the new watermark"""
+    checkpoint.copied += stats['changed']
+    checkpoint.skipped += stats['skipped']
+    while True:
+        following = next((r for r in done if r[0] == watermark + 1), None)
+        if following is None:
+            break
+        done.discard(following)
+        watermark = following[1] - 1
+    checkpoint.last_id = watermark
+    checkpoint.updated_at = datetime.utcnow()
+    db.session.commit()
+    return watermark
@@ -0,0 +1,100 @@
+"""Bring an existing database up to date with the models.
+
+db.create_all() only creates tables that are missing; it never changes a
+table that already exists. upgrade_schema() covers the rest: it adds the
+columns and indexes that the models have gained since a table was created.
+It is idempotent and runs as part of ``flask init-db``.
+
+A new NOT NULL column needs a scalar default (or server default) to fill
+in the existing rows. An existing column that became NOT NULL is filled
+from NOT_NULL_BACKFILLS and, where the database can alter a column in
+place (not SQLite), gets the constraint too. Anything else, such as a
+changed type or a dropped column, still needs a hand-written migration.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, literal, update
+from sqlalchemy.schema import CreateIndex
+
+from models.enhanced_models import db
+
+# Values for NULLs left in columns the models have since made NOT NULL
+NOT_NULL_BACKFILLS = {
+    # Results saved without a time sort as the oldest, where SQLite already put them
+    'results.timestamp': datetime(1970, 1, 1),
+}
+
+class SchemaUpgradeError(RuntimeError):
+    """A model change that cannot be applied automatically"""
+
+def _literal_sql(value, type_, dialect):
+    return str(literal(value, type_).compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+def _column_default_sql(column, dialect):
+    if column.server_default is not None:
+        arg = column.server_default.arg
+        return _literal_sql(arg, column.type, dialect) if isinstance(arg, str) else str(arg.compile(dialect=dialect))
+    if column.default is not None and column.default.is_scalar:
+        return _literal_sql(column.default.arg, column.type, dialect)
+    return None
+
+def _add_column_sql(table, column, dialect):
+    preparer = dialect.identifier_preparer
+    sql = (f"ALTER TABLE {preparer.format_table(table)} "
+           f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=dialect)}")
+    default = _column_default_sql(column, dialect)
+    if default is not None:
+        sql += f" DEFAULT {default}"
+    if not column.nullable:
+        if default is None:
+            raise SchemaUpgradeError(f"{table.name}.{column.name} is NOT NULL without a scalar default")
+        sql += " NOT NULL"
+    return sql
+
+def _backfill_not_null(conn, table, column):
+    key = f"{table.name}.{column.name}"
+    if key not in NOT_NULL_BACKFILLS:
+        return []
+    changes = []
+    filled = conn.execute(
+        update(table).where(column.is_(None)).values({column.name: NOT_NULL_BACKFILLS[key]})
+    ).rowcount
+    if filled:
+        changes.append(f"{filled} values for {key}")
+    if conn.dialect.name == 'postgresql':
+        preparer = conn.dialect.identifier_preparer
+        conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} "
+                             f"ALTER COLUMN {preparer.format_column(column)} SET NOT NULL")
+        changes.append(f"NOT NULL constraint on {key}")
+    return changes
+
+def _index_applies(index, dialect):
+    """False for indexes declared with .ddl_if() for other dialects, which create_all skips too"""
+    ddl_if = index._ddl_if
+    if ddl_if is None or ddl_if.dialect is None:
+        return True
+    return dialect.name in ((ddl_if.dialect,) if isinstance(ddl_if.dialect, str) else ddl_if.dialect)
+
+def upgrade_schema(metadata=None, engine=None):
+    """Add missing columns and indexes to existing tables; returns what was added"""
+    metadata = metadata if metadata is not None else db.metadata
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue  # create_all makes it, indexes included
+            columns = {column['name']: column for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    conn.exec_driver_sql(_add_column_sql(table, column, conn.dialect))
+                    added.append(f"column {table.name}.{column.name}")
+                elif columns[column.name]['nullable'] and not column.nullable:
+                    added.extend(_backfill_not_null(conn, table, column))
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes and _index_applies(index, conn.dialect):
+                    conn.execute(CreateIndex(index))
+                    added.append(f"index {index.name}")
+    return added
@@ -1,25 +1,80 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-from models.enhanced_models import db, User, save_result, AssessmentSession
-from assessment.ml_engine import assessment_engine
+from flask import (Blueprint, current_app, render_template, request, redirect, url_for, session, flash, jsonify,
+                   Response, stream_with_context)
+from models.enhanced_models import (
+    db, User, save_result, AssessmentSession, append_progress, get_progress_state, lock_session
+)
+from models.batch_submissions import BatchError, decoder_for, iter_ndjson_lines, ingest_batch
+from assessment.ml_engine import NoAdaptiveItems, assessment_engine
+from assessment.norms import norm_segment
+from identity import current_identity
+from services.fragment_cache import render_results
+from services.result_writer import ResultAckTimeout
 from datetime import datetime
+from functools import wraps
 import json
 
 assessments_bp = Blueprint('assessments', __name__)
 
+def get_identity():
+    """Logged-in user for this request; the User row is loaded at most once"""
+    return current_identity(lambda user_id: db.session.get(User, user_id))
+
+def norm_sample(result, user_profile):
+    """(norm segment, age group, fraction correct) of a scored result, or None"""
+    if not result['max_score']:
+        return None
+    return (norm_segment(result['type'], adaptive='ability' in result), user_profile.get('age_group'),
+            result['score'] / result['max_score'])
+
+def lookup_percentile(result, user_profile):
+    """Percentile of this result among earlier ones for the same test and age group"""
+    norms = current_app.extensions.get('population_norms')
+    sample = norm_sample(result, user_profile)
+    if norms is None or sample is None:
+        return None
+    percentile = norms.percentile(*sample)
+    return round(percentile) if percentile is not None else None
+
+def record_norms(scored):
+    """Add (result, user_profile) pairs of committed results to the percentile norms in one go"""
+    norms = current_app.extensions.get('population_norms')
+    if norms is not None:
+        norms.record_many(sample for sample in (norm_sample(*pair) for pair in scored) if sample is not None)
+
+def store_result(result, user_profile, **fields):
+    """save_result() for a scored ``result``; marks it ``saving`` if the write is not acknowledged yet.
+
+    The result counts towards the norms once it is committed, which with
+    the write-behind buffer happens on the buffer's thread.
+    """
+    app = current_app._get_current_object()
+
+    def on_commit():
+        with app.app_context():
+            record_norms([(result, user_profile)])
+
+    try:
+        save_result(on_commit=on_commit, **fields)
+    except ResultAckTimeout:
+        # The row is still buffered and will be written; the student need not resubmit
+        current_app.logger.warning("Result for user %s not acknowledged in time", fields['user_id'])
+        result['saving'] = True
+
 def require_login(f):
     """Decorator to require user login"""
+    @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if get_identity() is None:
             flash('Please log in to access assessments.')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 def require_profile_completion(f):
-    """Decorator to require completed profile"""
+    """Decorator to require completed profile (checked from session claims)"""
+    @wraps(f)
     def decorated_function(*args, **kwargs):
-        user = db.session.get(User, session['user_id'])
-        if not user.completed_get_to_know_you:
+        if not get_identity().profile_completed:
             flash('Please complete the "Get to Know You" assessment first.')
             return redirect(url_for('main.landing'))
         return f(*args, **kwargs)
@@ -29,9 +84,9 @@ def require_profile_completion(f):
 @require_login
 @require_profile_completion
 def test_dyslexia():
-    user = db.session.get(User, session['user_id'])
-    
+    questions = assessment_engine.form_questions('dyslexia')
     if request.method == 'POST':
+        user = get_identity().user
         # Collect form data
         name = request.form.get('name', '').strip()
         email = request.form.get('email', '').strip()
@@ -40,7 +95,7 @@ def test_dyslexia():
         responses = []
         response_times = []
         
-        for i in range(1, 6):  # 5 questions
+        for i in range(1, len(questions) + 1):
             response = request.form.get(f'q{i}')
             if response:
                 responses.append(response)
@@ -53,9 +108,9 @@ def test_dyslexia():
                 except ValueError:
                     response_times.append(0)
         
-        if len(responses) != 5:
+        if len(responses) != len(questions):
             flash('Please answer all questions before submitting.')
-            return render_template('test_dyslexia.html')
+            return render_template('test_dyslexia.html', questions=questions)
         
         # Get user profile for ML engine
         user_profile = {
@@ -68,12 +123,16 @@ def test_dyslexia():
         result = assessment_engine.evaluate_assessment(
             'dyslexia', responses, user_profile, response_times
         )
+        result['percentile'] = lookup_percentile(result, user_profile)
         
         # Save enhanced result
-        save_result(
+        store_result(
+            result,
+            user_profile,
             user_id=user.id,
             test_type=result['type'],
             score=result['score'],
+            max_score=result['max_score'],
             flag=result['flag'],
             message=result['message'],
             confidence_score=result.get('confidence_score'),
@@ -83,24 +142,24 @@ def test_dyslexia():
             response_times=response_times
         )
         
-        return render_template('results.html', result=result)
+        return render_results(result, current_app.extensions.get('fragment_cache'))
     
-    return render_template('test_dyslexia.html')
+    return render_template('test_dyslexia.html', questions=questions)
 
 @assessments_bp.route('/test/dyscalculia', methods=['GET', 'POST'])
 @require_login
 @require_profile_completion
 def test_dyscalculia():
-    user = db.session.get(User, session['user_id'])
-    
+    questions = assessment_engine.form_questions('dyscalculia')
     if request.method == 'POST':
+        user = get_identity().user
         name = request.form.get('name', '').strip()
         email = request.form.get('email', '').strip()
         
         responses = []
         response_times = []
         
-        for i in range(1, 6):
+        for i in range(1, len(questions) + 1):
             response = request.form.get(f'q{i}')
             if response:
                 responses.append(response)
@@ -112,9 +171,9 @@ def test_dyscalculia():
                 except ValueError:
                     response_times.append(0)
         
-        if len(responses) != 5:
+        if len(responses) != len(questions):
             flash('Please answer all questions before submitting.')
-            return render_template('test_dyscalculia.html')
+            return render_template('test_dyscalculia.html', questions=questions)
         
         user_profile = {
             'age_group': user.age_group,
@@ -125,11 +184,15 @@ def test_dyscalculia():
         result = assessment_engine.evaluate_assessment(
             'dyscalculia', responses, user_profile, response_times
         )
+        result['percentile'] = lookup_percentile(result, user_profile)
         
-        save_result(
+        store_result(
+            result,
+            user_profile,
             user_id=user.id,
             test_type=result['type'],
             score=result['score'],
+            max_score=result['max_score'],
             flag=result['flag'],
             message=result['message'],
             confidence_score=result.get('confidence_score'),
@@ -139,17 +202,16 @@ def test_dyscalculia():
             response_times=response_times
         )
         
-        return render_template('results.html', result=result)
+        return render_results(result, current_app.extensions.get('fragment_cache'))
     
-    return render_template('test_dyscalculia.html')
+    return render_template('test_dyscalculia.html', questions=questions)
 
 @assessments_bp.route('/test/memory', methods=['GET', 'POST'])
 @require_login
 @require_profile_completion
 def test_memory():
-    user = db.session.get(User, session['user_id'])
-    
     if request.method == 'POST':
+        user = get_identity().user
         name = request.form.get('name', '').strip()
         email = request.form.get('email', '').strip()
         
@@ -175,11 +237,15 @@ def test_memory():
         result = assessment_engine.evaluate_assessment(
             'memory', selected_items, user_profile, [study_time, recall_time]
         )
+        result['percentile'] = lookup_percentile(result, user_profile)
         
-        save_result(
+        store_result(
+            result,
+            user_profile,
             user_id=user.id,
             test_type=result['type'],
             score=result['score'],
+            max_score=result['max_score'],
             flag=result['flag'],
             message=result['message'],
             confidence_score=result.get('confidence_score'),
@@ -189,44 +255,170 @@ def test_memory():
             response_times=[study_time, recall_time]
         )
         
-        return render_template('results.html', result=result)
+        return render_results(result, current_app.extensions.get('fragment_cache'))
     
     return render_template('test_memory.html')
 
+def adaptive_step(test_type, answers, user_profile):
+    """Next question or final result of an adaptive test, with the configured stopping rule"""
+    config = current_app.config
+    return assessment_engine.adaptive_step(
+        test_type, answers, user_profile,
+        se_target=config.get('ADAPTIVE_SE_TARGET', 0.45),
+        min_items=config.get('ADAPTIVE_MIN_ITEMS', 3),
+        max_items=config.get('ADAPTIVE_MAX_ITEMS', 20),
+        z=config.get('ADAPTIVE_CONFIDENCE_Z', 2.5)
+    )
+
+def pool_unavailable(test_type):
+    """503 for an adaptive test whose item pool is empty (e.g. a bank reload dropped it)"""
+    current_app.logger.error("No adaptive items for %s", test_type)
+    return jsonify({'error': 'Adaptive testing is unavailable right now; try the standard test'}), 503
+
 @assessments_bp.route('/api/assessment/start', methods=['POST'])
 @require_login
 def start_assessment():
-    """API endpoint to start an assessment session"""
+    """API endpoint to start an assessment session.
+
+    With "adaptive": true (dyslexia and dyscalculia only) the response
+    also carries the first question; answers then go to
+    /api/assessment/answer one at a time.
+    """
     data = request.get_json()
     test_type = data.get('test_type')
+    adaptive = bool(data.get('adaptive'))
     
     if test_type not in ['dyslexia', 'dyscalculia', 'memory']:
         return jsonify({'error': 'Invalid test type'}), 400
+    if adaptive and test_type == 'memory':
+        return jsonify({'error': 'The memory test cannot be adaptive'}), 400
+    
+    session_data = {'started_at': datetime.utcnow().isoformat()}
+    step = None
+    if adaptive:
+        try:
+            step = adaptive_step(test_type, [], {})
+        except NoAdaptiveItems:
+            return pool_unavailable(test_type)
+        session_data.update(adaptive=True, answers=[], pending=step['question']['id'])
     
     # Create assessment session
     session_record = AssessmentSession(
         user_id=session['user_id'],
         test_type=test_type,
-        session_data={'started_at': datetime.utcnow().isoformat()}
+        session_data=session_data
     )
     
     db.session.add(session_record)
     db.session.commit()
     
-    return jsonify({
+    response = {
         'session_id': session_record.id,
         'test_type': test_type,
         'started_at': session_record.started_at.isoformat()
-    })
+    }
+    if step is not None:
+        response['question'] = step['question']
+    return jsonify(response)
+
+@assessments_bp.route('/api/assessment/answer', methods=['POST'])
+@require_login
+def answer_question():
+    """API endpoint to answer the pending question of an adaptive assessment.
+
+    Returns the next question, or the result once the ability estimate
+    is precise enough; the result is then saved like a fixed-form one.
+    """
+    data = request.get_json()
+    # Held until the answer is recorded (or the request's rollback), so an
+    # answer sent twice is checked against what the first one left behind
+    session_record = lock_session(data.get('session_id'), user_id=session['user_id'])
+    
+    if not session_record:
+        return jsonify({'error': 'Session not found'}), 404
+    if session_record.is_completed:
+        return jsonify({'error': 'Assessment already completed'}), 409
+    
+    state = get_progress_state(session_record)
+    if not state.get('adaptive'):
+        return jsonify({'error': 'Not an adaptive assessment'}), 400
+    if data.get('question_id') != state.get('pending'):
+        return jsonify({'error': 'Answer the pending question', 'pending': state.get('pending')}), 409
+    answer = data.get('answer')
+    if answer not in ('a', 'b', 'c'):
+        return jsonify({'error': 'Answer must be a, b or c'}), 400
+    
+    user = get_identity().user
+    user_profile = {
+        'age_group': user.age_group,
+        'learning_style': user.learning_style,
+        'diagnosed_difficulties': user.diagnosed_difficulties
+    }
+    answers = state.get('answers', []) + [[state['pending'], answer]]
+    try:
+        step = adaptive_step(session_record.test_type, answers, user_profile)
+    except NoAdaptiveItems:
+        return pool_unavailable(session_record.test_type)
+    
+    if not step['done']:
+        append_progress(session_record.id, {'answers': answers, 'pending': step['question']['id']})
+        return jsonify({
+            'done': False,
+            'question': step['question'],
+            'items_answered': step['items_answered']
+        })
+    
+    result = step['result']
+    result['percentile'] = lookup_percentile(result, user_profile)
+    # Set first: save_result's commit ends the lock, and a retry waiting on it must see the test done
+    session_record.is_completed = True
+    session_record.completed_at = datetime.utcnow()
+    store_result(
+        result,
+        user_profile,
+        user_id=user.id,
+        test_type=result['type'],
+        score=result['score'],
+        max_score=result['max_score'],
+        flag=result['flag'],
+        message=result['message'],
+        confidence_score=result.get('confidence_score'),
+        recommendations=result.get('recommendations'),
+        responses=answers
+    )
+    db.session.commit()
+    append_progress(session_record.id, {'answers': answers, 'pending': None})
+    
+    return jsonify({'done': True, 'result': result})
 
 @assessments_bp.route('/api/assessment/progress', methods=['POST'])
 @require_login
 def save_progress():
-    """API endpoint to save assessment progress"""
+    """API endpoint to save assessment progress (appends a delta)"""
     data = request.get_json()
     session_id = data.get('session_id')
     progress_data = data.get('progress')
     
+    if not isinstance(progress_data, dict):
+        return jsonify({'error': 'Progress must be an object'}), 400
+    
+    # Ownership check only; the stored progress is never loaded on autosave
+    owned = db.session.query(AssessmentSession.id).filter_by(
+        id=session_id,
+        user_id=session['user_id']
+    ).first()
+    
+    if not owned:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    append_progress(session_id, progress_data)
+    
+    return jsonify({'status': 'success'})
+
+@assessments_bp.route('/api/assessment/progress/<int:session_id>', methods=['GET'])
+@require_login
+def get_progress(session_id):
+    """API endpoint to read the current assessment progress"""
     session_record = AssessmentSession.query.filter_by(
         id=session_id,
         user_id=session['user_id']
@@ -235,11 +427,51 @@ def save_progress():
     if not session_record:
         return jsonify({'error': 'Session not found'}), 404
     
-    # Update session data
-    current_data = session_record.session_data or {}
-    current_data.update(progress_data)
-    session_record.session_data = current_data
+    return jsonify({
+        'session_id': session_record.id,
+        'test_type': session_record.test_type,
+        'progress': get_progress_state(session_record)
+    })
+
+@assessments_bp.route('/api/assessment/batch', methods=['POST'])
+@require_login
+def batch_submit():
+    """API endpoint for results synced from offline devices.
+
+    Takes NDJSON, one finished test per line (see models.batch_submissions),
+    optionally with Content-Encoding gzip or deflate. Answers with NDJSON,
+    one status per input line, streamed as each chunk is committed; a body
+    that turns out to be unreadable part-way ends with an "error" line.
+    """
+    config = current_app.config
+    max_bytes = config.get('BATCH_MAX_BYTES', 16 * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Body is larger than {max_bytes} bytes'}), 413
+    try:
+        decoder_for(request.headers.get('Content-Encoding'))
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 415
+    # The (compressed) body is read in full before answering, so a client
+    # still uploading is never blocked behind our streamed response
+    body = request.stream.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        return jsonify({'error': f'Body is larger than {max_bytes} bytes'}), 413
     
-    db.session.commit()
+    identity = get_identity()
+    submitter = identity.user
+    lines = iter_ndjson_lines(
+        body, request.headers.get('Content-Encoding'),
+        max_bytes=config.get('BATCH_MAX_DECODED_BYTES', 64 * 1024 * 1024),
+        max_lines=config.get('BATCH_MAX_SUBMISSIONS', 50000)
+    )
+    chunks = ingest_batch(lines, submitter, may_submit_for_others=identity.is_admin,
+                          chunk_size=config.get('BATCH_CHUNK_SIZE', 500), on_created=record_norms)
+    
+    def generate():
+        try:
+            for statuses in chunks:
+                yield ''.join(json.dumps(status) + '\n' for status in statuses)
+        except BatchError as e:
+            yield json.dumps({'status': 'error', 'error': str(e)}) + '\n'
     
-    return jsonify({'status': 'success'})
\ No newline at end of file
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -1,13 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import check_password_hash
-from models.enhanced_models import db, User
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
+from models.enhanced_models import db, User, normalize_email
+from identity import store_claims
+from services.password_hasher import PasswordHasherBusy
 from datetime import datetime, timedelta
 from itsdangerous import URLSafeTimedSerializer
-from flask_mail import Message
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
+def reset_serializer():
+    """Signs password reset tokens with the app's secret key"""
+    return URLSafeTimedSerializer(current_app.secret_key)
+
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -27,7 +31,7 @@ def validate_password(password):
 def signup():
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
-        email = request.form.get('email', '').strip().lower()
+        email = normalize_email(request.form.get('email'))
         password = request.form.get('password', '')
         
         # Validation
@@ -68,16 +72,23 @@ def signup():
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        email = request.form.get('email', '').strip().lower()
+        email = normalize_email(request.form.get('email'))
         password = request.form.get('password', '')
         
         if not email or not password:
             flash('Please enter both email and password')
             return render_template('login.html')
         
+        # Refuse while the account or this IP is out of attempts, before any DB or hashing work
+        attempts = current_app.extensions['login_attempts']
+        if attempts.is_blocked(email, request.remote_addr):
+            flash('Too many failed login attempts. Please try again later.')
+            return render_template('login.html')
+        
         user = User.query.filter_by(email=email).first()
         
         if not user:
+            attempts.record_failure(email, request.remote_addr)
             flash('Invalid email or password')
             return render_template('login.html')
         
@@ -86,8 +97,22 @@ def login():
             flash('Account temporarily locked due to multiple failed login attempts. Please try again later.')
             return render_template('login.html')
         
-        if user.check_password(password):
+        try:
+            password_ok = user.check_password(password)
+        except PasswordHasherBusy:
+            flash('The server is busy. Please try again in a moment.')
+            return render_template('login.html')
+        
+        if password_ok:
+            # Upgrade hashes made with an older algorithm or cost
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                except PasswordHasherBusy:
+                    pass  # keep the old hash; it is upgraded on a later login
+            
             # Reset failed attempts on successful login
+            attempts.record_success(email)
             user.failed_login_attempts = 0
             user.last_login = datetime.utcnow()
             user.account_locked_until = None
@@ -97,20 +122,21 @@ def login():
             session['user_id'] = user.id
             session['user_name'] = user.name
             session['user_role'] = user.role
+            store_claims(user)
             
             flash('Logged in successfully!')
             return redirect(url_for('main.landing'))
         else:
-            # Increment failed attempts
-            user.failed_login_attempts += 1
-            if user.failed_login_attempts >= 5:
-                user.account_locked_until = datetime.utcnow() + timedelta(minutes=30)
-                flash('Account locked due to multiple failed login attempts. Please try again in 30 minutes.')
+            # Failures are counted in the tracker; the users row is only written to lock it
+            remaining = attempts.record_failure(email, request.remote_addr)
+            if remaining <= 0:
+                lockout = current_app.config.get('LOGIN_LOCKOUT_MINUTES', 30)
+                user.failed_login_attempts = attempts.max_attempts
+                user.account_locked_until = datetime.utcnow() + timedelta(minutes=lockout)
+                db.session.commit()
+                flash(f'Account locked due to multiple failed login attempts. Please try again in {lockout} minutes.')
             else:
-                remaining = 5 - user.failed_login_attempts
                 flash(f'Invalid email or password. {remaining} attempts remaining.')
-            
-            db.session.commit()
     
     return render_template('login.html')
 
@@ -123,7 +149,7 @@ def logout():
 @auth_bp.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     if request.method == 'POST':
-        email = request.form.get('email', '').strip().lower()
+        email = normalize_email(request.form.get('email'))
         
         if not validate_email(email):
             flash('Please enter a valid email address')
@@ -132,12 +158,10 @@ def forgot_password():
         user = User.query.filter_by(email=email).first()
         if user:
             try:
-                from app import mail, serializer
-                token = serializer.dumps(email, salt='password-reset-salt')
+                token = reset_serializer().dumps(email, salt='password-reset-salt')
                 reset_url = url_for('auth.reset_password', token=token, _external=True)
                 
-                msg = Message('Password Reset Request', recipients=[email])
-                msg.body = f'''
+                body = f'''
 Hello {user.name},
 
 You have requested a password reset for your LD Detector account.
@@ -152,7 +176,7 @@ If you did not request this reset, please ignore this email.
 Best regards,
 LD Detector Team
 '''
-                mail.send(msg)
+                current_app.extensions['mail_queue'].enqueue('Password Reset Request', [email], body)
                 flash('Password reset email sent. Please check your inbox.')
             except Exception as e:
                 flash('Error sending email. Please try again later.')
@@ -167,8 +191,7 @@ LD Detector Team
 @auth_bp.route('/reset-password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     try:
-        from app import serializer
-        email = serializer.loads(token, salt='password-reset-salt', max_age=3600)
+        email = reset_serializer().loads(token, salt='password-reset-salt', max_age=3600)
     except Exception:
         flash('The password reset link is invalid or has expired.')
         return redirect(url_for('auth.forgot_password'))
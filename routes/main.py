@@ -0,0 +1,134 @@
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, Response, stream_with_context
+from models.enhanced_models import (
+    db, get_results_page, export_results_to_csv, get_daily_rollups, summarize_rollups,
+    RESULTS_PAGE_SIZE, ANALYTICS_DAYS, EMAIL_MATCHES
+)
+from identity import store_claims
+from routes.assessments import get_identity
+from datetime import datetime
+from functools import wraps
+
+main_bp = Blueprint('main', __name__)
+
+def require_admin(f):
+    """Decorator for admin pages: anonymous users go to login, others to the landing page"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        identity = get_identity()
+        if identity is None:
+            return redirect(url_for('auth.login'))
+        if not identity.is_admin:
+            return redirect(url_for('main.landing'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+def email_filter_args():
+    """The email needle and its match mode ('contains' unless a known mode is asked for)"""
+    email_match = request.args.get('email_match', '')
+    return request.args.get('email', '').strip(), email_match if email_match in EMAIL_MATCHES else 'contains'
+
+def require_admin_api(f):
+    """Decorator for admin JSON endpoints"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        identity = get_identity()
+        if identity is None:
+            return jsonify({'error': 'Authentication required'}), 401
+        if not identity.is_admin:
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+@main_bp.route('/')
+def index():
+    return render_template('index.html')
+
+@main_bp.route('/landing')
+def landing():
+    identity = get_identity()
+    if identity is None:
+        return redirect(url_for('auth.login'))
+    if not identity.profile_completed:
+        return render_template('get_to_know_you.html', user=identity)
+    return render_template('tests_landing.html', user=identity)
+
+@main_bp.route('/get-to-know-you', methods=['GET', 'POST'])
+def get_to_know_you():
+    identity = get_identity()
+    if identity is None:
+        return redirect(url_for('auth.login'))
+    if request.method == 'POST':
+        user = identity.user
+        user.learning_style = request.form.get('learning_style') or None
+        user.diagnosed_difficulties = request.form.get('diagnosed_difficulties') or None
+        user.age_group = request.form.get('age_group') or None
+        user.completed_get_to_know_you = True
+        db.session.commit()
+        store_claims(user)
+        return redirect(url_for('main.landing'))
+    return render_template('get_to_know_you.html', user=identity)
+
+@main_bp.route('/admin')
+@require_admin
+def admin_dashboard():
+    # Filters: email, email_match, test_type; pages: cursor, per_page
+    email, email_match = email_filter_args()
+    test_type = request.args.get('test_type', '').strip()
+    cursor = request.args.get('cursor') or None
+    per_page = request.args.get('per_page', RESULTS_PAGE_SIZE, type=int)
+    try:
+        results, next_cursor = get_results_page(email=email or None, test_type=test_type or None,
+                                                cursor=cursor, page_size=per_page, email_match=email_match)
+    except ValueError:
+        return redirect(url_for('main.admin_dashboard', email=email, email_match=email_match,
+                                test_type=test_type, per_page=per_page))
+    return render_template('admin_dashboard.html', results=results, email=email, email_match=email_match,
+                           test_type=test_type, cursor=cursor, next_cursor=next_cursor, per_page=per_page)
+
+@main_bp.route('/api/admin/results')
+@require_admin_api
+def api_admin_results():
+    email, email_match = email_filter_args()
+    test_type = request.args.get('test_type', '').strip()
+    per_page = request.args.get('per_page', RESULTS_PAGE_SIZE, type=int)
+    try:
+        results, next_cursor = get_results_page(email=email or None, test_type=test_type or None,
+                                                cursor=request.args.get('cursor') or None, page_size=per_page,
+                                                email_match=email_match)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({'results': [r.to_dict() for r in results], 'next_cursor': next_cursor})
+
+@main_bp.route('/admin/analytics')
+@require_admin
+def admin_analytics():
+    days = request.args.get('days', ANALYTICS_DAYS, type=int)
+    test_type = request.args.get('test_type', '').strip()
+    rollups = get_daily_rollups(days=days, test_type=test_type or None)
+    return render_template('admin_analytics.html', rollups=rollups, totals=summarize_rollups(rollups),
+                           days=days, test_type=test_type)
+
+@main_bp.route('/api/admin/analytics')
+@require_admin_api
+def api_admin_analytics():
+    days = request.args.get('days', ANALYTICS_DAYS, type=int)
+    test_type = request.args.get('test_type', '').strip()
+    rollups = get_daily_rollups(days=days, test_type=test_type or None)
+    return jsonify({'days': [r.to_dict() for r in rollups], 'totals': summarize_rollups(rollups)})
+
+@main_bp.route('/admin/export')
+@require_admin
+def admin_export():
+    email, email_match = email_filter_args()
+    test_type = request.args.get('test_type', '').strip()
+    compress = request.args.get('gzip') == '1'
+    chunks = export_results_to_csv(email=email or None, test_type=test_type or None, compress=compress,
+                                   email_match=email_match)
+    filename = f"exported_results_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+    if compress:
+        filename += '.gz'
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
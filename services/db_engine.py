@@ -0,0 +1,121 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+class PoolWaitStats:
+    """How long requests wait to check a connection out of the pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_sum = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_sum += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+pool_wait_stats = PoolWaitStats()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records checkout time (waiting for a slot, connecting, pre-ping)"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_wait_stats.record(time.perf_counter() - start)
+        return connection
+
+def normalize_database_url(url):
+    """Accept the legacy postgres:// scheme Render and Heroku still hand out"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if _is_memory_sqlite(url):
+        return options  # Flask-SQLAlchemy pins these to one shared connection
+    options.setdefault('poolclass', TimedQueuePool)
+    if url.get_backend_name() == 'sqlite':
+        return options
+    options.setdefault('pool_size', config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', 10))
+    options.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', 30))
+    options.setdefault('pool_recycle', config.get('DB_POOL_RECYCLE', 1800))
+    options.setdefault('pool_pre_ping', config.get('DB_POOL_PRE_PING', True))
+    return options
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection"""
+    return [
+        f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        # Negative values are KiB rather than pages
+        f"PRAGMA cache_size={-int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+    ]
+
+class DatabaseEngine:
+    """Engine settings for production use; initializes ``db`` on the app.
+
+    SQLite connections get WAL journaling, a busy timeout, synchronous=NORMAL
+    and larger mmap/page caches, so concurrent submissions wait for the write
+    lock instead of failing with "database is locked". Other databases (e.g.
+    Postgres on Render) get a sized, pre-pinged, recycled QueuePool. Either
+    way pool checkout time is reported through stats().
+    """
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+        db.init_app(app)
+        self.app = app
+        self.db = db
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name == 'sqlite' and not _is_memory_sqlite(engine.url):
+            pragmas = sqlite_pragmas(app.config)
+
+            @event.listens_for(engine, 'connect')
+            def set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+                cursor.close()
+        app.extensions['db_pool'] = self
+
+    def stats(self):
+        with self.app.app_context():
+            pool = self.db.engine.pool
+        stats = {
+            'checkouts': pool_wait_stats.checkouts,
+            'checkout_wait_seconds_sum': pool_wait_stats.wait_seconds_sum,
+            'checkout_wait_seconds_max': pool_wait_stats.wait_seconds_max,
+            'checkout_timeouts': pool_wait_stats.timeouts,
+        }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        return stats
@@ -0,0 +1,98 @@
+import re
+import threading
+from collections import OrderedDict
+
+from flask import render_template
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import escape
+
+# Per-user result fields filled into a cached page; the template must output them verbatim
+RESULT_FIELDS = ('score', 'message', 'percentile')
+
+_MARKER = '\x1f{}\x1f'
+_MARKER_RE = re.compile('\x1f(' + '|'.join(RESULT_FIELDS) + ')\x1f')
+
+class FragmentCache:
+    """Bounded LRU cache of rendered template fragments.
+
+    Pages that differ only in a few per-user values are rendered once per
+    combination of their static parts, with markers where the values go;
+    later requests copy the cached text and fill in the markers, skipping
+    Jinja entirely. Also turns on Jinja's on-disk bytecode cache so each
+    worker does not recompile templates on start.
+    """
+
+    def __init__(self, app=None):
+        self.maxsize = 128
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('FRAGMENT_CACHE_SIZE', 128)
+        if app.config.get('JINJA_BYTECODE_CACHE', True):
+            # None lets Jinja pick a private directory under the system temp dir
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config.get('JINJA_BYTECODE_CACHE_DIR'))
+        app.extensions['fragment_cache'] = self
+
+    def get_or_render(self, key, render):
+        """Return the fragment cached under ``key``, calling ``render()`` on a miss"""
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self._hits += 1
+                return fragment
+            self._misses += 1
+        fragment = render()
+        with self._lock:
+            self._fragments[key] = fragment
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.maxsize:
+                self._fragments.popitem(last=False)
+                self._evictions += 1
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._fragments),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+def render_results(result, cache=None):
+    """Render results.html for ``result``, through ``cache`` when one is given.
+
+    Layout and recommendation text are cached per (type, risk level, flag);
+    score, message and percentile are filled in per request.
+    """
+    if cache is None:
+        return render_template('results.html', result=result)
+    key = (
+        'results.html', result.get('type'), result.get('risk_level'), bool(result.get('flag')),
+        result.get('recommendations'), result.get('percentile') is not None, bool(result.get('saving'))
+    )
+
+    def render():
+        template_result = dict(result)
+        for field in RESULT_FIELDS:
+            if template_result.get(field) is not None:
+                template_result[field] = _MARKER.format(field)
+        return render_template('results.html', result=template_result)
+
+    fragment = cache.get_or_render(key, render)
+    values = {field: str(escape(result.get(field))) for field in RESULT_FIELDS}
+    return _MARKER_RE.sub(lambda m: values[m.group(1)], fragment)
+
+# Global instance
+fragment_cache = FragmentCache()
@@ -0,0 +1,66 @@
+import threading
+
+from services.rate_limiter import storage_from_url
+
+class LoginAttemptTracker:
+    """Failed-login counts per account and per client IP, kept out of ``users``.
+
+    Each account (by email, known or not) may fail MAX_LOGIN_ATTEMPTS
+    times and each IP MAX_LOGIN_ATTEMPTS_PER_IP times per
+    LOGIN_ATTEMPT_WINDOW seconds. The budgets refill continuously, which
+    makes them sliding windows. The counters live in the same kind of
+    shared store as the rate limiter (LOGIN_ATTEMPTS_STORAGE_URL, default
+    RATELIMIT_STORAGE_URL), sized by LOGIN_ATTEMPT_SLOTS, so bad passwords
+    cost no database writes. The login view only writes the users row
+    when an account runs out and is locked.
+    """
+
+    def __init__(self, app=None):
+        self.max_attempts = 5
+        self.ip_max_attempts = 100
+        self.window = 900
+        self.storage = None
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._blocked = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_attempts = app.config.get('MAX_LOGIN_ATTEMPTS', 5)
+        self.ip_max_attempts = app.config.get('MAX_LOGIN_ATTEMPTS_PER_IP', 100)
+        self.window = app.config.get('LOGIN_ATTEMPT_WINDOW', 900)
+        url = app.config.get('LOGIN_ATTEMPTS_STORAGE_URL') or app.config.get('RATELIMIT_STORAGE_URL', 'memory://')
+        self.storage = storage_from_url(url, app.config.get('LOGIN_ATTEMPT_SLOTS', 65536))
+        app.extensions['login_attempts'] = self
+
+    def is_blocked(self, email, ip):
+        """True if the account or the IP has no failed attempts left in the window"""
+        account, address = self._keys(email, ip)
+        blocked = (self.storage.hit(account, self.max_attempts, self.window, cost=0)[1] < 1
+                   or self.storage.hit(address, self.ip_max_attempts, self.window, cost=0)[1] < 1)
+        if blocked:
+            with self._lock:
+                self._blocked += 1
+        return blocked
+
+    def record_failure(self, email, ip):
+        """Count a failed attempt; returns how many the account has left (0 means lock it)"""
+        account, address = self._keys(email, ip)
+        self.storage.hit(address, self.ip_max_attempts, self.window)
+        _, left = self.storage.hit(account, self.max_attempts, self.window)
+        with self._lock:
+            self._failures += 1
+        return int(left)
+
+    def record_success(self, email):
+        """Forget the account's failed attempts"""
+        self.storage.reset(self._keys(email, None)[0])
+
+    def stats(self):
+        with self._lock:
+            return {'failures': self._failures, 'blocked': self._blocked}
+
+    @staticmethod
+    def _keys(email, ip):
+        return f'login-failures|account|{email}', f'login-failures|ip|{ip}'
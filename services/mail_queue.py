@@ -0,0 +1,184 @@
+import atexit
+import logging
+import os
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from sqlalchemy import and_, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+class MailQueue:
+    """Durable outbound mail queue stored in a database table.
+
+    Views call enqueue(), which only inserts a row. A background sender
+    thread in each worker process claims due rows in batches, sends a whole
+    batch over one SMTP connection and retries failures with exponential
+    backoff. If the connection is lost, only the message being sent is
+    charged an attempt; the rest of the batch goes back to the queue,
+    held back for longer after each consecutive connection failure. Rows
+    are claimed with a conditional UPDATE, so several workers can drain
+    the same table without sending a message twice.
+    """
+
+    def __init__(self, app=None, db=None, model=None, mail=None):
+        self.app = None
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._connection_failures = 0  # consecutive, in this process
+        if app is not None:
+            self.init_app(app, db, model, mail)
+
+    def init_app(self, app, db, model, mail):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.mail = mail
+        self.batch_size = app.config.get('MAIL_QUEUE_BATCH_SIZE', 50)
+        self.poll_interval = app.config.get('MAIL_QUEUE_POLL_INTERVAL', 5.0)
+        self.max_attempts = app.config.get('MAIL_QUEUE_MAX_ATTEMPTS', 6)
+        self.backoff = app.config.get('MAIL_QUEUE_BACKOFF', 30)  # seconds, doubled per attempt
+        self.max_connection_backoff = app.config.get('MAIL_QUEUE_MAX_CONNECTION_BACKOFF', 3600)
+        self.claim_timeout = timedelta(seconds=app.config.get('MAIL_QUEUE_CLAIM_TIMEOUT', 600))
+        self.background = app.config.get('MAIL_QUEUE_BACKGROUND', True)
+        app.extensions['mail_queue'] = self
+        # Start the sender lazily in each serving process, also to drain leftovers
+        app.before_request(self._ensure_sender)
+        atexit.register(self.stop)
+
+    def enqueue(self, subject, recipients, body, sender=None):
+        """Store a message for delivery; commits the current session"""
+        email = self.model(
+            subject=subject,
+            recipients=','.join(recipients),
+            sender=sender,
+            body=body
+        )
+        self.db.session.add(email)
+        self.db.session.commit()
+        self._ensure_sender()
+        self._wakeup.set()
+        return email
+
+    def send_pending(self):
+        """Claim one batch of due messages and send it; returns the number sent"""
+        M = self.model
+        session = self.db.session
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        due = or_(
+            and_(M.status == 'pending', M.next_attempt_at <= now),
+            and_(M.status == 'sending', M.claimed_at < now - self.claim_timeout)
+        )
+
+        ids = session.scalars(select(M.id).where(due).order_by(M.id).limit(self.batch_size)).all()
+        if not ids:
+            return 0
+        session.execute(
+            update(M).where(M.id.in_(ids), due)
+            .values(status='sending', claimed_by=token, claimed_at=now)
+        )
+        session.commit()
+        batch = M.query.filter_by(claimed_by=token, status='sending').order_by(M.id).all()
+
+        sent = 0
+        in_flight = None
+        try:
+            with self.mail.connect() as connection:
+                self._connection_failures = 0
+                for email in batch:
+                    in_flight = email
+                    try:
+                        connection.send(Message(
+                            email.subject,
+                            recipients=email.recipients.split(','),
+                            body=email.body,
+                            sender=email.sender
+                        ))
+                    except Exception as e:
+                        if _connection_lost(e):
+                            raise
+                        self._schedule_retry(email, e)
+                    else:
+                        email.status = 'sent'
+                        email.sent_at = datetime.utcnow()
+                        sent += 1
+                    in_flight = None
+        except Exception as e:
+            # Connecting failed or the connection dropped. The rest of the
+            # batch was never tried, so it is released without using up an
+            # attempt. While the server stays unreachable, released rows are
+            # held back for exponentially longer so no worker keeps
+            # reconnecting every poll interval.
+            if in_flight is not None:
+                self._schedule_retry(in_flight, e)
+            self._connection_failures += 1
+            delay = min(self.backoff * 2 ** (self._connection_failures - 1), self.max_connection_backoff)
+            retry_at = datetime.utcnow() + timedelta(seconds=delay)
+            released = 0
+            for email in batch:
+                if email.status == 'sending':
+                    email.status = 'pending'
+                    email.claimed_by = None
+                    email.next_attempt_at = retry_at
+                    released += 1
+            logger.warning("SMTP connection failed, %d email(s) returned to the queue for %ds: %s",
+                           released, delay, e)
+        session.commit()
+        return sent
+
+    def _schedule_retry(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:500]
+        email.claimed_by = None
+        if email.attempts >= self.max_attempts:
+            email.status = 'failed'
+            logger.error("Giving up on email %s after %d attempts: %s", email.id, email.attempts, error)
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff * 2 ** (email.attempts - 1))
+
+    def _ensure_sender(self):
+        # One sender thread per process; threads do not survive fork
+        if not self.background or (self._thread is not None and self._thread_pid == os.getpid()):
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='mail-queue', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    sent = self.send_pending()
+            except Exception:
+                logger.exception("Mail queue sender failed")
+                sent = 0
+            if not sent:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout=10)
+        self._thread = None
+
+def _connection_lost(error):
+    """True if error means the SMTP connection is unusable, not that one message was refused"""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # service closing the channel
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    return isinstance(error, OSError)  # includes SMTPServerDisconnected
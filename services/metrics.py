@@ -0,0 +1,252 @@
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, abort, before_render_template, g, has_app_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the queries-per-request histogram
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Extensions whose stats() are exported as gauges
+STATS_EXTENSIONS = ('password_hasher', 'result_writer', 'fragment_cache', 'db_pool', 'rate_limiter', 'login_attempts',
+                    'item_bank', 'progress_compactor')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f'{self.name}{_labels(self.labels, label_values)} {value}'
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, label_values)} {series[-1]}'
+            yield f'{self.name}_count{_labels(self.labels, label_values)} {cumulative}'
+
+class RequestStats:
+    """Time and query counts accumulated while serving one request"""
+
+    __slots__ = ('start', 'queries', 'db_seconds', 'render_seconds', 'engine_seconds',
+                 'hash_seconds', 'status', 'render_starts')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.engine_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.status = None
+        self.render_starts = []
+
+class Metrics:
+    """Per-request instrumentation exported in Prometheus text format.
+
+    Records latency per endpoint plus, for each request, the number of SQL
+    queries and time spent in the database (SQLAlchemy cursor events), in
+    template rendering (Flask template signals), in AssessmentEngine and in
+    password hashing (their ``observer`` hooks). Requests slower than
+    METRICS_SLOW_REQUEST_MS are logged with that breakdown. Counters are
+    kept per process; scrape each worker, or front them with a collector.
+    """
+
+    def __init__(self, app=None, **kwargs):
+        self.requests = Counter('http_requests_total', 'HTTP requests served', ('endpoint', 'method', 'status'))
+        self.latency = Histogram('http_request_duration_seconds', 'Request latency', ('endpoint', 'method'))
+        self.db_queries = Histogram('http_request_db_queries', 'SQL queries per request', ('endpoint',), QUERY_BUCKETS)
+        self.db_time = Histogram('http_request_db_seconds', 'Database time per request', ('endpoint',))
+        self.render_time = Histogram('template_render_seconds', 'Template render time', ('template',))
+        self.engine_time = Histogram('assessment_evaluate_seconds', 'AssessmentEngine.evaluate_assessment time', ('test_type',))
+        self.hash_time = Histogram('password_hash_seconds', 'Password hash and verify time, including queueing')
+        self._metrics = (self.requests, self.latency, self.db_queries, self.db_time,
+                         self.render_time, self.engine_time, self.hash_time)
+        if app is not None:
+            self.init_app(app, **kwargs)
+
+    def init_app(self, app, engine=None, hasher=None):
+        self.app = app
+        self.slow_request_seconds = app.config.get('METRICS_SLOW_REQUEST_MS', 500) / 1000.0
+        self.token = app.config.get('METRICS_TOKEN')
+        if not self.token and app.config.get('METRICS_REQUIRE_TOKEN', False):
+            raise ValueError("METRICS_TOKEN is not set; /metrics would be readable by anyone")
+        app.extensions['metrics'] = self
+
+        # Run first so the timer covers the other before_request hooks
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._end_request)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        if not event.contains(Engine, 'before_cursor_execute', _query_started):
+            event.listen(Engine, 'before_cursor_execute', _query_started)
+            event.listen(Engine, 'after_cursor_execute', _query_finished)
+            event.listen(Engine, 'handle_error', _query_failed)
+        if engine is not None:
+            engine.observer = self._observe_engine
+        if hasher is not None:
+            hasher.observer = self._observe_hash
+
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics_view)
+
+    def metrics_view(self):
+        if self.token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f'Bearer {self.token}'):
+                abort(401)
+        return Response('\n'.join(self.expose()) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def expose(self):
+        for metric in self._metrics:
+            yield from metric.expose()
+        for ext_name in STATS_EXTENSIONS:
+            ext = self.app.extensions.get(ext_name)
+            if ext is None or not hasattr(ext, 'stats'):
+                continue
+            for key, value in ext.stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f'{ext_name}_{key}'
+                    yield f'# TYPE {name} gauge'
+                    yield f'{name} {value}'
+
+    def _start_request(self):
+        g._request_stats = RequestStats()
+
+    def _after_request(self, response):
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats.status = response.status_code
+            if response.is_streamed:
+                # Streamed bodies (exports) are produced after teardown; finish when the body is sent
+                g._request_stats_streamed = True
+                endpoint, method, path = request.endpoint, request.method, request.path
+                response.call_on_close(lambda: self._record(stats, endpoint, method, path))
+        return response
+
+    def _end_request(self, exc):
+        if g.pop('_request_stats_streamed', False):
+            return
+        stats = g.pop('_request_stats', None)
+        if stats is not None:
+            self._record(stats, request.endpoint, request.method, request.path)
+
+    def _record(self, stats, endpoint, method, path):
+        elapsed = time.perf_counter() - stats.start
+        endpoint = endpoint or 'unmatched'
+        status = stats.status if stats.status is not None else 500
+        self.requests.inc(endpoint, method, str(status))
+        self.latency.observe(elapsed, endpoint, method)
+        self.db_queries.observe(stats.queries, endpoint)
+        self.db_time.observe(stats.db_seconds, endpoint)
+        if elapsed >= self.slow_request_seconds:
+            logger.warning(
+                "Slow request %s %s -> %s in %.1fms: db %d queries %.1fms, templates %.1fms, "
+                "assessment %.1fms, password hashing %.1fms, other %.1fms",
+                method, path, status, 1000 * elapsed, stats.queries,
+                1000 * stats.db_seconds, 1000 * stats.render_seconds, 1000 * stats.engine_seconds,
+                1000 * stats.hash_seconds,
+                1000 * (elapsed - stats.db_seconds - stats.render_seconds - stats.engine_seconds - stats.hash_seconds)
+            )
+
+    def _render_started(self, sender, template, context, **extra):
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats.render_starts.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        stats = g.get('_request_stats')
+        if stats is not None and stats.render_starts:
+            elapsed = time.perf_counter() - stats.render_starts.pop()
+            # Nested renders are already inside the outer one's time
+            if not stats.render_starts:
+                stats.render_seconds += elapsed
+            self.render_time.observe(elapsed, template.name or 'string')
+
+    def _observe_engine(self, test_type, seconds):
+        self.engine_time.observe(seconds, test_type)
+        stats = g.get('_request_stats') if has_app_context() else None
+        if stats is not None:
+            stats.engine_seconds += seconds
+
+    def _observe_hash(self, seconds):
+        self.hash_time.observe(seconds)
+        stats = g.get('_request_stats') if has_app_context() else None
+        if stats is not None:
+            stats.hash_seconds += seconds
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_starts', []).append(time.perf_counter())
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    _finish_query(conn)
+
+def _query_failed(context):
+    # after_cursor_execute does not run when the statement raises
+    if context.connection is not None and context.execution_context is not None:
+        _finish_query(context.connection)
+
+def _finish_query(conn):
+    starts = conn.info.get('_query_starts')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = g.get('_request_stats') if has_app_context() else None
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+# Upper bounds (seconds) of the hash latency histogram
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the hashing queue is full or a hash timed out"""
+
+def _hash(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+def _verify(password_hash: str, password: str) -> bool:
+    return check_password_hash(password_hash, password)
+
+class PasswordHasher:
+    """Password hashing on a bounded process pool.
+
+    Hashes run in worker processes so request threads only wait on a future
+    instead of holding the GIL. At most PASSWORD_HASH_WORKERS hashes run at
+    once and PASSWORD_HASH_MAX_QUEUE more may wait; beyond that callers get
+    PasswordHasherBusy straight away, which keeps login latency bounded
+    during bursts. PASSWORD_HASH_WORKERS = 0 hashes inline.
+    """
+
+    def __init__(self, app=None):
+        self.method = DEFAULT_METHOD
+        self.workers = os.cpu_count() or 1
+        self.max_queue = 64
+        self.timeout = 10.0
+        self._executor = None
+        self._executor_pid = None
+        self._method_prefix = None  # (method, the part werkzeug writes before the first '$')
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._in_flight = 0
+        self._count = 0
+        self._seconds = 0.0
+        self._rejected = 0
+        self._buckets = [0] * len(LATENCY_BUCKETS)
+        # Called as observer(seconds) after each hash or verify, in the calling thread
+        self.observer = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        workers = app.config.get('PASSWORD_HASH_WORKERS')
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_queue = app.config.get('PASSWORD_HASH_MAX_QUEUE', 64)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+        self._slots = threading.BoundedSemaphore(max(1, self.workers) + self.max_queue)
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(_verify, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the hash was made with another algorithm or cost than configured"""
+        return password_hash.split('$', 1)[0] != self._configured_prefix()
+
+    def _configured_prefix(self) -> str:
+        # werkzeug fills in defaults ('scrypt' is written as 'scrypt:32768:8:1'), so learn
+        # the prefix from one real hash instead of comparing against the method string
+        cached = self._method_prefix
+        if cached is None or cached[0] != self.method:
+            cached = (self.method, _hash('', self.method).split('$', 1)[0])
+            self._method_prefix = cached
+        return cached[1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'queue_depth': max(0, self._in_flight - max(1, self.workers)),
+                'in_flight': self._in_flight,
+                'hash_count': self._count,
+                'hash_seconds_sum': self._seconds,
+                'rejected': self._rejected,
+                'latency_buckets': dict(zip(LATENCY_BUCKETS, self._buckets)),
+            }
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        future = None
+        try:
+            if self.workers == 0:
+                return fn(*args)
+            future = self._get_executor().submit(fn, *args)
+            # A hash we stop waiting for keeps its slot until the pool process is done with it
+            future.add_done_callback(self._release)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeout:
+                raise PasswordHasherBusy("Password hashing timed out")
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._count += 1
+                self._seconds += elapsed
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if elapsed <= bound:
+                        self._buckets[i] += 1
+                        break
+            if future is None:
+                self._release()
+            if self.observer is not None:
+                self.observer(elapsed)
+
+    def _release(self, future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _get_executor(self):
+        # Pools do not survive fork; each worker process builds its own on first use
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=True)
+        self._executor = None
+
+# Global instance
+password_hasher = PasswordHasher()
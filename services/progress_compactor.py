@@ -0,0 +1,74 @@
+import atexit
+import logging
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ProgressCompactor:
+    """Folds autosave events into their sessions' snapshots in the background.
+
+    A thread in each worker process calls compact_pending() about every
+    PROGRESS_COMPACT_INTERVAL seconds, jittered so that workers do not all
+    scan at once. Compaction takes the session row lock, so workers (and
+    ``flask compact-progress``) can run it at the same time without losing
+    events. Nothing runs on the autosave request path.
+    """
+
+    def __init__(self, app=None, compact_pending=None):
+        self.app = None
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.runs = 0
+        self.compacted = 0
+        if app is not None:
+            self.init_app(app, compact_pending)
+
+    def init_app(self, app, compact_pending):
+        self.app = app
+        self.compact_pending = compact_pending
+        self.interval = app.config.get('PROGRESS_COMPACT_INTERVAL', 300)
+        self.min_events = app.config.get('PROGRESS_COMPACT_MIN_EVENTS', 50)
+        self.background = app.config.get('PROGRESS_COMPACT_BACKGROUND', True)
+        app.extensions['progress_compactor'] = self
+        app.before_request(self._ensure_thread)
+        atexit.register(self.stop)
+
+    def run_once(self):
+        """Compact every session that is due; returns how many were compacted"""
+        compacted = self.compact_pending(self.min_events)
+        self.runs += 1
+        self.compacted += compacted
+        return compacted
+
+    def stats(self):
+        return {'runs': self.runs, 'compacted': self.compacted}
+
+    def _ensure_thread(self):
+        # One thread per process; threads do not survive fork
+        if not self.background or (self._thread is not None and self._thread_pid == os.getpid()):
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread_pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='progress-compactor', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval * random.uniform(0.5, 1.5)):
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception("Progress compaction failed")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout=10)
+        self._thread = None
@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+
+from flask import Response, request
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Only form submissions are budgeted; rendering the forms is cheap
+LIMITED_METHODS = frozenset({'POST'})
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$')
+
+def parse_limit(text):
+    """'10 per minute', '5 per 10 minutes' or '100/hour' -> (count, period in seconds)"""
+    match = _LIMIT_RE.match(text.lower())
+    if match is None:
+        raise ValueError(f"Invalid rate limit {text!r}")
+    count, multiple, unit = match.groups()
+    return int(count), int(multiple or 1) * _PERIODS[unit]
+
+def _refill(tokens, updated, now, limit, period):
+    if updated is None:
+        return float(limit)
+    return min(float(limit), tokens + (now - updated) * limit / period)
+
+def _key_hash(key):
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+class MemoryStorage:
+    """Token buckets in a fixed-size hash table in anonymous shared memory.
+
+    The table and its lock are created when the app is built, so workers
+    forked from a preloading master (gunicorn.conf.py) all see the same
+    counters. Keys hash to a slot with linear probing; when every probed
+    slot is taken, the one that will be full again soonest is reused.
+    """
+
+    SLOT = struct.Struct('<Qddd')  # key hash, tokens, updated, time the bucket is full again
+    PROBES = 8
+
+    def __init__(self, slots=65536):
+        self.slots = slots
+        self._map = mmap.mmap(-1, slots * self.SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    def hit(self, key, limit, period, cost=1, now=None):
+        """Take ``cost`` tokens from ``key``'s bucket of ``limit`` tokens refilled over ``period`` seconds.
+
+        Returns (allowed, tokens left). Nothing is taken when fewer than
+        ``cost`` tokens are left; ``cost=0`` just reads the bucket.
+        """
+        now = time.time() if now is None else now
+        h = _key_hash(key)
+        if not self._lock.acquire(timeout=0.05):
+            logger.warning("Rate limit table is busy; letting the request through")
+            return True, float(limit)
+        try:
+            offset, tokens, updated = self._find(h, now)
+            tokens = _refill(tokens, updated, now, limit, period)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            full_at = now + (limit - tokens) * period / limit
+            self.SLOT.pack_into(self._map, offset, h, tokens, now, full_at)
+            return allowed, tokens
+        finally:
+            self._lock.release()
+
+    def reset(self, key):
+        h = _key_hash(key)
+        with self._lock:
+            offset, _, updated = self._find(h, time.time())
+            if updated is not None:
+                self.SLOT.pack_into(self._map, offset, 0, 0.0, 0.0, 0.0)
+
+    def _find(self, h, now):
+        """(offset, tokens, updated) of h's slot; tokens and updated are None for a fresh one"""
+        size = self.SLOT.size
+        start = h % self.slots
+        free = victim = victim_full_at = None
+        for i in range(self.PROBES):
+            offset = ((start + i) % self.slots) * size
+            slot_hash, tokens, updated, full_at = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == h:
+                return offset, tokens, updated
+            if free is None and (slot_hash == 0 or full_at <= now):
+                free = offset  # empty, or a bucket that has refilled completely
+            elif victim is None or full_at < victim_full_at:
+                victim, victim_full_at = offset, full_at
+        return (victim if free is None else free), None, None
+
+class SQLiteStorage:
+    """Token buckets in a SQLite table, shared by every process on the host.
+
+    Counters are disposable, so the file runs with synchronous=OFF; idle
+    rows are deleted now and then.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def hit(self, key, limit, period, cost=1, now=None):
+        now = time.time() if now is None else now
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('SELECT tokens, updated FROM rate_limits WHERE key = ?', (key,)).fetchone()
+                tokens = _refill(row[0], row[1], now, limit, period) if row else float(limit)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                full_at = now + (limit - tokens) * period / limit
+                conn.execute(
+                    'INSERT INTO rate_limits (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, '
+                    'full_at = excluded.full_at',
+                    (key, tokens, now, full_at)
+                )
+                self._local.hits += 1
+                if self._local.hits % self.PURGE_EVERY == 0:
+                    conn.execute('DELETE FROM rate_limits WHERE full_at < ?', (now,))
+        except sqlite3.OperationalError as e:
+            logger.warning("Rate limit store unavailable (%s); letting the request through", e)
+            return True, float(limit)
+        return allowed, tokens
+
+    def reset(self, key):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                         'updated REAL NOT NULL, full_at REAL NOT NULL) WITHOUT ROWID')
+            local.conn, local.pid, local.hits = conn, os.getpid(), 0
+        return local.conn
+
+def storage_from_url(url, slots=65536):
+    """Counter store for RATELIMIT_STORAGE_URL: memory:// or sqlite:///path"""
+    if url.startswith('memory://'):
+        return MemoryStorage(slots)
+    if url.startswith('sqlite:'):
+        database = make_url(url).database
+        if not database or database == ':memory:':
+            raise ValueError("RATELIMIT_STORAGE_URL needs a SQLite file; use memory:// for in-memory counters")
+        return SQLiteStorage(database)
+    raise ValueError(f"Unsupported RATELIMIT_STORAGE_URL {url!r}; use memory:// or sqlite:///path")
+
+class RateLimiter:
+    """Per-endpoint request budgets for each client IP.
+
+    RATELIMITS maps endpoints to budgets such as '10 per minute'. POSTs
+    beyond a budget get a plain 429 with Retry-After from a before_request
+    hook, before the session, the database or the password hasher are
+    touched. Counters live in the store named by RATELIMIT_STORAGE_URL.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.storage = None
+        self.limits = {}
+        self._lock = threading.Lock()
+        self._allowed = 0
+        self._limited = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.storage = storage_from_url(app.config.get('RATELIMIT_STORAGE_URL', 'memory://'),
+                                        app.config.get('RATELIMIT_SLOTS', 65536))
+        self.limits = {endpoint: parse_limit(text) for endpoint, text in app.config.get('RATELIMITS', {}).items()}
+        app.before_request_funcs.setdefault(None, []).insert(0, self._check_request)
+        app.extensions['rate_limiter'] = self
+
+    def hit(self, key, limit, cost=1):
+        """Spend from an arbitrary budget (a '5 per minute' string or (count, seconds))"""
+        count, period = parse_limit(limit) if isinstance(limit, str) else limit
+        return self.storage.hit(key, count, period, cost)
+
+    def stats(self):
+        with self._lock:
+            return {'allowed': self._allowed, 'limited': self._limited}
+
+    def _check_request(self):
+        if not self.enabled or request.method not in LIMITED_METHODS:
+            return None
+        budget = self.limits.get(request.endpoint)
+        if budget is None:
+            return None
+        count, period = budget
+        allowed, tokens = self.storage.hit(f'{request.endpoint}|{request.remote_addr}', count, period)
+        with self._lock:
+            if allowed:
+                self._allowed += 1
+            else:
+                self._limited += 1
+        if allowed:
+            return None
+        retry_after = max(1, int((1 - tokens) * period / count + 0.999))
+        return Response('Too many requests. Please try again later.\n', 429,
+                        {'Retry-After': str(retry_after)}, mimetype='text/plain')
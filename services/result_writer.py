@@ -0,0 +1,173 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from sqlalchemy import insert
+
+logger = logging.getLogger(__name__)
+
+class ResultAckTimeout(TimeoutError):
+    """A durable ack did not arrive in time; the row is still buffered and will be written"""
+
+class ResultWriteBuffer:
+    """Optional write-behind buffer that group-commits assessment results.
+
+    With RESULT_WRITE_BEHIND on, save_result() hands its row to submit()
+    instead of committing on its own. A flusher thread bulk-inserts the
+    buffered rows in one transaction every RESULT_FLUSH_ROWS rows or
+    RESULT_FLUSH_INTERVAL_MS milliseconds, whichever comes first, so the
+    database sees one commit (one fsync on SQLite) per batch rather than
+    per student. With RESULT_WRITE_ACK = 'durable' the caller waits until
+    its batch is committed; with 'none' it returns at once and a crash can
+    lose the rows still in memory. Remaining rows are flushed at exit.
+    """
+
+    def __init__(self, app=None, db=None, model=None, on_flush=None):
+        self.enabled = False
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._thread_pid = None
+        self._stopping = False
+        self._flushes = 0
+        self._rows_flushed = 0
+        self._flush_seconds = 0.0
+        self._flush_seconds_max = 0.0
+        self._errors = 0
+        if app is not None:
+            self.init_app(app, db, model, on_flush)
+
+    def init_app(self, app, db, model, on_flush=None):
+        """``on_flush(rows)`` runs inside each flush transaction, before commit"""
+        self.app = app
+        self.db = db
+        self.model = model
+        self.on_flush = on_flush
+        self.enabled = app.config.get('RESULT_WRITE_BEHIND', False)
+        self.flush_rows = app.config.get('RESULT_FLUSH_ROWS', 100)
+        self.flush_interval = app.config.get('RESULT_FLUSH_INTERVAL_MS', 50) / 1000.0
+        self.durable_ack = app.config.get('RESULT_WRITE_ACK', 'durable') == 'durable'
+        self.ack_timeout = app.config.get('RESULT_ACK_TIMEOUT', 30)
+        self.max_rows = app.config.get('RESULT_BUFFER_MAX_ROWS', 10000)
+        app.extensions['result_writer'] = self
+        atexit.register(self.close)
+
+    def submit(self, row, on_commit=None):
+        """Buffer one row (a dict of column values); ``on_commit()`` runs on the flusher once it is committed"""
+        future = Future()
+        if on_commit is not None:
+            future.add_done_callback(lambda f: f.exception() is None and on_commit())
+        with self._cond:
+            self._ensure_flusher()
+            # Backpressure: never let the buffer grow without bound
+            while len(self._pending) >= self.max_rows:
+                self._cond.wait()
+            self._pending.append((row, future))
+            # Wake the flusher to start the interval timer, or to flush a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.flush_rows:
+                self._cond.notify_all()
+        if self.durable_ack:
+            try:
+                future.result(timeout=self.ack_timeout)
+            except FutureTimeout:
+                raise ResultAckTimeout(f"Result not committed within {self.ack_timeout}s") from None
+
+    def flush(self):
+        """Write everything buffered so far and wait for it"""
+        with self._cond:
+            batch, self._pending = self._pending, []
+            self._cond.notify_all()
+        if batch:
+            self._write(batch)
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._pending)
+        return {
+            'buffer_depth': depth,
+            'flushes': self._flushes,
+            'rows_flushed': self._rows_flushed,
+            'flush_seconds_sum': self._flush_seconds,
+            'flush_seconds_max': self._flush_seconds_max,
+            'errors': self._errors,
+        }
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread_pid == os.getpid():
+            self._thread.join(timeout=30)
+        self._thread = None
+        self.flush()
+
+    def _ensure_flusher(self):
+        # Called with the lock held; one flusher per process since threads do not survive fork
+        if self._thread is not None and self._thread_pid == os.getpid():
+            return
+        if self._thread_pid is not None and self._thread_pid != os.getpid():
+            self._pending = []  # inherited from the parent, which writes them itself
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = None
+                while not self._stopping:
+                    if len(self._pending) >= self.flush_rows:
+                        break
+                    if self._pending:
+                        deadline = deadline or time.monotonic() + self.flush_interval
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        deadline = None
+                        self._cond.wait()
+                if self._stopping and not self._pending:
+                    return
+                batch, self._pending = self._pending[:self.flush_rows], self._pending[self.flush_rows:]
+                self._cond.notify_all()
+            self._write(batch)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            self._insert([row for row, _ in batch])
+        except Exception as e:
+            self._errors += 1
+            if len(batch) == 1:
+                logger.exception("Failed to write buffered result")
+                batch[0][1].set_exception(e)
+                return
+            # One bad row must not fail everyone else's submission: retry row by row
+            logger.warning("Bulk flush of %d results failed (%s); retrying individually", len(batch), e)
+            for item in batch:
+                self._write([item])
+            return
+        elapsed = time.perf_counter() - start
+        self._flushes += 1
+        self._rows_flushed += len(batch)
+        self._flush_seconds += elapsed
+        self._flush_seconds_max = max(self._flush_seconds_max, elapsed)
+        for _, future in batch:
+            future.set_result(None)
+
+    def _insert(self, rows):
+        with self.app.app_context():
+            session = self.db.session
+            try:
+                session.execute(insert(self.model), rows)
+                if self.on_flush is not None:
+                    self.on_flush(rows)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
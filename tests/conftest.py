@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+import pytest
+
+# A file rather than :memory:, so background threads (mail queue, result writer) see the same data
+_db_dir = tempfile.mkdtemp(prefix='ld-tests-')
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+
+from app import create_app
+from models.enhanced_models import db, User
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    yield app
+    # Percentile norms are flushed at exit otherwise, after their table is gone
+    app.extensions['population_norms'].flush()
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+@pytest.fixture
+def app_ctx(app):
+    """``app`` with an application context pushed, for tests that use the database directly.
+
+    Test client requests made inside it would share its ``g``, so tests that
+    make requests use ``app`` and open contexts themselves.
+    """
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(app):
+    def make_user(email='student@example.org', password='password123', role='student', **profile):
+        """A committed, detached User"""
+        with app.app_context():
+            user = User(name=email.split('@')[0], email=email, role=role, completed_get_to_know_you=True, **profile)
+            user.set_password(password)
+            db.session.add(user)
+            db.session.commit()
+            db.session.refresh(user)
+            db.session.expunge(user)
+            return user
+    return make_user
+
+@pytest.fixture
+def login(client):
+    def login(email, password='password123'):
+        return client.post('/login', data={'email': email, 'password': password})
+    return login
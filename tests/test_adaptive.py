@@ -0,0 +1,114 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from assessment.adaptive import THETA_GRID, THETA_MAX, THETA_MIN, expected_score, item_tables, select_item
+from assessment.item_bank import DEFAULT_ITEM_BANK_PATH, item_bank, write_item_bank
+from assessment.ml_engine import AssessmentEngine
+from models.enhanced_models import db, AssessmentSession, get_progress_state
+from routes import assessments as routes_assessments
+
+def _pool(n=300, seed=3):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.5, 2.0, n), rng.normal(size=n), rng.uniform(0.5, 2.0, n)
+
+def _exact_p(a, b, theta):
+    return 1.0 / (1.0 + np.exp(-a * (theta - b)))
+
+def test_tables_are_compact_and_match_exact_evaluation():
+    a, b, w = _pool()
+    tables = item_tables(a, b, w, block=64)
+
+    assert tables.information.dtype == np.float16
+    assert tables.information.nbytes == len(THETA_GRID) * 2 * len(a)
+    for g in (0, 40, 80, 120, 160):
+        p = _exact_p(a, b, THETA_GRID[g])
+        np.testing.assert_allclose(tables.information[g], a ** 2 * p * (1 - p), rtol=1e-3, atol=1e-6)
+        assert abs(tables.expected_total[g] - p @ (w / w.sum())) < 1e-9
+
+def test_selection_skips_administered_items():
+    a, b, w = _pool(n=5)
+    tables = item_tables(a, b, w)
+    given = []
+    while (item := select_item(tables, 0.0, given)) is not None:
+        assert item not in given
+        given.append(item)
+    assert sorted(given) == list(range(5))
+
+def test_expected_score_with_every_item_answered_is_the_weighted_score():
+    a, b, w = _pool(n=5)
+    tables = item_tables(a, b, w)
+    answered = [(0, True), (1, False), (2, True), (3, True), (4, False)]
+
+    score = expected_score(tables, 0.7, answered)
+
+    assert abs(score - (w[0] + w[2] + w[3]) / w.sum()) < 1e-9
+
+def test_abilities_beyond_the_grid_are_evaluated_at_its_ends():
+    a, b, w = _pool(n=5)
+    tables = item_tables(a, b, w)
+
+    assert expected_score(tables, THETA_MIN - 3, [(0, True)]) == expected_score(tables, THETA_MIN, [(0, True)])
+    assert expected_score(tables, THETA_MAX + 3) == expected_score(tables, THETA_MAX)
+
+def test_borderline_dyscalculia_run_is_not_cut_short():
+    # One right then two wrong leaves the lower confidence bound below the grid;
+    # extrapolating there put the score just under the 0.5 threshold and stopped the test
+    engine = AssessmentEngine()
+    plan = engine.plans()['dyscalculia']
+    # The adaptive pool is the whole bank, not just the fixed form
+    key = {plan.bank.item(int(row))['id']: chr(ord('a') + int(correct))
+           for row, correct in zip(plan.pool_rows, plan.pool_answer_key)}
+    answers = []
+    for correct in (True, False, False):
+        question_id = engine.adaptive_step('dyscalculia', answers, {})['question']['id']
+        answer = key[question_id] if correct else next(c for c in 'abc' if c != key[question_id])
+        answers.append((question_id, answer))
+
+    assert not engine.adaptive_step('dyscalculia', answers, {})['done']
+
+def _start(client, test_type='dyslexia'):
+    return client.post('/api/assessment/start', json={'test_type': test_type, 'adaptive': True})
+
+def test_an_answer_sent_twice_at_once_is_recorded_once(app, make_user, monkeypatch):
+    user = make_user()
+    clients = [app.test_client(), app.test_client()]
+    for client in clients:
+        client.post('/login', data={'email': user.email, 'password': 'password123'})
+    started = _start(clients[0]).get_json()
+    original_step = routes_assessments.adaptive_step
+
+    def slow_step(*args, **kwargs):
+        time.sleep(0.2)  # both requests have read the session before either records its answer
+        return original_step(*args, **kwargs)
+
+    monkeypatch.setattr(routes_assessments, 'adaptive_step', slow_step)
+    answer = {'session_id': started['session_id'], 'question_id': started['question']['id'], 'answer': 'a'}
+    with ThreadPoolExecutor(2) as pool:
+        responses = list(pool.map(lambda client: client.post('/api/assessment/answer', json=answer), clients))
+
+    assert sorted(response.status_code for response in responses) == [200, 409]
+    with app.app_context():
+        state = get_progress_state(db.session.get(AssessmentSession, started['session_id']))
+    assert len(state['answers']) == 1
+
+def test_adaptive_tests_without_items_are_unavailable(app, client, make_user, login, tmp_path):
+    login(make_user().email)
+    started = _start(client).get_json()
+    # A replacement bank without the dyslexia items
+    with open(DEFAULT_ITEM_BANK_PATH) as f:
+        items = [item for item in map(json.loads, f) if item['test_type'] != 'dyslexia']
+    app.config['ITEM_BANK_PATH'] = str(tmp_path / 'items.jsonl')
+    write_item_bank(app.config['ITEM_BANK_PATH'], items)
+    item_bank.init_app(app)
+    try:
+        answered = client.post('/api/assessment/answer', json={
+            'session_id': started['session_id'], 'question_id': started['question']['id'], 'answer': 'a'})
+
+        assert _start(client).status_code == answered.status_code == 503
+        assert _start(client, 'dyscalculia').status_code == 200
+    finally:
+        app.config['ITEM_BANK_PATH'] = None
+        item_bank.init_app(app)
@@ -0,0 +1,102 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from assessment.ml_engine import assessment_engine
+from models.batch_submissions import MAX_LINE_BYTES
+
+@pytest.fixture
+def student(make_user, login):
+    user = make_user()
+    login(user.email)
+    return user
+
+def _line(key, **fields):
+    item = {'key': key, 'test_type': 'dyslexia',
+            'responses': ['a'] * len(assessment_engine.form_questions('dyslexia'))}
+    item.update(fields)
+    return json.dumps(item)
+
+def _post(client, lines, encoding=None):
+    body = '\n'.join(lines).encode() if isinstance(lines, list) else lines
+    headers = {'Content-Encoding': encoding} if encoding else {}
+    response = client.post('/api/assessment/batch', data=body, headers=headers,
+                           content_type='application/x-ndjson')
+    if response.status_code != 200:
+        return response.status_code, response.get_json()
+    return 200, [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_malformed_lines_are_rejected_and_the_rest_stored(client, student):
+    lines = [
+        '{"key": ',
+        '[1, 2]',
+        _line('bad-email', email=5),
+        _line('bad-type', test_type=['dyslexia']),
+        _line('bad-time', completed_at=5),
+        _line('bad-date', completed_at='yesterday'),
+        _line('bad-times', response_times=[1.0, 1e999]),
+        '[' * 10000 + ']' * 10000,
+        _line('other-student', email='someone@example.org'),
+        _line('good'),
+    ]
+
+    status, statuses = _post(client, lines)
+
+    assert status == 200
+    assert [s['line'] for s in statuses] == list(range(1, len(lines) + 1))
+    assert [s['status'] for s in statuses] == ['rejected'] * (len(lines) - 1) + ['created']
+    assert "'email'" in statuses[2]['error'] and "'test_type'" in statuses[3]['error']
+    assert 'only admins' in statuses[8]['error']
+
+def test_duplicate_keys_in_one_batch_and_across_batches(client, student):
+    _, first = _post(client, [_line('k1'), _line('k1'), _line('k2')])
+
+    assert [s['status'] for s in first] == ['created', 'duplicate', 'created']
+    assert first[1]['duplicate_of_line'] == 1
+
+    _, again = _post(client, [_line('k2'), _line('k3')])
+
+    assert again[0] == {'line': 1, 'key': 'k2', 'status': 'duplicate', 'result_id': first[2]['result_id']}
+    assert again[1]['status'] == 'created'
+
+@pytest.mark.parametrize('encoding, compress', [
+    ('gzip', gzip.compress),
+    ('deflate', zlib.compress),
+    ('deflate', gzip.compress),  # some clients send gzip framing as deflate
+])
+def test_compressed_bodies(client, student, encoding, compress):
+    body = compress('\n'.join([_line('a'), _line('b')]).encode())
+
+    status, statuses = _post(client, body, encoding)
+
+    assert status == 200
+    assert [s['status'] for s in statuses] == ['created', 'created']
+
+def test_unreadable_bodies(client, student):
+    assert _post(client, [_line('a')], 'br')[0] == 415
+
+    _, statuses = _post(client, gzip.compress(_line('a').encode())[:-8], 'gzip')
+    assert statuses[-1]['status'] == 'error' and 'truncated' in statuses[-1]['error']
+
+    _, statuses = _post(client, b'not gzip', 'gzip')
+    assert statuses == [{'status': 'error', 'error': statuses[0]['error']}]
+
+def test_limits(app, client, student):
+    app.config.update(BATCH_MAX_BYTES=2000, BATCH_MAX_DECODED_BYTES=4000, BATCH_MAX_SUBMISSIONS=3,
+                      BATCH_CHUNK_SIZE=2)
+
+    assert _post(client, ['x' * 2001])[0] == 413
+
+    _, statuses = _post(client, [_line(f'k{i}') for i in range(4)])
+    # Chunks before the limit are stored and reported
+    assert [s['status'] for s in statuses] == ['created', 'created', 'error']
+    assert 'More than 3 lines' in statuses[-1]['error']
+
+    _, statuses = _post(client, gzip.compress(b'\n' * 5000), 'gzip')
+    assert 'larger than 4000 bytes' in statuses[-1]['error']
+
+    app.config.update(BATCH_MAX_BYTES=MAX_LINE_BYTES * 2, BATCH_MAX_DECODED_BYTES=MAX_LINE_BYTES * 2)
+    _, statuses = _post(client, gzip.compress(b'x' * (MAX_LINE_BYTES + 1)), 'gzip')
+    assert 'longer than' in statuses[-1]['error']
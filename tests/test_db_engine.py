@@ -0,0 +1,73 @@
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+from models.enhanced_models import db
+from services.db_engine import DatabaseEngine, TimedQueuePool, engine_options, normalize_database_url
+
+def _pragmas(session):
+    return {name: session.execute(text(f'PRAGMA {name}')).scalar()
+            for name in ('journal_mode', 'busy_timeout', 'synchronous', 'mmap_size', 'cache_size')}
+
+def test_sqlite_connections_get_the_pragmas(app_ctx):
+    assert _pragmas(db.session) == {
+        'journal_mode': 'wal', 'busy_timeout': 5000, 'synchronous': 1,  # NORMAL
+        'mmap_size': 256 * 1024 * 1024, 'cache_size': -64 * 1024
+    }
+    assert isinstance(db.engine.pool, TimedQueuePool)
+
+def test_pragmas_follow_the_config_on_every_new_connection(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'pragmas.db'}", SQLITE_JOURNAL_MODE='DELETE',
+                      SQLITE_BUSY_TIMEOUT_MS=1234, SQLITE_SYNCHRONOUS='FULL', SQLITE_MMAP_SIZE=0,
+                      SQLITE_CACHE_SIZE_KB=2048)
+    local_db = SQLAlchemy()
+    DatabaseEngine(app, local_db)
+    expected = {'journal_mode': 'delete', 'busy_timeout': 1234, 'synchronous': 2, 'mmap_size': 0, 'cache_size': -2048}
+
+    with app.app_context():
+        assert _pragmas(local_db.session) == expected
+        local_db.engine.dispose()
+        local_db.session.remove()
+        assert _pragmas(local_db.session) == expected
+        local_db.engine.dispose()
+
+def test_in_memory_sqlite_is_left_to_flask_sqlalchemy():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    local_db = SQLAlchemy()
+    DatabaseEngine(app, local_db)
+
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {}
+    with app.app_context():
+        assert isinstance(local_db.engine.pool, StaticPool)
+        assert local_db.session.execute(text('PRAGMA journal_mode')).scalar() == 'memory'
+
+@pytest.mark.parametrize('url, expected', [
+    ('postgres://u:p@db.example.org:5432/app', 'postgresql://u:p@db.example.org:5432/app'),
+    ('postgresql://u:p@db.example.org/app', 'postgresql://u:p@db.example.org/app'),
+    ('postgresql+psycopg2://u@db/app', 'postgresql+psycopg2://u@db/app'),
+    ('sqlite:///postgres://not-a-scheme.db', 'sqlite:///postgres://not-a-scheme.db'),
+])
+def test_normalizes_the_legacy_postgres_scheme(url, expected):
+    assert normalize_database_url(url) == expected
+
+def test_postgres_gets_a_sized_pre_pinged_pool():
+    options = engine_options({'SQLALCHEMY_DATABASE_URI': normalize_database_url('postgres://u@db/app'),
+                              'DB_POOL_SIZE': 3, 'SQLALCHEMY_ENGINE_OPTIONS': {'pool_recycle': 60}})
+
+    assert options == {'poolclass': TimedQueuePool, 'pool_size': 3, 'max_overflow': 10, 'pool_timeout': 30,
+                       'pool_recycle': 60, 'pool_pre_ping': True}
+
+def test_app_accepts_a_postgres_scheme_url():
+    pytest.importorskip('psycopg2')
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgres://u:p@db.example.org/app'
+    local_db = SQLAlchemy()
+    DatabaseEngine(app, local_db)
+
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'postgresql://u:p@db.example.org/app'
+    with app.app_context():
+        assert local_db.engine.dialect.name == 'postgresql'
@@ -0,0 +1,79 @@
+from sqlalchemy import text, update
+
+from models import enhanced_models
+from models.enhanced_models import (
+    db, User, UserEmailTrigram, _email_filter, get_results_page, normalize_email, rebuild_email_index, save_result
+)
+
+def _indexed(user_id):
+    return {gram for (gram,) in db.session.query(UserEmailTrigram.gram).filter_by(user_id=user_id)}
+
+def test_rebuild_matches_the_index_kept_on_save(app_ctx, make_user):
+    # Mixed case and non-ASCII letters, which SQL lower() does not fold on SQLite
+    user = make_user(email='José.ÄLVAREZ@Example.org')
+    saved = _indexed(user.id)
+
+    rebuild_email_index()
+
+    assert _indexed(user.id) == saved
+    assert 'älv' in saved and 'jos' in saved
+
+def test_search_is_case_insensitive(app_ctx, make_user):
+    user = make_user(email='pat.smith@example.org')
+    other = make_user(email='someone@example.org')
+    save_result(user.id, 'Dyslexia', 3, False, 'ok')
+    save_result(other.id, 'Dyslexia', 2, True, 'ok')
+
+    results, _ = get_results_page(email='PAT.Smith')
+
+    assert [r.user_id for r in results] == [user.id]
+
+def test_normalize_email():
+    assert normalize_email('  Someone@Example.ORG ') == 'someone@example.org'
+    assert normalize_email(None) == ''
+
+def _seed_search(make_user):
+    emails = ['pat.smith@example.org', 'pat@school.example.org', 'mo.pat@example.org', 'Ann_Lee@example.org',
+              'someone@other.net']
+    users = {email: make_user(email=email) for email in emails}
+    for user in users.values():
+        save_result(user.id, 'Dyslexia', 3, False, 'ok')
+    return users
+
+def _emails(results):
+    return sorted(r.user.email for r in results)
+
+def _ilike(pattern):
+    return sorted(email for (email,) in db.session.query(User.email).filter(User.email.ilike(pattern)))
+
+def test_prefix_search_matches_ilike(app_ctx, make_user):
+    _seed_search(make_user)
+
+    for needle in ['pat', 'PAT.', 'ann_', 'mo.pat@example.org', 'p%t', 'z']:
+        results, _ = get_results_page(email=needle, email_match='prefix')
+        assert _emails(results) == _ilike(f"{needle}%"), needle
+
+def test_prefix_search_uses_the_email_index(app_ctx):
+    query = db.session.query(User.id).filter(_email_filter('pat', 'prefix'))
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+
+    plan = ' '.join(str(row) for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+    assert 'ix_users_email_normalized' in plan
+
+def test_common_trigrams_are_not_used_to_narrow(app_ctx, make_user, monkeypatch):
+    _seed_search(make_user)
+    monkeypatch.setattr(enhanced_models, 'EMAIL_GRAM_MAX_USERS', 2)
+
+    # 'exa' and friends are on four accounts: only 'smi', 'mit', 'ith' narrow the search
+    for needle in ['smith@example', 'example.org', 'pat', '@sch']:
+        results, _ = get_results_page(email=needle)
+        assert _emails(results) == _ilike(f"%{needle}%"), needle
+
+def test_rebuild_fills_normalized_emails(app_ctx, make_user):
+    user = make_user(email='Pat.Smith@Example.org')
+    db.session.execute(update(User).where(User.id == user.id).values(email_normalized=None))
+
+    rebuild_email_index()
+
+    assert db.session.get(User, user.id).email_normalized == 'pat.smith@example.org'
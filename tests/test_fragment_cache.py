@@ -0,0 +1,72 @@
+import re
+
+import pytest
+from flask import render_template
+
+from assessment.ml_engine import assessment_engine
+from services.fragment_cache import FragmentCache, render_results
+
+def _result(**fields):
+    result = {'type': 'Dyslexia', 'risk_level': 'medium_risk', 'flag': True,
+              'recommendations': 'Practice phonics daily.', 'score': 3, 'message': 'Some difficulty', 'percentile': 40}
+    result.update(fields)
+    return result
+
+@pytest.fixture
+def cache(app):
+    with app.test_request_context():
+        yield FragmentCache(app)
+
+def test_students_sharing_a_fragment_see_only_their_own_values(cache):
+    alice = _result(score=4, message='Well done, Alice', percentile=71)
+    bob = _result(score=2, message='Keep practising, Bob', percentile=13)
+
+    pages = [render_results(alice, cache), render_results(bob, cache), render_results(alice, cache)]
+
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 2
+    assert pages[0] == pages[2] == render_template('results.html', result=alice)
+    assert pages[1] == render_template('results.html', result=bob)
+    assert 'Alice' not in pages[1] and '71%' not in pages[1]
+    assert 'Bob' not in pages[0] and '13%' not in pages[0]
+
+def test_pages_with_different_static_parts_are_cached_apart(cache):
+    results = [_result(), _result(percentile=None), _result(saving=True), _result(risk_level='low_risk', flag=False),
+               _result(recommendations='Try audiobooks.')]
+
+    for result in results:
+        assert render_results(result, cache) == render_template('results.html', result=result)
+
+    assert cache.stats()['size'] == len(results)
+
+def test_filled_in_values_are_escaped(cache):
+    render_results(_result(), cache)
+    hostile = _result(message='<script>alert("hi")</script> & more', score='<b>9</b>')
+
+    page = render_results(hostile, cache)
+
+    assert cache.stats()['hits'] == 1
+    assert '<script>alert' not in page and '<b>9</b>' not in page
+    assert '&lt;script&gt;alert(&#34;hi&#34;)&lt;/script&gt; &amp; more' in page
+    assert page == render_template('results.html', result=hostile)
+
+def _score_shown(page):
+    return int(re.search(r'text-3xl text-white font-bold">(\d+)<', page).group(1))
+
+def test_students_submitting_the_same_test_get_their_own_page(app, client, make_user, login):
+    picks = {'ann@example.org': ['Apple', 'Book', 'Tiger', 'Spoon'], 'ben@example.org': ['Car']}
+    for email in picks:
+        make_user(email)
+
+    pages = {}
+    for email, recall in picks.items():
+        login(email)
+        pages[email] = client.post('/test/memory', data={'recall': recall, 'study_time': '10', 'recall_time': '5'}
+                                   ).get_data(as_text=True)
+        client.get('/logout')
+
+    for email, recall in picks.items():
+        expected = assessment_engine.evaluate_assessment('memory', recall, {})
+        assert _score_shown(pages[email]) == expected['score']
+        assert expected['message'] in pages[email]
+    assert 'of people in your age group' not in pages['ann@example.org']  # nobody took it before Ann
+    assert 'of people in your age group' in pages['ben@example.org']
@@ -0,0 +1,81 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from identity import ClaimsStamps, claims_stamps
+from models.enhanced_models import db, User
+
+def _update_user(app, user_id, **values):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        for name, value in values.items():
+            setattr(user, name, value)
+        db.session.commit()
+        return user.claims_version
+
+def test_demotion_applies_to_existing_sessions(app, client, make_user, login):
+    admin = make_user(email='admin@example.org', role='admin')
+    login('admin@example.org')
+    assert client.get('/api/admin/results').status_code == 200
+
+    _update_user(app, admin.id, role='student')
+
+    assert client.get('/api/admin/results').status_code == 403
+
+def test_lock_logs_out_existing_sessions(app, client, make_user, login):
+    user = make_user(email='admin@example.org', role='admin')
+    login('admin@example.org')
+    assert client.get('/api/admin/results').status_code == 200
+
+    _update_user(app, user.id, account_locked_until=datetime.utcnow() + timedelta(minutes=30))
+
+    assert client.get('/api/admin/results').status_code == 401
+
+def test_only_claim_changes_bump_the_version(app, make_user):
+    user = make_user()
+
+    # account_locked_until is set to its current value
+    assert _update_user(app, user.id, last_login=datetime.utcnow(), account_locked_until=None) == user.claims_version
+    assert _update_user(app, user.id, role='admin') == user.claims_version + 1
+
+def test_fresh_claims_are_trusted_without_a_query(app, client, make_user, login):
+    make_user()
+    login('student@example.org')
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        assert client.get('/landing').status_code == 200
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+
+    assert statements == []
+
+def test_a_rolled_back_change_keeps_the_claims(app, make_user):
+    user = make_user(role='admin')
+    stamp = claims_stamps.get(user.id)
+    with app.app_context():
+        db.session.get(User, user.id).role = 'student'
+        db.session.flush()
+        db.session.rollback()
+
+    assert claims_stamps.get(user.id) == stamp
+    _update_user(app, user.id, role='student')
+    assert claims_stamps.get(user.id) == stamp + 1
+
+def test_stamps_are_shared_with_forked_workers():
+    stamps = ClaimsStamps(slots=8)
+    pid = os.fork()
+    if pid == 0:
+        stamps.bump(12)
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert stamps.get(12) == 1
+    assert stamps.get(4) == 1  # same slot
+    assert stamps.get(13) == 0
@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from assessment.item_bank import ItemBank, write_item_bank
+from assessment.ml_engine import AssessmentEngine
+
+def _item(item_id, test_type='dyslexia', **fields):
+    return dict(dict(test_type=test_type, id=item_id, type='multiple_choice', question=f'Question {item_id}?',
+                     options=['a', 'b', 'c'], correct=1, weight=1.0, difficulty='medium'), **fields)
+
+@pytest.fixture
+def bank(tmp_path):
+    path = str(tmp_path / 'items.jsonl')
+    write_item_bank(path, [_item('old_1', form=1), _item('old_2')])
+    return ItemBank(path, reload_interval=0)
+
+def test_a_replaced_bank_is_loaded_and_the_old_one_closed_after_its_last_reader(bank):
+    old = bank.current()
+    assert old.acquire()
+
+    write_item_bank(bank.path, [_item('new_1', form=1)])
+    new = bank.current()
+
+    assert new is not old and [item['id'] for item in new.form('dyslexia')] == ['new_1']
+    assert bank.stats()['reloads'] == 1
+    # A reader that started before the reload finishes with the old items
+    assert not old.closed and old.item(old.find('dyslexia', 'old_2'))['id'] == 'old_2'
+    old.release()
+    assert old.closed and not old.acquire()
+    assert bank.current() is new and not new.closed
+
+@pytest.mark.parametrize('cut', [-10, -1], ids=['mid-line', 'before-the-last-newline'])
+def test_a_bank_file_still_being_written_is_not_loaded(bank, cut):
+    old = bank.current()
+    content = ''.join(json.dumps(item) + '\n' for item in (_item('new_1', form=1), _item('new_2')))
+    # Copied over the bank non-atomically: the new file is visible before it is complete
+    os.unlink(bank.path)
+    with open(bank.path, 'w') as f:
+        f.write(content[:cut])
+
+    assert bank.current() is old and not old.closed
+    assert old.item(old.find('dyslexia', 'old_2'))['id'] == 'old_2'
+    assert bank.stats()['reload_errors'] == 1 and bank.stats()['reloads'] == 0
+
+    with open(bank.path, 'w') as f:
+        f.write(content)
+    new = bank.current()
+
+    assert new is not old and len(new) == 2 and old.closed
+
+def test_questions_being_picked_during_a_reload_come_from_the_bank_they_started_with(bank):
+    engine = AssessmentEngine(bank)
+
+    with engine._plan_in_use('dyslexia') as plan:
+        write_item_bank(bank.path, [_item('new_1', form=1)])
+        assert engine.question('dyslexia', 'new_1')['id'] == 'new_1'
+        assert plan.bank.item(int(plan.pool_rows[1]))['id'] == 'old_2'
+
+    assert plan.bank.closed
+    assert [item['id'] for item in engine.form_questions('dyslexia')] == ['new_1']
+    with pytest.raises(KeyError):
+        engine.question('dyslexia', 'old_2')
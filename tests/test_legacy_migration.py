@@ -0,0 +1,113 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from models import legacy_migration, legacy_models as legacy
+from models.enhanced_models import (
+    db, DailyResultRollup, MigrationCheckpoint, NormSketch, OutboundEmail, Result, User, add_to_rollups,
+    rebuild_daily_rollups
+)
+from models.legacy_migration import RESULTS_CHECKPOINT, UNUSABLE_PASSWORD, migrate_legacy
+
+@pytest.fixture
+def legacy_tables(app_ctx):
+    legacy.db.metadata.create_all(db.engine)
+    yield legacy.User.__table__, legacy.Result.__table__
+    legacy.db.metadata.drop_all(db.engine)
+
+def _insert(table, rows):
+    with db.engine.begin() as conn:
+        conn.execute(table.insert(), rows)
+
+def _legacy_result(email, score=3, **fields):
+    return dict(dict(name='Student', email=email, test_type='Dyslexia', score=score, flag=False,
+                     message='Legacy', timestamp=datetime(2024, 1, 1)), **fields)
+
+def test_release_migration_is_a_no_op_without_legacy_tables(app_ctx):
+    output = app_ctx.test_cli_runner().invoke(args=['migrate-legacy']).output
+
+    assert 'nothing to migrate' in output
+
+def test_release_migration_copies_new_rows_once_and_rebuilds_the_norms(app_ctx, legacy_tables):
+    _, results = legacy_tables
+    _insert(results, [_legacy_result('a@example.org'), _legacy_result('b@example.org', score=1)])
+    runner = app_ctx.test_cli_runner()
+
+    first = runner.invoke(args=['migrate-legacy']).output
+    again = runner.invoke(args=['migrate-legacy']).output
+
+    assert 'Migrated 0 accounts and 2 results' in first and 'norms rebuilt' in first
+    assert 'Migrated 0 accounts and 2 results' in again and 'norms rebuilt' not in again
+    assert Result.query.count() == 2
+    assert db.session.get(NormSketch, ('Dyslexia', 'adult')).total == 2
+
+def test_emails_differing_only_in_case_or_spaces_share_one_account(app_ctx, legacy_tables, make_user):
+    users, results = legacy_tables
+    existing = make_user('kept@example.org')
+    _insert(users, [dict(name='Ann', email=' Ann@Example.org', password_hash='pbkdf2:sha256:1$salt$hash'),
+                    dict(name='Ann again', email='ann@example.org', password_hash='pbkdf2:sha256:1$salt$other'),
+                    dict(name='Kept', email='KEPT@example.org', password_hash='pbkdf2:sha256:1$salt$old')])
+    _insert(results, [_legacy_result('ANN@example.ORG'), _legacy_result('ann@example.org '),
+                      _legacy_result('Kept@Example.org'), _legacy_result('new@example.org'),
+                      _legacy_result('NEW@example.org'), _legacy_result('not-an-email')])
+
+    migrated_users, migrated_results = migrate_legacy()
+
+    accounts = {user.email: user for user in User.query}
+    assert set(accounts) == {'kept@example.org', 'ann@example.org', 'new@example.org'}
+    assert accounts['ann@example.org'].name == 'Ann'  # the first legacy row wins
+    assert accounts['kept@example.org'].password_hash == existing.password_hash
+    per_user = {email: Result.query.filter_by(user_id=user.id).count() for email, user in accounts.items()}
+    assert per_user == {'kept@example.org': 1, 'ann@example.org': 2, 'new@example.org': 2}
+    assert (migrated_users.copied, migrated_users.skipped) == (1, 2)
+    assert (migrated_results.copied, migrated_results.skipped, migrated_results.users_created) == (5, 1, 1)
+
+def test_a_run_that_fails_mid_chunk_resumes_from_the_last_committed_chunk(app_ctx, legacy_tables, monkeypatch):
+    _, results = legacy_tables
+    _insert(results, [_legacy_result(f'student{i}@example.org', score=i) for i in range(5)])
+    calls = []
+
+    def add_to_rollups_failing_second_chunk(rows):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise RuntimeError('connection lost')
+        add_to_rollups(rows)
+
+    monkeypatch.setattr(legacy_migration, 'add_to_rollups', add_to_rollups_failing_second_chunk)
+    with pytest.raises(RuntimeError):
+        migrate_legacy(chunk_size=2)
+    db.session.rollback()
+
+    assert db.session.get(MigrationCheckpoint, RESULTS_CHECKPOINT).last_id == 2
+    assert Result.query.count() == 2 and User.query.count() == 2
+
+    monkeypatch.undo()
+    _, checkpoint = migrate_legacy(chunk_size=2)
+
+    assert (checkpoint.last_id, checkpoint.copied, checkpoint.users_created) == (5, 5, 5)
+    assert sorted(score for (score,) in db.session.query(Result.score)) == [0, 1, 2, 3, 4]
+    assert User.query.count() == 5
+    kept = [(r.submissions, r.score_sum) for r in DailyResultRollup.query]
+    rebuild_daily_rollups()
+    assert kept == [(r.submissions, r.score_sum) for r in DailyResultRollup.query] == [(5, 10)]
+
+def test_students_created_by_the_migration_must_reset_their_password(app, client, legacy_tables):
+    _, results = legacy_tables
+    _insert(results, [_legacy_result('kid@example.org')])
+    migrate_legacy()
+    assert User.query.filter_by(email='kid@example.org').one().password_hash == UNUSABLE_PASSWORD
+
+    for password in ('', '!', 'password123'):
+        client.post('/login', data={'email': 'kid@example.org', 'password': password})
+        with client.session_transaction() as sess:
+            assert 'user_id' not in sess
+
+    client.post('/forgot-password', data={'email': 'kid@example.org'})
+    (email,) = OutboundEmail.query.all()
+    reset_path = re.search(r'https?://[^/]+(/reset-password/\S+)', email.body).group(1)
+    client.post(reset_path, data={'password': 'NewPassword123!'})
+    client.post('/login', data={'email': 'kid@example.org', 'password': 'NewPassword123!'})
+
+    with client.session_transaction() as sess:
+        assert sess['user_id'] == User.query.filter_by(email='kid@example.org').one().id
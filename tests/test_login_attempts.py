@@ -0,0 +1,49 @@
+from models.enhanced_models import db, User
+
+def _user(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id)
+
+def _login(client, email, password):
+    return client.post('/login', data={'email': email, 'password': password})
+
+def test_failures_are_counted_outside_the_users_table_until_the_lock(app, client, make_user):
+    user = make_user()
+    attempts = app.extensions['login_attempts']
+
+    for left in range(attempts.max_attempts - 1, 0, -1):
+        assert f'{left} attempts remaining'.encode() in _login(client, user.email, 'wrong').data
+        assert _user(app, user.id).failed_login_attempts == 0
+
+    assert b'Account locked' in _login(client, user.email, 'wrong').data
+    locked = _user(app, user.id)
+    assert locked.account_locked_until is not None and locked.is_account_locked()
+    # The right password does not get in while it is locked
+    assert _login(client, user.email, 'password123').status_code == 200
+    assert attempts.stats()['failures'] == attempts.max_attempts
+
+def test_success_forgets_earlier_failures(app, client, make_user):
+    user = make_user()
+    attempts = app.extensions['login_attempts']
+    for _ in range(attempts.max_attempts - 1):
+        _login(client, user.email, 'wrong')
+
+    assert _login(client, user.email, 'password123').status_code == 302
+    client.get('/logout')
+
+    assert f'{attempts.max_attempts - 1} attempts remaining'.encode() in _login(client, user.email, 'wrong').data
+
+def test_unknown_accounts_are_blocked_too(app, client):
+    attempts = app.extensions['login_attempts']
+    for _ in range(attempts.max_attempts):
+        _login(client, 'nobody@example.org', 'wrong')
+
+    assert b'Too many failed login attempts' in _login(client, 'nobody@example.org', 'wrong').data
+    assert attempts.stats()['blocked'] == 1
+
+def test_address_budget_spans_accounts(app, client):
+    app.extensions['login_attempts'].ip_max_attempts = 3
+    for i in range(3):
+        _login(client, f'user{i}@example.org', 'wrong')
+
+    assert b'Too many failed login attempts' in _login(client, 'another@example.org', 'wrong').data
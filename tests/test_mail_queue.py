@@ -0,0 +1,129 @@
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from models.enhanced_models import db, OutboundEmail
+
+class _Handler:
+    """Records delivered mail; refuses or hangs up on chosen recipients"""
+
+    def __init__(self):
+        self.delivered = []
+        self.refuse = set()
+        self.hang_up = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return '450 Mailbox busy'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if set(envelope.rcpt_tos) & self.hang_up:
+            return '421 Closing connection'
+        self.delivered.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def smtp():
+    handler = _Handler()
+    controller = Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+@pytest.fixture
+def queue(app_ctx, smtp):
+    state = app_ctx.extensions['mail']
+    state.server, state.port = smtp.hostname, smtp.port
+    state.suppress = False  # Flask-Mail does not send when TESTING is set
+    return app_ctx.extensions['mail_queue']
+
+def _enqueue(queue, *recipients):
+    return [queue.enqueue('Subject', [rcpt], 'Body').id for rcpt in recipients]
+
+def _email(email_id):
+    db.session.expire_all()
+    return db.session.get(OutboundEmail, email_id)
+
+def test_delivers_queued_mail(queue, smtp):
+    ids = _enqueue(queue, 'a@example.org', 'b@example.org')
+
+    assert queue.send_pending() == 2
+
+    assert smtp.handler.delivered == ['a@example.org', 'b@example.org']
+    assert {_email(i).status for i in ids} == {'sent'}
+    assert queue.send_pending() == 0
+
+def test_retries_with_backoff_then_gives_up(queue, smtp):
+    smtp.handler.refuse.add('busy@example.org')
+    (email_id,) = _enqueue(queue, 'busy@example.org')
+
+    for attempt in range(1, queue.max_attempts + 1):
+        started = datetime.utcnow()
+        assert queue.send_pending() == 0
+        email = _email(email_id)
+        assert email.attempts == attempt
+        if attempt < queue.max_attempts:
+            assert email.status == 'pending'
+            delay = timedelta(seconds=queue.backoff * 2 ** (attempt - 1))
+            assert started + delay <= email.next_attempt_at <= datetime.utcnow() + delay
+            # Not due yet
+            assert queue.send_pending() == 0 and _email(email_id).attempts == attempt
+            email.next_attempt_at = datetime.utcnow()
+            db.session.commit()
+
+    assert email.status == 'failed'
+    assert '450' in email.last_error
+    assert smtp.handler.delivered == []
+
+def test_dropped_connection_only_charges_the_message_in_flight(queue, smtp):
+    smtp.handler.hang_up.add('b@example.org')
+    first, dropped, rest = _enqueue(queue, 'a@example.org', 'b@example.org', 'c@example.org')
+
+    assert queue.send_pending() == 1
+
+    assert _email(first).status == 'sent'
+    assert (_email(dropped).status, _email(dropped).attempts) == ('pending', 1)
+    assert (_email(rest).status, _email(rest).attempts) == ('pending', 0)
+    # The next batch reconnects and sends what was left, once it is due again
+    assert queue.send_pending() == 0
+    _email(rest).next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    assert queue.send_pending() == 1
+    assert smtp.handler.delivered == ['a@example.org', 'c@example.org']
+
+def test_unreachable_server_uses_no_attempts(app_ctx, queue):
+    (email_id,) = _enqueue(queue, 'a@example.org')
+    app_ctx.extensions['mail'].port = _free_port()  # nothing listening
+
+    assert queue.send_pending() == 0
+
+    email = _email(email_id)
+    assert (email.status, email.attempts, email.claimed_by) == ('pending', 0, None)
+
+def test_unreachable_server_is_retried_less_and_less_often(app_ctx, queue, smtp):
+    (email_id,) = _enqueue(queue, 'a@example.org')
+    app_ctx.extensions['mail'].port = _free_port()  # nothing listening
+
+    for failure in range(1, 4):
+        started = datetime.utcnow()
+        assert queue.send_pending() == 0
+        email = _email(email_id)
+        delay = timedelta(seconds=queue.backoff * 2 ** (failure - 1))
+        assert started + delay <= email.next_attempt_at <= datetime.utcnow() + delay
+        assert queue.send_pending() == 0  # not due yet
+        email.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+
+    # One successful connection resets the backoff
+    app_ctx.extensions['mail'].port = smtp.port
+    assert queue.send_pending() == 1
+    assert queue._connection_failures == 0
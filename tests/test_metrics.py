@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from config import ProductionConfig
+from models.enhanced_models import db
+
+def test_production_requires_a_metrics_token(monkeypatch):
+    monkeypatch.setattr(ProductionConfig, 'METRICS_TOKEN', None)
+
+    with pytest.raises(ValueError, match='METRICS_TOKEN'):
+        create_app('production')
+
+def test_metrics_token_is_checked(app, client):
+    app.extensions['metrics'].token = 'scrape-me'
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert b'http_requests_total' in response.data
+
+def test_failed_query_does_not_leave_its_start_time(app_ctx):
+    with db.engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM no_such_table'))
+
+        assert conn.info['_query_starts'] == []
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from assessment.ml_engine import AssessmentEngine
+
+PROFILES = [
+    {},
+    {'age_group': 'child', 'learning_style': 'visual'},
+    {'age_group': 'teen', 'learning_style': 'auditory'},
+    {'age_group': 'adult', 'learning_style': 'visual', 'diagnosed_difficulties': 'dyslexia'},
+]
+
+MEMORY_WORDS = ['Apple', 'Book', 'Tiger', 'Spoon', 'Banana', 'Car']
+
+@pytest.fixture(scope='module')
+def engine():
+    return AssessmentEngine()
+
+def _cognitive_rows(rng, n_questions, n_rows):
+    rows, times = [], []
+    for _ in range(n_rows):
+        length = rng.choice([0, 1, n_questions - 1, n_questions, n_questions, n_questions + 2])
+        rows.append([rng.choice('abcd') for _ in range(length)])
+        timing = rng.choice(['none', 'empty', 'short', 'full'])
+        if timing == 'none':
+            times.append(None)
+        elif timing == 'empty':
+            times.append([])
+        else:
+            n = rng.randint(1, n_questions) if timing == 'short' else n_questions
+            times.append([rng.choice([1.0, 4.5, 15.0, 40.0, 95.0]) for _ in range(n)])
+    return rows, times
+
+@pytest.mark.parametrize('test_type', ['dyslexia', 'dyscalculia'])
+def test_batch_matches_single_cognitive(engine, test_type):
+    rng = random.Random(test_type)
+    n_questions = len(engine.form_questions(test_type))
+    rows, times = _cognitive_rows(rng, n_questions, 300)
+    profiles = [rng.choice(PROFILES) for _ in rows]
+
+    batch = engine.evaluate_batch(test_type, rows, profiles, times)
+
+    assert len(batch) == len(rows)
+    for row, profile, row_times, result in zip(rows, profiles, times, batch):
+        assert result == engine.evaluate_assessment(test_type, row, profile, row_times)
+
+@pytest.mark.parametrize('test_type', ['dyslexia', 'dyscalculia'])
+def test_batch_without_response_times(engine, test_type):
+    rng = random.Random(0)
+    n_questions = len(engine.form_questions(test_type))
+    rows, _ = _cognitive_rows(rng, n_questions, 50)
+    profiles = [rng.choice(PROFILES) for _ in rows]
+
+    batch = engine.evaluate_batch(test_type, rows, profiles)
+
+    assert batch == [engine.evaluate_assessment(test_type, row, profile) for row, profile in zip(rows, profiles)]
+
+def test_batch_matches_single_memory(engine):
+    rng = random.Random(1)
+    rows = [[rng.choice(MEMORY_WORDS) for _ in range(rng.randint(0, 8))] for _ in range(300)]
+    profiles = [rng.choice(PROFILES) for _ in rows]
+
+    batch = engine.evaluate_batch('memory', rows, profiles)
+
+    assert batch == [engine.evaluate_assessment('memory', row, profile) for row, profile in zip(rows, profiles)]
+
+def test_batch_of_nothing(engine):
+    assert engine.evaluate_batch('dyslexia', [], []) == []
+
+def test_batch_rejects_misaligned_rows(engine):
+    with pytest.raises(ValueError):
+        engine.evaluate_batch('dyslexia', [['a']], [{}, {}])
+    with pytest.raises(ValueError):
+        engine.evaluate_batch('dyslexia', [['a']], [{}], [[1.0], [2.0]])
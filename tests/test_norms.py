@@ -0,0 +1,110 @@
+import pytest
+
+from assessment.norms import NORM_BINS, NormHistogram, PopulationNorms
+from models.enhanced_models import db, NormSketch, save_result
+from routes.assessments import norm_sample
+
+def test_histogram_percentile_counts_ties_as_half():
+    histogram = NormHistogram()
+    assert histogram.percentile(0.5) is None
+
+    for value in (0.1, 0.5, 0.5, 0.9):
+        histogram.add(value)
+
+    assert histogram.percentile(0.5) == 50.0
+    assert histogram.percentile(0.0) == 0.0
+    assert histogram.percentile(1.0) == 100.0
+    # Out-of-range scores land in the end bins
+    histogram.add(1.5)
+    histogram.add(-0.5)
+    assert histogram.counts[0] == histogram.counts[NORM_BINS - 1] == 1
+    assert NormHistogram.from_bytes(histogram.to_bytes()).counts == histogram.counts
+
+@pytest.fixture
+def workers(app):
+    """Two processes' norms over the same database"""
+    first = app.extensions['population_norms']
+    second = PopulationNorms(app, db, NormSketch)
+    app.extensions['population_norms'] = first
+    yield first, second
+    second.flush()
+
+def _stored(app):
+    with app.app_context():
+        return {(row.test_type, row.age_group): row.total for row in NormSketch.query}
+
+def test_flushes_merge_every_workers_scores(app, workers):
+    first, second = workers
+    with app.app_context():
+        first.record_many([('Dyslexia', 'child', 0.2)] * 3)
+        second.record_many([('Dyslexia', 'child', 0.8)] * 2 + [('Dyslexia', None, 0.5)])
+
+        first.flush()
+        second.flush()
+
+        assert _stored(app) == {('Dyslexia', 'child'): 5, ('Dyslexia', 'adult'): 1}
+        # The last to flush reloaded everyone's scores; a fresh process loads them too
+        assert second.percentile('Dyslexia', 'child', 0.5) == 60.0
+        assert PopulationNorms(app, db, NormSketch).percentile('Dyslexia', 'child', 0.5) == 60.0
+        app.extensions['population_norms'] = first
+
+def test_scores_count_once_their_result_commits(app, make_user, monkeypatch):
+    writer = app.extensions['result_writer']
+    writer.enabled = True
+    user = make_user()
+    recorded = []
+    try:
+        with app.app_context():
+            monkeypatch.setattr(writer, '_insert', lambda rows: 1 / 0)
+            with pytest.raises(ZeroDivisionError):
+                save_result(user.id, 'Dyslexia', 1, True, 'Lost', on_commit=lambda: recorded.append('lost'))
+            monkeypatch.undo()
+
+            writer.durable_ack = False
+            writer.flush_interval = 30  # hold the row in the buffer
+            save_result(user.id, 'Dyslexia', 1, True, 'Kept', on_commit=lambda: recorded.append('kept'))
+            assert recorded == []
+    finally:
+        writer.close()
+
+    assert recorded == ['kept']
+
+def test_a_submitted_test_joins_the_norms_when_written(app, client, make_user, login):
+    writer = app.extensions['result_writer']
+    norms = app.extensions['population_norms']
+    writer.enabled = True
+    writer.flush_interval = 30  # hold the row in the buffer
+    writer.ack_timeout = 0.05
+    login(make_user().email)
+
+    response = client.post('/test/memory', data={'recall': ['Apple'], 'study_time': '10', 'recall_time': '5'})
+
+    assert b'still being saved' in response.data
+    with app.app_context():
+        assert norms.percentile('Working Memory', None, 0.5) is None
+        writer.close()
+        assert norms.percentile('Working Memory', None, 0.5) is not None
+
+def test_rebuild_norms_replaces_the_stored_histograms(app, make_user):
+    child = make_user('child@example.org', age_group='child')
+    adult = make_user('adult@example.org', age_group='adult')
+    with app.app_context():
+        app.extensions['population_norms'].record_many([('Memory', 'adult', 0.5)])
+        app.extensions['population_norms'].flush()
+        save_result(child.id, 'Dyslexia', 1, True, 'Fixed form', max_score=2, responses=['a', 'b'])
+        save_result(child.id, 'Dyslexia', 2, False, 'Adaptive', max_score=3,
+                    responses=[['dys-1', 'a'], ['dys-4', 'b'], ['dys-2', 'c']])
+        save_result(adult.id, 'Dyslexia', 2, False, 'Fixed form', max_score=2, responses=['b', 'a'])
+
+    output = app.test_cli_runner().invoke(args=['rebuild-norms']).output
+
+    assert 'rebuilt' in output
+    assert _stored(app) == {('Dyslexia', 'child'): 1, ('Dyslexia (adaptive)', 'child'): 1, ('Dyslexia', 'adult'): 1}
+
+def test_adaptive_results_are_normed_apart():
+    fixed = {'type': 'Dyslexia', 'score': 1, 'max_score': 2}
+    adaptive = dict(fixed, ability=0.4)
+
+    assert norm_sample(fixed, {'age_group': 'teen'}) == ('Dyslexia', 'teen', 0.5)
+    assert norm_sample(adaptive, {}) == ('Dyslexia (adaptive)', None, 0.5)
+    assert norm_sample(dict(fixed, max_score=0), {}) is None
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+def _hasher(**config):
+    app = Flask(__name__)
+    app.config.update({f'PASSWORD_HASH_{key.upper()}': value for key, value in config.items()})
+    return PasswordHasher(app)
+
+@pytest.mark.parametrize('method', ['pbkdf2:sha256', 'pbkdf2:sha256:1000', 'scrypt', 'scrypt:16384:8:1'])
+def test_hash_made_with_the_configured_method_is_current(method):
+    hasher = _hasher(method=method)
+
+    assert not hasher.needs_rehash(generate_password_hash('secret', method=method))
+
+def test_other_algorithm_or_cost_needs_rehash():
+    hasher = _hasher(method='scrypt')
+
+    assert hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='scrypt:16384:8:1'))
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes():
+    hasher = _hasher(method='pbkdf2:sha256:400000', workers=1, max_queue=0, timeout=0.01)
+    try:
+        with pytest.raises(PasswordHasherBusy, match='timed out'):
+            hasher.hash('secret')
+        # Still hashing in the pool, so there is no room for another one
+        with pytest.raises(PasswordHasherBusy, match='full'):
+            hasher.hash('secret')
+        assert hasher.stats()['in_flight'] == 1
+
+        deadline = time.monotonic() + 30
+        while hasher.stats()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert hasher.stats()['in_flight'] == 0
+        hasher.timeout = 30
+        assert hasher.verify(hasher.hash('secret'), 'secret')
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,75 @@
+import time
+
+from models.enhanced_models import (
+    db, AssessmentProgressEvent, AssessmentSession, append_progress, compact_pending_progress,
+    compact_progress, get_progress_state
+)
+
+def _session(user_id, **fields):
+    record = AssessmentSession(user_id=user_id, test_type='dyslexia', **fields)
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+def _events(session_id):
+    return AssessmentProgressEvent.query.filter_by(session_id=session_id).count()
+
+def test_autosave_only_appends(app_ctx, make_user):
+    record = _session(make_user().id)
+
+    for i in range(120):
+        append_progress(record.id, {'q': i})
+
+    assert _events(record.id) == 120
+    assert get_progress_state(record) == {'q': 119}
+
+def test_compaction_keeps_the_state(app_ctx, make_user):
+    record = _session(make_user().id)
+    append_progress(record.id, {'a': 1, 'b': 1})
+    append_progress(record.id, {'b': 2})
+
+    assert compact_progress(record.id)
+    append_progress(record.id, {'c': 3})
+
+    db.session.refresh(record)
+    assert record.session_data == {'a': 1, 'b': 2}
+    assert _events(record.id) == 1
+    assert get_progress_state(record) == {'a': 1, 'b': 2, 'c': 3}
+    assert compact_progress(record.id) and compact_progress(record.id)
+    assert get_progress_state(record) == {'a': 1, 'b': 2, 'c': 3}
+
+def test_compact_pending_progress_picks_busy_and_finished_sessions(app_ctx, make_user):
+    user_id = make_user().id
+    busy, quiet, finished = _session(user_id), _session(user_id), _session(user_id, is_completed=True)
+    for i in range(5):
+        append_progress(busy.id, {'q': i})
+    append_progress(quiet.id, {'q': 0})
+    append_progress(finished.id, {'q': 0})
+
+    assert compact_pending_progress(min_events=5) == 2
+
+    assert [_events(s.id) for s in (busy, quiet, finished)] == [0, 1, 0]
+    assert get_progress_state(db.session.get(AssessmentSession, busy.id)) == {'q': 4}
+    assert compact_pending_progress(min_events=5) == 0
+
+def test_workers_compact_in_the_background(app, client, make_user):
+    compactor = app.extensions['progress_compactor']
+    compactor.background, compactor.interval, compactor.min_events = True, 0.01, 3
+    with app.app_context():
+        record = _session(make_user().id)
+        for i in range(3):
+            append_progress(record.id, {'q': i})
+        session_id = record.id
+
+    client.get('/')  # any request starts this worker's thread
+    try:
+        deadline = time.monotonic() + 5
+        while compactor.compacted < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        compactor.stop()
+
+    assert compactor.stats()['compacted'] == 1
+    with app.app_context():
+        assert _events(session_id) == 0
+        assert get_progress_state(db.session.get(AssessmentSession, session_id)) == {'q': 2}
@@ -0,0 +1,81 @@
+import multiprocessing
+
+import pytest
+
+from services.rate_limiter import MemoryStorage, SQLiteStorage, parse_limit
+
+@pytest.mark.parametrize('text, expected', [
+    ('10 per minute', (10, 60)),
+    ('5 per 10 minutes', (5, 600)),
+    ('100/hour', (100, 3600)),
+    (' 3 per Day ', (3, 86400)),
+])
+def test_parse_limit(text, expected):
+    assert parse_limit(text) == expected
+
+def test_parse_limit_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_limit('lots')
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage(slots=64)
+    return SQLiteStorage(str(tmp_path / 'limits.db'))
+
+def test_bucket_empties_and_refills(storage):
+    hits = [storage.hit('k', 3, 60, now=100.0)[0] for _ in range(4)]
+    assert hits == [True, True, True, False]
+
+    # One token back every 20 seconds
+    assert storage.hit('k', 3, 60, now=119.0)[0] is False
+    assert storage.hit('k', 3, 60, now=121.0)[0] is True
+    assert storage.hit('other', 3, 60, now=121.0) == (True, 2.0)
+
+def test_zero_cost_only_reads(storage):
+    storage.hit('k', 2, 60, now=0.0)
+
+    assert storage.hit('k', 2, 60, cost=0, now=0.0) == (True, 1.0)
+    assert storage.hit('k', 2, 60, cost=0, now=0.0) == (True, 1.0)
+
+def test_reset_forgets_the_bucket(storage):
+    for _ in range(3):
+        storage.hit('k', 3, 60)
+
+    storage.reset('k')
+
+    assert storage.hit('k', 3, 60)[1] == 2.0
+
+def _spend(storage, n):
+    for _ in range(n):
+        storage.hit('shared', 10, 60, now=0.0)
+
+def test_memory_buckets_are_shared_with_forked_workers():
+    storage = MemoryStorage(slots=64)
+    child = multiprocessing.get_context('fork').Process(target=_spend, args=(storage, 4))
+    child.start()
+    child.join(10)
+
+    assert child.exitcode == 0
+    assert storage.hit('shared', 10, 60, cost=0, now=0.0)[1] == 6.0
+
+def test_full_table_reuses_the_bucket_that_refills_soonest():
+    storage = MemoryStorage(slots=1)
+    storage.hit('a', 2, 60, cost=2, now=0.0)  # empty until 60
+    storage.hit('b', 2, 60, now=0.0)  # takes a's slot over, the only one
+
+    assert storage.hit('a', 2, 60, cost=0, now=0.0)[1] == 2.0
+
+def test_login_posts_over_budget_get_429(app, client):
+    limiter = app.extensions['rate_limiter']
+    limiter.enabled = True
+    limiter.limits = {'auth.login': parse_limit('2 per minute')}
+
+    statuses = [client.post('/login', data={'email': 'x@example.org', 'password': 'wrong'}).status_code
+                for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    response = client.post('/login', data={})
+    assert response.status_code == 429 and 1 <= int(response.headers['Retry-After']) <= 30
+    assert client.get('/login').status_code == 200
+    assert limiter.stats() == {'allowed': 2, 'limited': 2}
@@ -0,0 +1,88 @@
+import pytest
+
+from assessment.ml_engine import assessment_engine
+from models.enhanced_models import (
+    db, DailyResultRollup, MigrationCheckpoint, Result, rebuild_daily_rollups, save_result
+)
+from models.rescoring import rescore_results, scoring_fingerprint
+
+RESPONSES = [['a', 'b'], ['b', 'b'], ['c', 'a']]  # the dyslexia form has two questions
+
+class Interrupted(Exception):
+    pass
+
+@pytest.fixture
+def stale_results(app, make_user):
+    """Six dyslexia results saved with the opposite flag and an outdated message"""
+    user = make_user()
+    with app.app_context():
+        for i in range(6):
+            responses = RESPONSES[i % len(RESPONSES)]
+            scored = assessment_engine.evaluate_assessment('dyslexia', responses, {})
+            save_result(user.id, scored['type'], scored['score'], not scored['flag'], 'stale', responses=responses)
+    return user
+
+def _flags(app):
+    with app.app_context():
+        results = Result.query.order_by(Result.id).all()
+        rollup = db.session.query(DailyResultRollup.flagged).scalar()
+        return [(r.flag, r.message) for r in results], rollup
+
+def _rescore(app, **kwargs):
+    with app.app_context():
+        return rescore_results(app, workers=1, chunk_size=2, **kwargs)
+
+def test_dry_run_changes_nothing(app, stale_results):
+    before = _flags(app)
+
+    totals = _rescore(app, dry_run=True)
+
+    assert (totals['scanned'], totals['changed']) == (6, 6)
+    assert _flags(app) == before
+    with app.app_context():
+        assert db.session.get(MigrationCheckpoint, f'rescore-{scoring_fingerprint()}') is None
+
+def test_interrupted_run_resumes_without_double_counting(app, stale_results):
+    def stop_after_first_range(totals, watermark):
+        raise Interrupted
+
+    with pytest.raises(Interrupted):
+        _rescore(app, progress=stop_after_first_range)
+    with app.app_context():
+        assert db.session.get(MigrationCheckpoint, f'rescore-{scoring_fingerprint()}').last_id == 2
+
+    resumed = _rescore(app)
+
+    # Only the ranges past the checkpoint are read again
+    assert resumed['scanned'] == 4
+    results, flagged = _flags(app)
+    assert all(message != 'stale' for _, message in results)
+    assert flagged == sum(flag for flag, _ in results)
+
+    # Finished: nothing left to do, and starting over finds nothing to change
+    assert _rescore(app)['scanned'] == 0
+    again = _rescore(app, restart=True)
+    assert (again['scanned'], again['changed']) == (6, 0)
+    assert _flags(app) == (results, flagged)
+
+def test_stale_scores_are_rewritten_and_the_rollups_follow(app, make_user):
+    user = make_user()
+    expected = []
+    with app.app_context():
+        for responses in RESPONSES:
+            scored = assessment_engine.evaluate_assessment('dyslexia', responses, {})
+            expected.append((scored['score'], scored['max_score']))
+            # Scored under an older answer key and a longer form
+            save_result(user.id, scored['type'], scored['score'] + 1, scored['flag'], scored['message'], max_score=5,
+                        confidence_score=scored['confidence_score'], recommendations=scored['recommendations'],
+                        responses=responses)
+
+    totals = _rescore(app)
+
+    assert totals['changed'] == 3 and not totals['transitions']
+    with app.app_context():
+        assert [(r.score, r.max_score) for r in Result.query.order_by(Result.id)] == expected
+        kept = [(r.submissions, r.flagged, r.score_sum) for r in DailyResultRollup.query]
+        rebuild_daily_rollups()
+        assert kept == [(r.submissions, r.flagged, r.score_sum) for r in DailyResultRollup.query]
+        assert kept[0][2] == sum(score for score, _ in expected)
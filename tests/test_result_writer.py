@@ -0,0 +1,34 @@
+import pytest
+
+from models.enhanced_models import db, Result, save_result
+
+@pytest.fixture
+def writer(app):
+    writer = app.extensions['result_writer']
+    writer.enabled = True
+    yield writer
+    writer.close()
+
+def test_write_behind_save_returns_the_result(app, make_user, writer):
+    user = make_user()
+    with app.app_context():
+        result = save_result(user.id, 'Memory', 4, False, 'Good recall', max_score=5)
+
+        assert isinstance(result, Result)
+        assert (result.user_id, result.score, result.message) == (user.id, 4, 'Good recall')
+        # Durable ack: the row is committed by the time save_result returns
+        assert db.session.query(Result).filter_by(user_id=user.id).count() == 1
+
+def test_unacknowledged_write_tells_the_student_it_is_being_saved(app, client, make_user, login, writer):
+    user = make_user()
+    writer.flush_interval = 30  # hold the row in the buffer
+    writer.ack_timeout = 0.05
+    login(user.email)
+
+    response = client.post('/test/memory', data={'recall': ['apple'], 'study_time': '10', 'recall_time': '5'})
+
+    assert response.status_code == 200
+    assert b'still being saved' in response.data
+    writer.close()
+    with app.app_context():
+        assert db.session.query(Result).filter_by(user_id=user.id).count() == 1
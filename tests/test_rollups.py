@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timedelta
+
+from assessment.ml_engine import assessment_engine
+from models.enhanced_models import db, DailyResultRollup, Result, rebuild_daily_rollups, save_result
+from models.rescoring import rescore_range
+
+def _rollups():
+    return sorted((r.day, r.test_type, r.submissions, r.flagged, r.score_sum)
+                  for r in DailyResultRollup.query.all())
+
+def assert_matches_rebuild():
+    """The incrementally kept totals equal a recount from ``results``"""
+    db.session.expire_all()
+    kept = _rollups()
+    rebuild_daily_rollups()
+    assert kept == _rollups()
+    return kept
+
+def _responses(test_type, i):
+    if test_type == 'memory':
+        return ['Apple', 'Book', 'Tiger', 'Spoon'][:i % 4 + 1]
+    n = len(assessment_engine.form_questions(test_type))
+    return ['abcd'[(i + j) % 4] for j in range(n)]
+
+def test_saved_results_match_a_rebuild(app_ctx, make_user):
+    user = make_user()
+    for i in range(12):
+        test_type = ('dyslexia', 'dyscalculia', 'memory')[i % 3]
+        scored = assessment_engine.evaluate_assessment(test_type, _responses(test_type, i), {})
+        save_result(user.id, scored['type'], scored['score'], scored['flag'], scored['message'],
+                    max_score=scored['max_score'])
+
+    kept = assert_matches_rebuild()
+    assert sum(submissions for _, _, submissions, _, _ in kept) == 12
+
+def test_write_behind_flushes_match_a_rebuild(app, make_user):
+    writer = app.extensions['result_writer']
+    writer.enabled = True
+    user = make_user()
+    try:
+        with app.app_context():
+            for i in range(5):
+                save_result(user.id, 'Dyslexia', i % 3, i % 2 == 0, 'Buffered')
+    finally:
+        writer.close()
+
+    with app.app_context():
+        assert assert_matches_rebuild() == [(datetime.utcnow().date(), 'Dyslexia', 5, 3, 4)]
+
+def test_batch_ingest_matches_a_rebuild(app, client, make_user, login):
+    user = make_user()
+    login(user.email)
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    lines = []
+    for i in range(30):
+        test_type = ('dyslexia', 'dyscalculia')[i % 2]
+        lines.append(json.dumps({'key': f'k{i}', 'test_type': test_type, 'responses': _responses(test_type, i),
+                                 'completed_at': (today - timedelta(days=i % 4)).isoformat()}))
+    lines.append(lines[0])  # a duplicate adds nothing
+
+    response = client.post('/api/assessment/batch', data='\n'.join(lines), content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    with app.app_context():
+        kept = assert_matches_rebuild()
+        assert len({day for day, _, _, _, _ in kept}) == 4
+        assert sum(submissions for _, _, submissions, _, _ in kept) == 30
+
+def test_rescoring_flag_changes_match_a_rebuild(app_ctx, make_user):
+    user = make_user()
+    for i in range(8):
+        responses = _responses('dyslexia', i)
+        scored = assessment_engine.evaluate_assessment('dyslexia', responses, {})
+        # Half saved with the opposite flag, as if scored under older thresholds
+        save_result(user.id, scored['type'], scored['score'], scored['flag'] != (i % 2 == 0), 'stale',
+                    responses=responses)
+    # Results from two different days
+    for result in Result.query.filter(Result.id % 3 == 0):
+        result.timestamp -= timedelta(days=1)
+    db.session.commit()
+    rebuild_daily_rollups()
+    flagged_before = sum(flagged for _, _, _, flagged, _ in _rollups())
+
+    stats = rescore_range(1, 100)
+
+    assert stats['changed'] == 8 and sum(stats['transitions'].values()) == 4
+    kept = assert_matches_rebuild()
+    assert sum(flagged for _, _, _, flagged, _ in kept) != flagged_before
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from models.enhanced_models import db, AssessmentSession, Result, get_results_page
+from models.schema import upgrade_schema, NOT_NULL_BACKFILLS
+
+def _recreate_old_sessions_table():
+    AssessmentSession.__table__.drop(db.engine)
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE assessment_sessions (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "test_type VARCHAR(50) NOT NULL, started_at DATETIME, completed_at DATETIME, "
+            "is_completed BOOLEAN, session_data JSON)"
+        ))
+        conn.execute(text("INSERT INTO assessment_sessions (user_id, test_type) VALUES (1, 'dyslexia')"))
+        conn.execute(text("DROP INDEX ix_results_timestamp_id"))
+
+def test_adds_missing_columns_and_indexes(app_ctx):
+    _recreate_old_sessions_table()
+
+    added = upgrade_schema()
+
+    assert 'column assessment_sessions.progress_seq' in added
+    assert 'index ix_assessment_sessions_id_user' in added
+    assert 'index ix_results_timestamp_id' in added
+    inspector = inspect(db.engine)
+    assert 'progress_seq' in {c['name'] for c in inspector.get_columns('assessment_sessions')}
+    # Existing rows get the model's default
+    assert db.session.execute(text("SELECT progress_seq FROM assessment_sessions")).scalar() == 0
+
+def test_is_idempotent(app_ctx):
+    _recreate_old_sessions_table()
+    upgrade_schema()
+
+    assert upgrade_schema() == []
+
+def test_nothing_to_do_on_a_fresh_schema(app_ctx):
+    assert upgrade_schema() == []
+
+def test_backfills_results_saved_without_a_timestamp(app_ctx, make_user):
+    user = make_user()
+    Result.__table__.drop(db.engine)
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE results (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, test_type VARCHAR(50) NOT NULL, "
+            "score INTEGER NOT NULL, max_score INTEGER, confidence_score FLOAT, flag BOOLEAN NOT NULL, message TEXT, "
+            "recommendations TEXT, timestamp DATETIME, time_taken INTEGER, responses JSON, response_times JSON)"
+        ))
+        conn.execute(text("INSERT INTO results (user_id, test_type, score, max_score, flag, timestamp) VALUES "
+                          f"({user.id}, 'Dyslexia', 1, 2, 0, NULL), ({user.id}, 'Dyslexia', 2, 2, 0, '2026-01-01 10:00:00.000000')"))
+
+    assert '1 values for results.timestamp' in upgrade_schema()
+    assert upgrade_schema() == []
+
+    first, cursor = get_results_page(page_size=1)
+    last, end = get_results_page(cursor=cursor, page_size=1)
+    assert first[0].timestamp == datetime(2026, 1, 1, 10)
+    assert last[0].timestamp == NOT_NULL_BACKFILLS['results.timestamp']
+    assert end is None
@@ -0,0 +1,147 @@
+from itertools import product
+
+import pytest
+
+from assessment.ml_engine import AssessmentEngine, EXPECTED_TIMES
+
+AGE_GROUPS = [None, 'child', 'teen', 'adult']
+LEARNING_STYLES = [None, '', 'visual', 'auditory', 'kinesthetic']
+PROFILES = [
+    {k: v for k, v in (('age_group', age), ('learning_style', style)) if v is not None}
+    for age, style in product(AGE_GROUPS, LEARNING_STYLES)
+]
+
+def _profile_adjustment(profile, test_type):
+    adjustment = 1.0
+    age_group = profile.get('age_group', 'adult')
+    if age_group == 'child':
+        adjustment *= 1.1
+    elif age_group == 'teen':
+        adjustment *= 1.05
+    learning_style = profile.get('learning_style', '')
+    if test_type == 'dyslexia' and learning_style == 'visual':
+        adjustment *= 1.05
+    elif test_type == 'memory' and learning_style == 'visual':
+        adjustment *= 1.1
+    return adjustment
+
+def _risk_and_confidence(score, thresholds, analysis):
+    if score >= thresholds['low_risk']:
+        risk_level = 'low_risk'
+        confidence = 0.8 + (score - thresholds['low_risk']) * 0.2 / (1 - thresholds['low_risk'])
+    elif score >= thresholds['medium_risk']:
+        risk_level = 'medium_risk'
+        confidence = 0.6 + (score - thresholds['medium_risk']) * 0.2 / (thresholds['low_risk'] - thresholds['medium_risk'])
+    else:
+        risk_level = 'high_risk'
+        confidence = 0.4 + score * 0.2 / thresholds['medium_risk']
+    by_difficulty = {}
+    for item in analysis:
+        by_difficulty.setdefault(item['difficulty'], []).append(item['correct'])
+    if 'easy' in by_difficulty and 'hard' in by_difficulty:
+        easy, hard = by_difficulty['easy'], by_difficulty['hard']
+        if sum(hard) / len(hard) > sum(easy) / len(easy):
+            confidence *= 0.9
+    return risk_level, min(0.95, confidence)
+
+def reference_cognitive(engine, test_type, responses, profile, response_times=None):
+    """Scoring as it was before configs were compiled into plans: everything derived per call"""
+    questions = engine.form_questions(test_type)
+    thresholds = engine.assessment_configs[test_type]['thresholds']
+    total_weight = sum(q['weight'] for q in questions)
+    weighted_score, correct_count, analysis = 0, 0, []
+    for i, (response, question) in enumerate(zip(responses, questions)):
+        is_correct = response == chr(ord('a') + question['correct'])
+        if is_correct:
+            weighted_score += question['weight']
+            correct_count += 1
+        time_factor = 1.0
+        if response_times and i < len(response_times):
+            ratio = response_times[i] / EXPECTED_TIMES.get(question['difficulty'], 20)
+            time_factor = 0.8 if ratio < 0.3 else 0.9 if ratio > 3.0 else 1.0
+        analysis.append({
+            'question_id': question['id'],
+            'correct': is_correct,
+            'response_time': response_times[i] if response_times and i < len(response_times) else None,
+            'time_factor': time_factor,
+            'difficulty': question['difficulty']
+        })
+    adjusted_score = min(1.0, weighted_score / total_weight * _profile_adjustment(profile, test_type))
+    risk_level, confidence = _risk_and_confidence(adjusted_score, thresholds, analysis)
+    return {
+        'score': correct_count,
+        'max_score': len(questions),
+        'normalized_score': round(adjusted_score, 3),
+        'confidence_score': round(confidence, 3),
+        'flag': risk_level in ['medium_risk', 'high_risk'],
+        'risk_level': risk_level,
+        'response_analysis': analysis
+    }
+
+def reference_memory(engine, responses, profile):
+    config = engine.assessment_configs['memory']
+    correct_items, selected = set(config['items']), set(responses)
+    true_positives = len(correct_items & selected)
+    precision = true_positives / len(selected) if selected else 0
+    recall = true_positives / len(correct_items)
+    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    adjusted_score = min(1.0, f1_score * _profile_adjustment(profile, 'memory'))
+    risk_level, confidence = _risk_and_confidence(adjusted_score, config['thresholds'], [])
+    return {
+        'score': true_positives,
+        'max_score': len(correct_items),
+        'normalized_score': round(adjusted_score, 3),
+        'confidence_score': round(confidence, 3),
+        'flag': risk_level in ['medium_risk', 'high_risk'],
+        'risk_level': risk_level
+    }
+
+def _subset(result, reference):
+    return {k: result[k] for k in reference}
+
+@pytest.fixture
+def engine():
+    return AssessmentEngine()
+
+@pytest.mark.parametrize('test_type', ['dyslexia', 'dyscalculia'])
+def test_plans_match_uncompiled_scoring_for_every_profile(engine, test_type):
+    n_questions = len(engine.form_questions(test_type))
+    answer_sets = [list(answers) for n in range(n_questions + 1) for answers in product('abcd', repeat=n)]
+    for profile in PROFILES:
+        for answers in answer_sets:
+            expected = reference_cognitive(engine, test_type, answers, profile)
+            assert _subset(engine.evaluate_assessment(test_type, answers, profile), expected) == expected
+        times = [float(t) for t in range(2, 2 + 7 * n_questions, 7)]
+        expected = reference_cognitive(engine, test_type, answer_sets[-1], profile, times)
+        assert _subset(engine.evaluate_assessment(test_type, answer_sets[-1], profile, times), expected) == expected
+
+def test_memory_plan_matches_uncompiled_scoring_for_every_profile(engine):
+    words = ['Apple', 'Book', 'Tiger', 'Spoon', 'Banana', 'Car']
+    selections = [[w for w, keep in zip(words, mask) if keep] for mask in product((False, True), repeat=len(words))]
+    for profile in PROFILES:
+        for selection in selections:
+            expected = reference_memory(engine, selection, profile)
+            assert _subset(engine.evaluate_assessment('memory', selection, profile), expected) == expected
+
+def test_compile_plans_picks_up_edited_thresholds(engine):
+    profile = {'age_group': 'child'}
+    before = engine.evaluate_assessment('memory', ['Apple', 'Book'], profile)
+    engine.assessment_configs['memory']['thresholds']['low_risk'] = 0.1
+
+    # Edited in place: the compiled plan, and the profile cache, still hold the old thresholds
+    assert engine.evaluate_assessment('memory', ['Apple', 'Book'], profile) == before
+
+    engine.compile_plans()
+    after = engine.evaluate_assessment('memory', ['Apple', 'Book'], profile)
+    assert after['risk_level'] == 'low_risk' != before['risk_level']
+    assert after == {**after, **reference_memory(engine, ['Apple', 'Book'], profile)}
+
+def test_replacing_configs_recompiles(engine):
+    engine.evaluate_assessment('memory', ['Apple'], {})
+    configs = {k: {**v, 'thresholds': dict(v['thresholds'])} for k, v in engine.assessment_configs.items()}
+    configs['memory']['items'] = ['Apple']
+
+    engine.assessment_configs = configs
+
+    result = engine.evaluate_assessment('memory', ['Apple'], {})
+    assert (result['score'], result['max_score'], result['risk_level']) == (1, 1, 'low_risk')
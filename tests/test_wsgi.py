@@ -0,0 +1,28 @@
+import importlib
+import sys
+
+import pytest
+
+from config import ProductionConfig
+
+def _wsgi_app(monkeypatch, flask_config=None):
+    if flask_config is None:
+        monkeypatch.delenv('FLASK_CONFIG', raising=False)
+    else:
+        monkeypatch.setenv('FLASK_CONFIG', flask_config)
+    monkeypatch.delitem(sys.modules, 'wsgi', raising=False)
+    return importlib.import_module('wsgi').app
+
+def test_production_servers_get_the_production_config(monkeypatch):
+    with pytest.raises(ValueError, match='METRICS_TOKEN'):
+        _wsgi_app(monkeypatch)
+
+    monkeypatch.setattr(ProductionConfig, 'METRICS_TOKEN', 'scrape-token')
+    app = _wsgi_app(monkeypatch)
+
+    assert not app.debug and app.config['METRICS_REQUIRE_TOKEN']
+
+def test_flask_config_still_wins(monkeypatch):
+    app = _wsgi_app(monkeypatch, 'development')
+
+    assert app.debug
@@ -0,0 +1,11 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Uses ProductionConfig unless $FLASK_CONFIG names another configuration.
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_CONFIG', 'production'))